@@ -0,0 +1,90 @@
+"""Classify 100k synthetic expense descriptions with the old and new categorizers.
+
+Compares the previous substring scan over CATEGORY_MAPPING against the
+token-index classifier in categories.py, with and without a user's learned
+overrides. It reports throughput, how many descriptions each one files
+differently, and how both scale as the keyword mapping grows.
+
+    python benchmarks/bench_categories.py --count 100000 --vocab 60 600 6000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import categories
+
+MERCHANTS = ["whole foods market", "shell gas station", "con edison gas bill", "uber trip", "netflix.com",
+             "amc movies", "amazon marketplace", "credit card payment", "carpet cleaning", "trader joe's",
+             "starbucks coffee", "metro card reload", "concert tickets", "landlord rent", "book depot"]
+
+
+def substring_categorizer(mapping):
+    """The categorizer before the token index"""
+    def categorize(description):
+        description = description.lower()
+        for key, value in mapping.items():
+            if key in description:
+                return value
+        return categories.DEFAULT_CATEGORY
+    return categorize
+
+
+def padded_mapping(size):
+    """CATEGORY_MAPPING plus merchant-like filler keywords, about size in total"""
+    mapping = dict(categories.CATEGORY_MAPPING)
+    for i in range(size - len(mapping)):
+        mapping[f"merchant{i}"] = "shopping"
+    return mapping
+
+
+def descriptions(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield f"{rng.choice(MERCHANTS).upper()} #{rng.randint(1000, 9999)} {rng.choice(['NY', 'SF', 'CHI'])}"
+
+
+def timed(label, classify, items):
+    start = time.perf_counter()
+    results = [classify(item) for item in items]
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {len(items) / elapsed:12,.0f} descriptions/s  ({elapsed:.2f}s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vocab", type=int, nargs="+", default=[60, 600, 6000])
+    args = parser.parse_args()
+
+    items = list(descriptions(args.count, args.seed))
+    overrides = {"trader joe's": "food", "metro card reload": "transport"}
+
+    old = timed("substring scan", substring_categorizer(categories.CATEGORY_MAPPING), items)
+    new = timed("token index", categories.categorize, items)
+    timed("token index + overrides", lambda d: categories.categorize(d, overrides), items)
+
+    changed = {}
+    for description, before, after in zip(items, old, new):
+        if before != after:
+            merchant = description.rsplit(" #", 1)[0].lower()
+            changed[(merchant, before, after)] = changed.get((merchant, before, after), 0) + 1
+    print(f"\n{sum(changed.values())} descriptions filed differently:")
+    for (merchant, before, after), n in sorted(changed.items()):
+        print(f"  {merchant:24s} {before:>13s} -> {after:13s} x{n}")
+
+    print("\nAs the mapping grows:")
+    sample = items[:max(1, args.count // 10)]
+    for size in args.vocab:
+        mapping = padded_mapping(size)
+        timed(f"substring scan, {len(mapping)} keywords", substring_categorizer(mapping), sample)
+        timed(f"token index, {len(mapping)} keywords", categories.CategoryIndex(mapping).classify, sample)
+
+
+if __name__ == "__main__":
+    main()
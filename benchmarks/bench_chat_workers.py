@@ -0,0 +1,137 @@
+"""/chat throughput with 1, 2, 4... worker processes sharing one chat state.
+
+Each worker is a separate process running the app, like a Gunicorn worker,
+with --threads concurrent users' clients. The same users are served by
+every worker, so consecutive turns of a conversation land on different
+processes, as behind a load balancer. The app uses the fake model
+(MODEL_BACKEND=fake) and a scratch database.
+
+For each worker count the script reports /chat requests per second and,
+of the user turns in each worker's final view of a conversation, the share
+that other workers served. With CHAT_STATE=sqlite every worker sees the
+whole conversation, so that is about (workers - 1) / workers; with
+CHAT_STATE=memory it is 0, as each process only has the turns it served.
+
+    python benchmarks/bench_chat_workers.py --workers 1,2,4 --threads 4 --seconds 5
+    python benchmarks/bench_chat_workers.py --state memory
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+MESSAGES = [
+    "How do I start budgeting?",
+    "What's a good way to build an emergency fund?",
+    "Should I pay off debt or invest first?",
+    "How can I save more each month?",
+]
+
+# Every message ends in (worker.turn)
+TAG = re.compile(r"\((\d+)\.\d+\)$")
+
+
+def worker(index, env, threads, ready, start, seconds, results):
+    os.environ.update(env)
+    sys.stdout = open(os.devnull, "w")       # the app's per-request prints
+    import threading
+
+    import app
+    import logs
+    logs.configure()                         # as config/gunicorn.conf.py does
+
+    counts = [0] * threads
+    # user turns visible to this worker: (total, served by other workers)
+    seen = [(0, 0)] * threads
+
+    def user(thread):
+        user_id = f"user_{thread}"
+        client = app.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+        stop = start.value + seconds
+        n = 0
+        while time.time() < stop:
+            message = MESSAGES[(index + n) % len(MESSAGES)] + f" ({index}.{n})"
+            if client.post("/chat", json={"message": message}).status_code == 200:
+                counts[thread] += 1
+            n += 1
+        workers = [int(match.group(1)) for message in app.chat_histories.history(user_id)
+                   if message["role"] == "user" and (match := TAG.search(message["parts"][0]))
+                   and "\n" not in message["parts"][0]]       # not the summary exchange
+        seen[thread] = (len(workers), sum(w != index for w in workers))
+
+    ready.wait()
+    while time.time() < start.value:
+        time.sleep(0.001)
+    pool = [threading.Thread(target=user, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put((index, sum(counts), seen))
+
+
+def run(workers, args, tmp):
+    path = os.path.join(tmp, f"chat-{workers}.db")
+    env = {
+        "DATABASE_PATH": path,
+        "MODEL_BACKEND": "fake",
+        "CHAT_STATE": args.state,
+        "FAKE_MODEL_LATENCY": args.latency,
+        "FAKE_MODEL_TOKENS_PER_SEC": "100000",
+        "SECRET_KEY": os.getenv("SECRET_KEY", "bench"),
+    }
+    import db_pool
+    import database
+    db_pool.configure(path)
+    database.init_db()
+    db_pool.get_pool().close()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers + 1)
+    start = context.Value("d", 0.0)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(i, env, args.threads, ready, start, args.seconds, results))
+                 for i in range(workers)]
+    for p in processes:
+        p.start()
+    ready.wait()                       # every worker has imported the app
+    start.value = time.time() + 0.2
+    reports = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    requests = sum(count for _, count, _ in reports)
+    visible = sum(total for _, _, users in reports for total, _ in users)
+    shared = sum(others for _, _, users in reports for _, others in users)
+    return requests / args.seconds, shared / visible if visible else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker process counts")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent users per worker")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--state", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--latency", default="constant:0.02", help="fake model latency (see fake_model.py)")
+    args = parser.parse_args()
+
+    print(f"CHAT_STATE={args.state}, {args.threads} users per worker, model latency {args.latency}")
+    print(f"{'workers':>7s} {'req/s':>8s} {'speed-up':>9s} {'from other workers':>19s}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in [int(n) for n in args.workers.split(",")]:
+            throughput, shared = run(workers, args, tmp)
+            baseline = baseline or throughput
+            print(f"{workers:7d} {throughput:8.1f} {throughput / baseline:8.2f}x {shared:18.0%}")
+
+
+if __name__ == "__main__":
+    main()
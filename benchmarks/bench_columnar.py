@@ -0,0 +1,112 @@
+"""Memory and analytics cost of expense dicts versus columnar.ExpenseColumns.
+
+Builds the same synthetic expenses both ways, measures the memory each
+layout holds with tracemalloc, and times getting a typed pandas DataFrame
+and a per-category sum out of each.
+
+    python benchmarks/bench_columnar.py --count 100000 --merchants 500
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import numpy as np
+import pandas as pd
+
+from columnar import ExpenseColumns
+
+CATEGORIES = ["food", "housing", "transport", "entertainment", "shopping", "other"]
+
+
+def expenses(count, merchants, seed):
+    rng = random.Random(seed)
+    names = [f"merchant {i} #{rng.randint(1000, 9999)}" for i in range(merchants)]
+    for _ in range(count):
+        yield (round(rng.uniform(1, 200), 2), rng.choice(CATEGORIES), rng.choice(names),
+               f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+
+
+def as_dicts(rows):
+    # What InMemoryExpenseStore kept before; strings are rebuilt per row as
+    # they would be when parsed from a request
+    return [{'amount': amount, 'category': category, 'description': ''.join(description),
+             'date': ''.join(date)} for amount, category, description, date in rows]
+
+
+def as_columns(rows):
+    columns = ExpenseColumns()
+    for row in rows:
+        columns.append(*row)
+    return columns
+
+
+def measured(build, rows):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    result = build(rows)
+    elapsed = time.perf_counter() - start
+    size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def timed(label, fn, repeat=5):
+    best = min(_once(fn) for _ in range(repeat))
+    print(f"  {label:34s} {best * 1000:9.2f} ms")
+
+
+def _once(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def dict_frame(expenses):
+    df = pd.DataFrame(expenses)
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+    df['category'] = df['category'].astype('category')
+    return df
+
+
+def numpy_totals(columns):
+    views = columns.arrays()
+    totals = np.bincount(views['category'], weights=views['amount'], minlength=len(columns.category_names))
+    return dict(zip(columns.category_names, totals))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--merchants", type=int, default=500, help="distinct descriptions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = list(expenses(args.count, args.merchants, args.seed))
+    dicts, dict_bytes, dict_time = measured(as_dicts, rows)
+    columns, column_bytes, column_time = measured(as_columns, rows)
+
+    print(f"{args.count:,} expenses, {args.merchants} distinct descriptions")
+    print(f"  {'list of dicts':34s} {dict_bytes / 2**20:9.2f} MiB  {dict_bytes / args.count:6.0f} B/expense"
+          f"  built in {dict_time:.2f}s")
+    print(f"  {'ExpenseColumns':34s} {column_bytes / 2**20:9.2f} MiB  {column_bytes / args.count:6.0f} B/expense"
+          f"  built in {column_time:.2f}s")
+    print(f"  ratio {dict_bytes / column_bytes:.1f}x")
+
+    print("\nTyped DataFrame:")
+    timed("pd.DataFrame(list of dicts)", lambda: dict_frame(dicts))
+    timed("ExpenseColumns.to_frame()", columns.to_frame)
+    print("\nPer-category totals:")
+    timed("from the list of dicts", lambda: dict_frame(dicts).groupby('category', observed=True)['amount'].sum())
+    timed("from the NumPy views", lambda: numpy_totals(columns))
+
+
+if __name__ == "__main__":
+    main()
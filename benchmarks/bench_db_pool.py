@@ -0,0 +1,118 @@
+"""Compare per-call sqlite3.connect() against the pooled WAL connections.
+
+Runs a mix of reader and writer threads against a scratch database for a
+fixed time and reports operations per second for each strategy.
+
+    python benchmarks/bench_db_pool.py --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import db_pool
+
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        amount REAL NOT NULL,
+        description TEXT NOT NULL,
+        category TEXT,
+        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def naive_write(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("INSERT INTO expenses (amount, description, category) VALUES (?, ?, ?)",
+                 (12.5, "coffee", "food"))
+    conn.commit()
+    conn.close()
+
+
+def naive_read(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("SELECT SUM(amount) FROM expenses WHERE category = ?", ("food",)).fetchone()
+    conn.close()
+
+
+def pooled_write(pool):
+    with pool.transaction() as conn:
+        conn.execute("INSERT INTO expenses (amount, description, category) VALUES (?, ?, ?)",
+                     (12.5, "coffee", "food"))
+
+
+def pooled_read(pool):
+    with pool.connection() as conn:
+        conn.execute("SELECT SUM(amount) FROM expenses WHERE category = ?", ("food",)).fetchone()
+
+
+def run(read_op, write_op, readers, writers, seconds):
+    counts = {"read": 0, "write": 0, "error": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def worker(kind, op):
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                op()
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts[kind] += done
+            counts["error"] += errors
+
+    threads = [threading.Thread(target=worker, args=("read", read_op)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", write_op)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != "error" else v for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        naive_path = os.path.join(tmp, "naive.db")
+        conn = sqlite3.connect(naive_path)
+        conn.execute(SCHEMA)
+        conn.commit()
+        conn.close()
+
+        pool = db_pool.ConnectionPool(os.path.join(tmp, "pooled.db"),
+                                      max_size=args.readers + args.writers)
+        with pool.transaction() as conn:
+            conn.execute(SCHEMA)
+
+        results = {
+            "connect-per-call (rollback journal)": run(
+                lambda: naive_read(naive_path), lambda: naive_write(naive_path),
+                args.readers, args.writers, args.seconds),
+            "pooled (WAL)": run(
+                lambda: pooled_read(pool), lambda: pooled_write(pool),
+                args.readers, args.writers, args.seconds),
+        }
+        pool.close()
+
+    print(f"{args.readers} readers / {args.writers} writers, {args.seconds:.1f}s each")
+    for name, r in results.items():
+        print(f"{name:38s} reads/s={r['read']:10.0f}  writes/s={r['write']:8.0f}  errors={r['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""How long `import app` takes, and which modules it spends the time on.
+
+Runs `python -X importtime -c "import app"` in fresh interpreters, keeps the
+fastest run and prints the total, the slowest modules imported on the way
+and the heavy dependencies that got imported although start-up defers them:
+
+    python benchmarks/bench_import.py --runs 5 --top 15
+
+As a regression guard it exits with status 1 if `import app` takes longer
+than --budget-ms or imports any of the deferred modules:
+
+    python benchmarks/bench_import.py --budget-ms 250
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Imported on first use or by app.warm_up(), never by `import app`
+DEFERRED = ("pandas", "numpy", "google.generativeai", "grpc")
+
+
+def parse_importtime(stderr):
+    """[(module, depth, self_us, cumulative_us)] from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue                      # the header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(fields[0]), int(fields[1])))
+    return modules
+
+
+def import_profile(statement="import app"):
+    """Modules imported by statement in a fresh interpreter run from src/"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("SECRET_KEY", "bench")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+
+def cumulative_ms(modules, name):
+    return next((cumulative / 1000 for module, depth, _, cumulative in modules
+                 if module == name and depth == 0), 0.0)
+
+
+def deferred_imports(modules):
+    """The DEFERRED packages that modules include"""
+    imported = {module for module, _, _, _ in modules}
+    return [package for package in DEFERRED if package in imported]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="keep the fastest of this many")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if `import app` takes longer")
+    args = parser.parse_args()
+
+    # The first run also warms the bytecode and OS file caches
+    runs = [import_profile() for _ in range(args.runs)]
+    modules = min(runs, key=lambda run: cumulative_ms(run, "app"))
+    total = cumulative_ms(modules, "app")
+
+    print(f"import app: {total:.1f} ms (fastest of {args.runs}), {len(modules)} modules "
+          f"imported by the interpreter in total")
+    print(f"\nSlowest {args.top} modules by self time:")
+    for module, _, self_us, cumulative_us in sorted(modules, key=lambda m: -m[2])[:args.top]:
+        print(f"  {module:40s} {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative")
+
+    failed = False
+    deferred = deferred_imports(modules)
+    if deferred:
+        print(f"\nDeferred modules imported at start-up: {', '.join(deferred)}")
+        failed = True
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"\nimport app took {total:.1f} ms, over the {args.budget_ms:g} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Show that statement import memory does not grow with file size.
+
+Generates synthetic CSV statements of increasing length, streams each one
+through importer.import_statement into a scratch database and reports
+rows/s together with the tracemalloc peak.
+
+    python benchmarks/bench_importer.py --rows 10000 50000 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import db_pool
+import database
+import importer
+
+DESCRIPTIONS = ["whole foods groceries", "uber trip", "netflix", "shell gas", "rent payment",
+                "amazon order", "coffee shop", "concert tickets", "misc"]
+
+
+def synthetic_statement(rows):
+    """Yield CSV lines as bytes without ever holding the whole file"""
+    yield b"Date,Description,Amount\n"
+    for i in range(rows):
+        line = f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d},{DESCRIPTIONS[i % len(DESCRIPTIONS)]} #{i},-{(i % 97) + 0.99:.2f}\n"
+        yield line.encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--chunk-size", type=int, default=importer.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            db_pool.configure(os.path.join(tmp, f"import_{rows}.db"))
+            database.init_db()
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            summary = importer.import_statement(synthetic_statement(rows), "bench",
+                                                fmt="csv", chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{rows:>8} rows  imported={summary.imported:>8}  "
+                  f"{summary.imported / elapsed:>9.0f} rows/s  peak={peak / 1024:>8.0f} KiB")
+        db_pool.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-message cost of intent routing as the keyword vocabulary grows.
+
+Pads each intent's keyword list with synthetic words, then times the old
+chain of `in` substring checks against intents.IntentRouter on a fixed set
+of chat messages. The substring chain scales with the vocabulary; the
+router's dict lookups stay flat.
+
+    python benchmarks/bench_intents.py --sizes 10 100 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import intents
+
+MESSAGES = [
+    "Add $45 for groceries",
+    "Spent $12.50 on lunch with friends",
+    "Set budget for entertainment to $200",
+    "What's my budget for food this month?",
+    "How do I start tracking my expenses?",
+    "Any tips for saving on rent?",
+    "How much did I spend this year?",
+    "Is this a good time to refinance my mortgage?",
+]
+
+
+def padded_keywords(size):
+    """The real keywords plus filler words, about size in total"""
+    per_intent = max(0, size // len(intents.KEYWORDS) - 1)
+    return {name: tuple(words) + tuple(f"{name}filler{i}" for i in range(per_intent))
+            for name, words in intents.KEYWORDS.items()}
+
+
+def substring_chain(keywords):
+    """The pre-router approach: one `in` scan of the message per keyword"""
+    def route(message):
+        text = message.lower()
+        for name, words in keywords.items():
+            if any(word in text for word in words):
+                return name
+        return "unknown"
+    return route
+
+
+def per_message_us(route, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in MESSAGES:
+            route(message)
+    return (time.perf_counter() - start) / (repeat * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'keywords':>9s} {'substring us/msg':>17s} {'router us/msg':>14s}")
+    for size in args.sizes:
+        keywords = padded_keywords(size)
+        router = intents.IntentRouter(keywords=keywords)
+        print(f"{sum(map(len, keywords.values())):9d} "
+              f"{per_message_us(substring_chain(keywords), args.repeat):17.2f} "
+              f"{per_message_us(router.route, args.repeat):14.2f}")
+
+
+if __name__ == "__main__":
+    main()
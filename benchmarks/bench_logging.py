@@ -0,0 +1,135 @@
+"""Cost of /chat's diagnostics: the old print() calls versus logs.py.
+
+Sends the same /chat messages from --threads concurrent clients, in-process,
+with no model configured. Only the logging changes between runs:
+
+    print (before)        parse_expense_message printing two lines per
+                          message, as app.py did
+    sync, DEBUG           every event formatted and written by the request thread
+    queue, DEBUG          every event, written by the listener thread
+    queue, DEBUG, 1%      the chat.intent event sampled at 1%
+    queue, INFO           the default: debug events are skipped
+
+Output is line buffered, like stdout in a container (PYTHONUNBUFFERED),
+so each line is one write() as it was with print(). By default it goes to
+a pipe drained at --drain-kbps, like a log collector that falls behind:
+once the pipe is full a write waits for the reader. With --sink file it
+goes to a local file, which never pushes back.
+
+    python benchmarks/bench_logging.py --threads 8 --requests 2000 --drain-kbps 64
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+MESSAGES = ["What is a good savings rate?", "Spent $12 on lunch", "How do I budget for rent?",
+            "Set budget for food to $400", "Any tips on paying off debt?"]
+
+
+def printing_parse_expense_message(app):
+    """app.parse_expense_message as it was, printing the message"""
+    def parse_expense_message(message, intent=None):
+        intent = intent or app.intents.route(message)
+        print(f"Attempting to parse expense from: '{intent.text}'")
+        if intent.name == "add_expense":
+            print(f"Successfully parsed expense: ${intent.amount} for {intent.description} "
+                  f"(Category: {intent.category})")
+            return {"amount": intent.amount, "description": intent.description, "category": intent.category}
+        print("Message does not match expense pattern")
+        return None
+    return parse_expense_message
+
+
+def slow_pipe(kbps):
+    """A line-buffered file object whose reader takes kbps KiB a second"""
+    read_end, write_end = os.pipe()
+
+    def drain():
+        while os.read(read_end, 1024):
+            time.sleep(1 / kbps)
+
+    threading.Thread(target=drain, daemon=True).start()
+    return open(write_end, "w", buffering=1)
+
+
+def run(app, threads, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client_thread(index):
+        client = app.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = f"bench_{index}"
+        mine = []
+        for n in range(requests // threads):
+            start = time.perf_counter()
+            client.post("/chat", json={"message": MESSAGES[n % len(MESSAGES)]})
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=client_thread, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sink", choices=["pipe", "file"], default="pipe")
+    parser.add_argument("--drain-kbps", type=float, default=64, help="how fast the pipe is read")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_PATH"] = os.path.join(tmp, "bench.db")
+        os.environ["CHAT_STATE"] = "memory"
+        os.environ.setdefault("SECRET_KEY", "bench")
+        import app
+        import logs
+        app.init_db()
+        app.model = None
+        if args.sink == "pipe":
+            sink = slow_pipe(args.drain_kbps)
+        else:
+            sink = open(os.path.join(tmp, "log.txt"), "w", buffering=1)
+        parse = app.parse_expense_message
+
+        configs = [
+            ("print (before)", dict(level="WARNING"), True),
+            ("sync, DEBUG", dict(level="DEBUG", asynchronous=False), False),
+            ("queue, DEBUG", dict(level="DEBUG"), False),
+            ("queue, DEBUG, 1%", dict(level="DEBUG", sample_rates={"chat.intent": 0.01}), False),
+            ("queue, INFO", dict(level="INFO"), False),
+        ]
+        sink_name = f"a pipe read at {args.drain_kbps:g} KiB/s" if args.sink == "pipe" else "a file"
+        print(f"/chat, {args.threads} threads, {args.requests} requests per run, logging to {sink_name}")
+        print(f"{'logging':20s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'dropped':>8s}")
+        for label, options, printing in configs:
+            logs.configure(stream=sink, **{"sample_rates": {}, **options})
+            app.parse_expense_message = printing_parse_expense_message(app) if printing else parse
+            with contextlib.redirect_stdout(sink):
+                run(app, args.threads, args.requests // 10)      # warm up
+                throughput, p50, p99 = run(app, args.threads, args.requests)
+            dropped = logs.dropped()
+            # Not timed: the listener may still be writing to a slow pipe
+            logs.stop()
+            print(f"{label:20s} {throughput:8.1f} {p50 * 1000:8.2f} {p99 * 1000:8.2f} {dropped:8d}")
+        sink.close()
+        app.db_pool.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
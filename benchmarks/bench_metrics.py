@@ -0,0 +1,98 @@
+"""What the /metrics instrumentation costs per request and per SQLite statement.
+
+Times the same work with and without it:
+
+- a primary-key SELECT on a plain sqlite3 connection and on a
+  metrics.TimedConnection
+- a GET of a trivial route on a bare Flask app and on one passed to
+  metrics.instrument()
+
+It also times a single histogram observation and rendering the registry.
+
+    python benchmarks/bench_metrics.py --statements 100000 --requests 5000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask
+
+import metrics
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def statement_cost(path, factory, count):
+    conn = sqlite3.connect(path, factory=factory)
+
+    def run():
+        for i in range(count):
+            conn.execute("SELECT amount FROM expenses WHERE id = ?", (i % 1000 + 1,)).fetchone()
+
+    elapsed = best_of(run)
+    conn.close()
+    return elapsed / count
+
+
+def request_cost(instrumented, count):
+    app = Flask(__name__)
+    if instrumented:
+        metrics.instrument(app)
+
+    @app.route("/ping")
+    def ping():
+        return "ok"
+
+    client = app.test_client()
+
+    def run():
+        for _ in range(count):
+            client.get("/ping")
+
+    return best_of(run) / count
+
+
+def report(label, plain, timed):
+    print(f"  {label:28s} {plain * 1e6:8.2f} us -> {timed * 1e6:8.2f} us  "
+          f"(+{(timed - plain) * 1e6:.2f} us, {(timed - plain) / plain:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE expenses (id INTEGER PRIMARY KEY, amount REAL)")
+            conn.executemany("INSERT INTO expenses (amount) VALUES (?)", [(i,) for i in range(1000)])
+        print("Per operation, without -> with instrumentation:")
+        report("SELECT by primary key", statement_cost(path, sqlite3.Connection, args.statements),
+               statement_cost(path, metrics.TimedConnection, args.statements))
+    report("GET /ping (Flask test client)", request_cost(False, args.requests),
+           request_cost(True, args.requests))
+
+    histogram = metrics.Histogram("bench_seconds", "", ("route", "method"))
+    observe = best_of(lambda: [histogram.observe(0.003, "/chat", "POST") for _ in range(args.statements)])
+    print(f"\n  Histogram.observe()          {observe / args.statements * 1e6:8.2f} us")
+    render = best_of(metrics.REGISTRY.render)
+    print(f"  REGISTRY.render()            {render * 1e3:8.2f} ms "
+          f"({len(metrics.REGISTRY.render().splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
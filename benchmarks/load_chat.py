@@ -0,0 +1,211 @@
+"""Drive the app with a mixed /chat, /add_expense, /dashboard and /analyze_expenses load.
+
+Each worker thread is one user with its own session. It picks requests from
+a weighted mix for a fixed time. At the end the script reports throughput
+and p50/p95/p99 latency per endpoint.
+
+Without --url the app runs in-process against a scratch database, using
+the fake model (MODEL_BACKEND=fake, see src/fake_model.py). No server or
+API key is needed:
+
+    python benchmarks/load_chat.py --workers 16 --seconds 10
+    FAKE_MODEL_LATENCY=lognormal:1.2:0.6 FAKE_MODEL_ERROR_RATE=0.05 python benchmarks/load_chat.py
+
+With --url the same workload is sent to a running server over HTTP:
+
+    MODEL_BACKEND=fake python src/app.py &
+    python benchmarks/load_chat.py --url http://localhost:5000
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+CHAT_MESSAGES = [
+    "How do I start budgeting?",
+    "What's a good way to build an emergency fund?",
+    "Should I pay off debt or invest first?",
+    "Add $12 for lunch",
+    "Spent $45 on groceries",
+    "Add $30 for uber",
+    "Set budget for food to $400",
+    "How can I save more each month?",
+    "What's my budget for food?",
+]
+
+EXPENSES = [("12.50", "food", "lunch"), ("60", "transport", "fuel"), ("15.99", "entertainment", "netflix"),
+            ("1200", "housing", "rent"), ("80", "utilities", "electricity"), ("35", "shopping", "amazon order")]
+
+DEFAULT_MIX = "chat=5,add_expense=3,dashboard=2,analyze=1"
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class InProcessClient:
+    """Flask test client; one per worker so each keeps its own session cookie"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post_json(self, path, payload):
+        return self.client.post(path, json=payload).status_code
+
+    def post_form(self, path, form):
+        return self.client.post(path, data=form).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _send(self, request):
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            # Redirects surface here because they are not followed
+            return e.code
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post_json(self, path, payload):
+        return self._send(urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode(),
+                                                 headers={"Content-Type": "application/json"}))
+
+    def post_form(self, path, form):
+        return self._send(urllib.request.Request(self.base_url + path,
+                                                 data=urllib.parse.urlencode(form).encode()))
+
+
+def make_request(kind, client, rng):
+    if kind == "chat":
+        return client.post_json("/chat", {"message": rng.choice(CHAT_MESSAGES)})
+    if kind == "add_expense":
+        amount, category, description = rng.choice(EXPENSES)
+        return client.post_form("/add_expense", {"amount": amount, "category": category,
+                                                 "description": description,
+                                                 "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"})
+    if kind == "dashboard":
+        return client.get("/dashboard")
+    if kind == "analyze":
+        return client.post_json("/analyze_expenses", {})
+    raise ValueError(f"Unknown request kind '{kind}'")
+
+
+def run(make_client, mix, workers, seconds, seed):
+    latencies = {kind: [] for kind in mix}
+    errors = {kind: 0 for kind in mix}
+    lock = threading.Lock()
+    kinds, weights = list(mix), list(mix.values())
+    start = time.perf_counter()
+    stop = start + seconds
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = make_client()
+        client.get("/")                 # start a session, like a browser would
+        mine = {kind: [] for kind in mix}
+        failed = {kind: 0 for kind in mix}
+        while time.perf_counter() < stop:
+            kind = rng.choices(kinds, weights)[0]
+            began = time.perf_counter()
+            try:
+                status = make_request(kind, client, rng)
+            except Exception:
+                status = None
+            mine[kind].append(time.perf_counter() - began)
+            if status is None or status >= 400:
+                failed[kind] += 1
+        with lock:
+            for kind in mix:
+                latencies[kind].extend(mine[kind])
+                errors[kind] += failed[kind]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(latencies, errors, elapsed):
+    print(f"{'endpoint':12s} {'requests':>9s} {'req/s':>8s} {'errors':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    rows = list(latencies.items()) + [("all", [v for values in latencies.values() for v in values])]
+    for kind, values in rows:
+        values = sorted(values)
+        failed = sum(errors.values()) if kind == "all" else errors[kind]
+        print(f"{kind:12s} {len(values):9d} {len(values) / elapsed:8.1f} {failed:7d} "
+              f"{percentile(values, 50) * 1000:8.1f} {percentile(values, 95) * 1000:8.1f} "
+              f"{percentile(values, 99) * 1000:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server; in-process if omitted")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted request mix (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.url:
+        latencies, errors, elapsed = run(lambda: HTTPClient(args.url), mix, args.workers, args.seconds, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ.setdefault("MODEL_BACKEND", "fake")
+            os.environ["DATABASE_PATH"] = os.path.join(tmp, "load.db")
+            os.environ.setdefault("SECRET_KEY", "bench")
+            import app
+            import logs
+            logs.configure()
+            app.init_db()
+            latencies, errors, elapsed = run(lambda: InProcessClient(app.app), mix,
+                                             args.workers, args.seconds, args.seed)
+            app.db_pool.get_pool().close()
+
+    print(f"{args.workers} workers, {elapsed:.1f}s, mix {args.mix}"
+          f"{'' if args.url else ', in-process with MODEL_BACKEND=' + os.environ['MODEL_BACKEND']}")
+    report(latencies, errors, elapsed)
+
+
+if __name__ == "__main__":
+    main()
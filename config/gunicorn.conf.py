@@ -0,0 +1,44 @@
+"""gunicorn settings for serving the app with several worker processes.
+
+    gunicorn -c config/gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) and warmed up there
+before the workers are forked, so each worker starts with pandas and the
+migrated schema already in place instead of paying for them on its first
+request. The model client and the SQLite connections are created in each
+worker after the fork (see app.warm_up).
+
+SECRET_KEY must be set: every worker has to accept the session cookies the
+others sign. Each worker saves its /metrics figures to METRICS_DIR (a new
+temporary directory unless set) and a scrape of any worker sums them all.
+WRITE_BEHIND=1 only works with WEB_CONCURRENCY=1: a user's next request may
+go to a worker that has not seen the write still queued in another.
+"""
+import os
+import tempfile
+
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+bind = os.getenv("BIND", "127.0.0.1:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# So that app.session_secret() knows the key is shared
+os.environ["WEB_CONCURRENCY"] = str(workers)
+if not os.getenv("METRICS_DIR"):
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="aiwealth-metrics-")
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    import logs
+    import metrics
+    # Before the fork, so the workers inherit it (logs.py restarts its thread in each)
+    logs.configure()
+    # Figures left by an earlier run would be added to this one's
+    metrics.REGISTRY.clear_directory()
+    app.warm_up(create_model=False)
+
+
+def child_exit(server, worker):
+    import metrics
+    # Keep the exited worker's totals, in one file for all of them
+    metrics.REGISTRY.retire(worker.pid)
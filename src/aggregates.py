@@ -0,0 +1,115 @@
+"""Per-user expense aggregates for the dashboard.
+
+ExpenseSummary holds category totals and counts, the grand total and the
+date range. The storage backends keep one up to date as expenses are
+added, deleted and recategorized, so rendering the dashboard costs the
+same however many expenses a user has. The in-memory store updates it in
+place. SQLite builds it from the budget_rollups table, which database.py
+already maintains on every write.
+"""
+import heapq
+from datetime import date as _date
+
+
+def _day(date):
+    return str(date)[:10] if date else None
+
+
+class ExpenseSummary:
+    __slots__ = ("totals", "counts", "days", "first_date", "last_date")
+
+    def __init__(self, totals=None, counts=None, first_date=None, last_date=None):
+        self.totals = dict(totals or {})
+        self.counts = dict(counts or {})
+        # Expenses per day; only kept when the summary is maintained in place,
+        # so deleting the first or last expense can find the new range
+        self.days = None
+        self.first_date = _day(first_date)
+        self.last_date = _day(last_date)
+
+    @classmethod
+    def tracking(cls):
+        summary = cls()
+        summary.days = {}
+        return summary
+
+    @property
+    def total(self):
+        return sum(self.totals.values())
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def add(self, amount, category, date):
+        self.totals[category] = self.totals.get(category, 0) + amount
+        self.counts[category] = self.counts.get(category, 0) + 1
+        day = _day(date)
+        if day:
+            self.days[day] = self.days.get(day, 0) + 1
+            if self.first_date is None or day < self.first_date:
+                self.first_date = day
+            if self.last_date is None or day > self.last_date:
+                self.last_date = day
+
+    def remove(self, amount, category, date):
+        self._take(category, amount)
+        day = _day(date)
+        if day and day in self.days:
+            self.days[day] -= 1
+            if not self.days[day]:
+                del self.days[day]
+                # Only losing an end of the range needs a rescan of the days
+                if day in (self.first_date, self.last_date):
+                    self.first_date = min(self.days, default=None)
+                    self.last_date = max(self.days, default=None)
+
+    def move(self, amount, old_category, new_category):
+        self._take(old_category, amount)
+        self.totals[new_category] = self.totals.get(new_category, 0) + amount
+        self.counts[new_category] = self.counts.get(new_category, 0) + 1
+
+    def _take(self, category, amount):
+        self.counts[category] -= 1
+        self.totals[category] -= amount
+        if not self.counts[category]:
+            del self.counts[category]
+            del self.totals[category]
+
+    def copy(self):
+        summary = ExpenseSummary(self.totals, self.counts, self.first_date, self.last_date)
+        if self.days is not None:
+            summary.days = dict(self.days)
+        return summary
+
+    def chart_data(self):
+        """(categories, amounts) in category order, for the pie chart"""
+        categories = sorted(self.totals)
+        return categories, [self.totals[category] for category in categories]
+
+    def top_categories(self, n=3):
+        top = heapq.nlargest(n, self.totals.items(), key=lambda item: item[1])
+        return [{"category": category, "amount": amount} for category, amount in top]
+
+    def as_dict(self, top=3):
+        """What the dashboard shows, as JSON-ready values"""
+        categories, amounts = self.chart_data()
+        return {
+            "total": self.total,
+            "count": self.count,
+            "monthly_avg": self.monthly_average(),
+            "categories": categories,
+            "amounts": amounts,
+            "top_categories": self.top_categories(top),
+        }
+
+    def monthly_average(self):
+        """Total spread over the calendar months from the first expense to the
+        last, inclusive (the same figure as analytics.SpendingAnalysis)"""
+        total = self.total
+        try:
+            first = _date.fromisoformat(self.first_date)
+            last = _date.fromisoformat(self.last_date)
+        except (TypeError, ValueError):
+            return total
+        return total / max(1, (last.year - first.year) * 12 + last.month - first.month + 1)
@@ -0,0 +1,176 @@
+"""Spending analytics over a user's whole expense history.
+
+analyze() turns the DataFrame from ExpenseStore.expense_frame() into a
+SpendingAnalysis with one row per calendar month, from the first expense to
+the last, and one column per category (months without spending are zero):
+
+    monthly       spend per month and category
+    rolling_3     3-month rolling mean of monthly
+    rolling_12    12-month rolling mean (over fewer months at the start)
+    deltas        change from the previous month
+    baseline      mean of the (up to) 12 months before each month
+    zscores       each month against that baseline; NaN until there are 3
+                  months of history, or while spending has not varied
+
+Every figure comes from whole-frame pandas/NumPy operations; nothing loops
+over expenses or months in Python. user_analysis() caches the result per
+user and data version, so it is computed once per change to a user's
+expenses and shared by the dashboard and /analyze_expenses.
+
+pandas and NumPy are imported on first use, keeping them out of start-up.
+"""
+import math
+
+from cache import LRUCache
+
+# Months of history a z-score is measured against, and the least it needs
+WINDOW = 12
+MIN_HISTORY = 3
+# z-score at or above which a month counts as unusually high spending
+ANOMALY_THRESHOLD = 2.0
+
+# (user_id, data version) -> SpendingAnalysis; a write changes the version,
+# so stale entries are never read again and age out of the LRU
+analysis_cache = LRUCache(maxsize=256)
+
+
+def _money(value):
+    value = float(value)
+    return None if math.isnan(value) else round(value, 2)
+
+
+def _signed(value):
+    return f"{'+' if value >= 0 else '-'}${abs(value):.2f}"
+
+
+class SpendingAnalysis:
+    __slots__ = ("monthly", "rolling_3", "rolling_12", "deltas", "baseline", "zscores")
+
+    def __init__(self, monthly, window=WINDOW, min_history=MIN_HISTORY):
+        self.monthly = monthly
+        self.rolling_3 = monthly.rolling(3, min_periods=1).mean()
+        self.rolling_12 = monthly.rolling(12, min_periods=1).mean()
+        self.deltas = monthly.diff()
+        history = monthly.shift(1).rolling(window, min_periods=min_history)
+        self.baseline = history.mean()
+        spread = history.std()
+        self.zscores = (monthly - self.baseline) / spread.where(spread > 0)
+
+    @property
+    def months(self):
+        return [str(month) for month in self.monthly.index]
+
+    @property
+    def categories(self):
+        return list(self.monthly.columns)
+
+    def totals(self):
+        """Spend per month across all categories"""
+        return self.monthly.sum(axis=1)
+
+    def monthly_average(self):
+        return float(self.totals().mean()) if len(self.monthly) else 0.0
+
+    def latest(self):
+        """Per category for the latest month: amount, 3- and 12-month averages
+        and the change from the month before, biggest spend first"""
+        import pandas as pd
+
+        if self.monthly.empty:
+            return []
+        table = pd.DataFrame({
+            "amount": self.monthly.iloc[-1],
+            "avg_3": self.rolling_3.iloc[-1],
+            "avg_12": self.rolling_12.iloc[-1],
+            "delta": self.deltas.iloc[-1],
+        })
+        table = table[(table["amount"] > 0) | (table["avg_12"] > 0)].sort_values("amount", ascending=False)
+        return [{"category": category, **{key: _money(value) for key, value in row.items()}}
+                for category, row in table.iterrows()]
+
+    def anomalies(self, threshold=ANOMALY_THRESHOLD):
+        """Months whose spend in a category is threshold standard deviations
+        or more above its baseline, oldest first"""
+        import numpy as np
+
+        rows, columns = np.nonzero(self.zscores.to_numpy() >= threshold)
+        return [{
+            "month": str(self.monthly.index[row]),
+            "category": self.monthly.columns[column],
+            "amount": _money(self.monthly.iat[row, column]),
+            "baseline": _money(self.baseline.iat[row, column]),
+            "zscore": round(float(self.zscores.iat[row, column]), 1),
+        } for row, column in zip(rows, columns)]
+
+    def as_dict(self):
+        """JSON-ready figures for the dashboard"""
+        totals = self.totals()
+        return {
+            "months": self.months,
+            "totals": [_money(value) for value in totals],
+            "totals_rolling_3": [_money(value) for value in totals.rolling(3, min_periods=1).mean()],
+            "monthly_average": _money(self.monthly_average()),
+            "latest_month": self.months[-1] if len(self.monthly) else None,
+            "latest": self.latest(),
+            "anomalies": self.anomalies(),
+        }
+
+    def prompt(self):
+        """A compact plain-text summary to send to the model"""
+        if self.monthly.empty:
+            return "No expenses recorded yet.\n"
+        totals = self.totals()
+        by_category = self.monthly.sum().sort_values(ascending=False)
+        grand_total = by_category.sum()
+        months = self.months
+        lines = [
+            f"Months covered: {months[0]} to {months[-1]} ({len(months)})",
+            f"Total spent: ${grand_total:.2f}; average per month: ${self.monthly_average():.2f}",
+            "All-time by category: " + ", ".join(
+                f"{category} ${amount:.2f} ({amount / grand_total * 100:.0f}%)"
+                for category, amount in by_category.items() if amount > 0),
+        ]
+        latest = f"Latest month ({months[-1]}): ${totals.iloc[-1]:.2f}"
+        if len(totals) > 1:
+            latest += f" ({_signed(totals.iloc[-1] - totals.iloc[-2])} vs previous month)"
+        lines.append(latest)
+        lines.append("By category, latest month / 3-month avg / 12-month avg / change vs previous month:")
+        for row in self.latest():
+            change = "n/a" if row["delta"] is None else _signed(row["delta"])
+            lines.append(f"- {row['category']}: ${row['amount']:.2f} / ${row['avg_3']:.2f} / "
+                         f"${row['avg_12']:.2f} / {change}")
+        anomalies = self.anomalies()
+        if anomalies:
+            lines.append(f"Unusually high months (at least {ANOMALY_THRESHOLD:g} standard deviations "
+                         f"above the previous {WINDOW} months):")
+            lines.extend(f"- {a['month']} {a['category']}: ${a['amount']:.2f} vs usual ${a['baseline']:.2f} "
+                         f"(z={a['zscore']})" for a in anomalies)
+        return "\n".join(lines) + "\n"
+
+
+def monthly_spend(df):
+    """Month x category table of spend from an expense frame, gaps filled with 0"""
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(dtype=float, index=pd.PeriodIndex([], freq="M"))
+    months = df["date"].dt.to_period("M").rename("month")
+    monthly = (df.groupby([months, df["category"].astype(str)])["amount"].sum()
+               .unstack(fill_value=0.0))
+    full_range = pd.period_range(monthly.index.min(), monthly.index.max(), freq="M", name="month")
+    monthly = monthly.reindex(full_range, fill_value=0.0)
+    monthly.columns = list(monthly.columns)
+    return monthly.astype(float)
+
+
+def analyze(df, window=WINDOW, min_history=MIN_HISTORY):
+    """SpendingAnalysis of an expense frame (amount, date, category columns)"""
+    return SpendingAnalysis(monthly_spend(df), window, min_history)
+
+
+def user_analysis(store, user_id):
+    """The cached SpendingAnalysis of a user's expenses in store"""
+    # A write between reading the version and the frame caches newer data
+    # under the older version; the next read sees the new version and redoes it
+    version = store.data_version(user_id)
+    return analysis_cache.get_or_load((user_id, version), lambda: analyze(store.expense_frame(user_id)))
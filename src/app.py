@@ -1,30 +1,119 @@
 import os
+import base64
+import hashlib
 import json
-import pandas as pd
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-import google.generativeai as genai
-from dotenv import load_dotenv
+import secrets
+import threading
+import time
+import uuid
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 from datetime import datetime
-import sqlite3
+import db_pool
+import database
+import intents
+import analytics
+from categories import categorize
+import importer
+import storage
+from chat_history import create_chat_histories
+from llm_cache import ResponseCache
+import llm_client
+import logs
+import metrics
+from chatbot import chatbot_response
 #import plotly.express as px
-import traceback  # For error tracking
+
+# Set up by whatever serves the app (__main__ below, config/gunicorn.conf.py):
+# JSON lines on stderr, written by a background thread (LOG_LEVEL, LOG_SAMPLE)
+log = logs.get_logger("app")
+
+# Start-up stays cheap: pandas, google.generativeai and python-dotenv are
+# imported when first needed and the model client is created by get_model()
+# on first use, or ahead of time by warm_up()
+
+def load_env():
+    """Load the nearest .env file into os.environ, like python-dotenv's
+    load_dotenv(); the package is only imported when there is one"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
 
 # Load environment variables
-load_dotenv()
+load_env()
+
+# Bounded concurrency, deadlines, retries and a circuit breaker (see llm_client.py)
+def guard_model(raw_model):
+    return llm_client.ResilientModel(
+        raw_model,
+        max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", "4")),
+        timeout=float(os.getenv("LLM_TIMEOUT", "20")),
+        retries=int(os.getenv("LLM_RETRIES", "2")),
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_after=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    )
 
-# Configure Gemini API
-api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
+# Configure Gemini API (MODEL_BACKEND=fake swaps in a local model for load tests)
+def load_model():
+    """Create the guarded model client from the environment; None without an API key"""
+    if os.getenv("MODEL_BACKEND", "gemini") == "fake":
+        import fake_model
+        log.info("model.configured", backend="fake")
+        return guard_model(fake_model.from_env())
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        log.warning("model.not_configured", reason="GEMINI_API_KEY is not set")
+        return None
     try:
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        print("Gemini API configured successfully")
-    except Exception as e:
-        print(f"Warning: Failed to configure Gemini API: {str(e)}")
-        model = None
-else:
-    model = None
-    print("Warning: GEMINI_API_KEY not found in .env file")
+        configured = guard_model(genai.GenerativeModel('gemini-2.0-flash'))
+        log.info("model.configured", backend="gemini")
+        return configured
+    except Exception:
+        log.exception("model.not_configured", reason="Gemini configuration failed")
+        return None
+
+# The model client; NOT_LOADED until get_model() first runs (tests may set it directly)
+NOT_LOADED = object()
+model = NOT_LOADED
+_model_lock = threading.Lock()
+
+def get_model():
+    """The model client (None if not configured), created on first call"""
+    global model
+    if model is NOT_LOADED:
+        with _model_lock:
+            if model is NOT_LOADED:
+                model = load_model()
+    return model
+
+def warm_up(create_model=True):
+    """Do the deferred start-up work now rather than on the first request
+
+    From a pre-fork hook (see config/gunicorn.conf.py) pass
+    create_model=False: the libraries are imported and the schema migrated
+    once, and the workers share the result. Nothing that cannot cross a
+    fork is kept: the SQLite connections, the response cache's included,
+    are closed, and the Gemini client, whose gRPC channels do not survive a
+    fork, is left for each worker to create on first use.
+    """
+    import pandas  # noqa: F401 - expense frames and analytics
+    init_db()
+    if create_model:
+        get_model()
+        return
+    db_pool.configure()
+    response_cache.close()
+    if os.getenv("GEMINI_API_KEY") and os.getenv("MODEL_BACKEND", "gemini") != "fake":
+        import google.generativeai  # noqa: F401
 
 # Initialize system prompt with financial advisor context
 SYSTEM_PROMPT = """
@@ -49,50 +138,61 @@ Please be supportive, non-judgmental, and focused on helping users improve their
 If asked about specific investments or complex tax situations, kindly explain that you can provide general guidance but recommend consulting with a certified financial professional for specific advice.
 """
 
+def session_secret():
+    """SECRET_KEY, which signs the session cookie holding each user's id
+
+    Several workers (WEB_CONCURRENCY) must share one, so it is required
+    there. A single process, such as the development server, makes a random
+    key instead: that works, but a restart signs everyone out and leaves
+    their SQLite data under a user id nobody has any more.
+    """
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        raise RuntimeError("Set SECRET_KEY: every worker must sign sessions with the same key")
+    log.warning("session.random_secret_key", hint="set SECRET_KEY to keep sessions across restarts")
+    return secrets.token_hex(32)
+
 # Initialize Flask app
 app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "aiwealth-secret-key")
+app.secret_key = session_secret()
+
+# Request counts and latencies per route, served with the rest at /metrics
+metrics.instrument(app)
+
+# Expense storage backend (EXPENSE_STORE=sqlite|memory, SQLite by default)
+expense_store = storage.create_store()
 
-# In-memory storage for demo purposes
-# In a production app, use a database
-expense_data = {}
-chat_histories = {}
+# Bounded per-user chat histories replayed to Gemini on each turn, shared by
+# the worker processes (CHAT_STATE=sqlite|memory, SQLite by default)
+chat_histories = create_chat_histories(
+    max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "1000")),
+    max_turns=int(os.getenv("CHAT_MAX_TURNS", "20")),
+    max_tokens=int(os.getenv("CHAT_MAX_TOKENS", "2000")),
+    idle_seconds=int(os.getenv("CHAT_IDLE_SECONDS", "3600")),
+)
+
+# Cached Gemini answers for repeated first-turn questions and unchanged analyses
+# (set LLM_CACHE_DB to a file path to share them across workers and restarts)
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("LLM_CACHE_TTL", "3600")),
+    persist_path=os.getenv("LLM_CACHE_DB") or None,
+)
+
+LIMITED_MODE_RESPONSE = "I'm currently running in limited mode. Please configure a Gemini API key to enable all features."
+
+ANALYSIS_PROMPT = "You are a financial advisor analyzing expense data. Provide specific insights and recommendations."
 
 # Database functions
 def connect_db():
-    return sqlite3.connect('database.db')
+    return db_pool.connect()
 
 def init_db():
-    conn = connect_db()
-    cursor = conn.cursor()
-
-    # Table for storing expenses (in memory for this demo)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            amount REAL NOT NULL,
-            description TEXT NOT NULL,
-            category TEXT,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Table for tracking budgets
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS budgets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            category TEXT NOT NULL,
-            limit_amount REAL NOT NULL,
-            spent_amount REAL DEFAULT 0,
-            UNIQUE(user_id, category)
-        )
-    ''')
+    # Schema is shared with database.py and managed by migrations.py
+    database.init_db()
 
-    conn.commit()
-    conn.close()
-    
 '''
 def parse_expense_message(message):
    """Extract expense details from chat messages like 'Add $45 for groceries'"""
@@ -146,193 +246,271 @@ def parse_expense_message(message):
     return None
 '''
 
-def parse_expense_message(message):
+def parse_expense_message(message, intent=None):
     """Extract expense details from chat messages like 'Add $45 for groceries'"""
-    message = message.lower().strip()
+    intent = intent or intents.route(message)
     
-    print(f"Attempting to parse expense from: '{message}'")
+    # Only the outcome: the message itself is the user's
+    log.debug("chat.intent", intent=intent.name, chars=len(intent.text))
     
-    # Simple pattern matching approach
-    if ("add" in message or "spent" in message or "paid" in message) and "$" in message and ("for" in message or "on" in message):
-        try:
-            # Extract amount using dollar sign as reference
-            parts = message.split("$")
-            amount_part = parts[1].split()[0].replace(',', '')
-            amount = float(amount_part)
-            
-            # Extract description - everything after "for" or "on"
-            if "for" in message:
-                description_part = message.split("for")[1].strip()
-            elif "on" in message:
-                description_part = message.split("on")[1].strip()
-            else:
-                description_part = message.split("$")[1].split(None, 1)[1].strip() if len(message.split("$")[1].split()) > 1 else "misc expense"
-            
-            # Category mapping - extended
-            category_mapping = {
-                # Food
-                "groceries": "food", "grocery": "food", "restaurant": "food", 
-                "dining": "food", "meal": "food", "lunch": "food", "dinner": "food",
-                "breakfast": "food", "coffee": "food", "food": "food", "snack": "food",
-                
-                # Housing
-                "rent": "housing", "mortgage": "housing", "utility": "housing", 
-                "utilities": "housing", "electric": "housing", "water": "housing",
-                "gas bill": "housing", "internet": "housing", "cable": "housing",
-                
-                # Transportation
-                "gas": "transport", "fuel": "transport", "car": "transport", 
-                "bus": "transport", "subway": "transport", "train": "transport",
-                "taxi": "transport", "uber": "transport", "lyft": "transport",
-                
-                # Entertainment
-                "movie": "entertainment", "game": "entertainment", "concert": "entertainment",
-                "theater": "entertainment", "netflix": "entertainment", "ticket": "entertainment",
-                
-                # Shopping
-                "clothes": "shopping", "shoes": "shopping", "book": "shopping",
-                "amazon": "shopping", "gift": "shopping", "clothing": "shopping"
-            }
-            
-            # Try to categorize
-            category = "other"
-            for key, value in category_mapping.items():
-                if key in description_part:
-                    category = value
-                    break
-            
-            print(f"Successfully parsed expense: ${amount} for {description_part} (Category: {category})")
-            
-            return {
-                "amount": amount,
-                "description": description_part,
-                "category": category
-            }
-        except Exception as e:
-            print(f"Error parsing expense message: {str(e)}")
-            return None
+    if intent.name == "add_expense":
+        return {
+            "amount": intent.amount,
+            "description": intent.description,
+            "category": intent.category
+        }
     
-    print("Message does not match expense pattern")
     return None
 
 
+@app.before_request
+def assign_user_id():
+    # Every route works on the caller's own data, whichever page they open
+    # first; random, so users arriving in the same second (or at different
+    # workers) never share one
+    if 'user_id' not in session:
+        session['user_id'] = f"user_{uuid.uuid4().hex}"
+
 @app.route('/')
 def index():
-    # Generate a session ID if none exists
-    if 'user_id' not in session:
-        session['user_id'] = f"user_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    
     # Initialize chat history for this user if needed
-    user_id = session['user_id']
-    if user_id not in chat_histories:
-        chat_histories[user_id] = []
+    chat_histories.ensure(session['user_id'])
     
     return render_template('index.html')
 
+def rule_based_reply(user_id, user_message):
+    """Answer expense and budget commands without the model; None if neither matches"""
+    # Route the message once and reuse the parsed intent below
+    intent = intents.route(user_message, expense_store.category_overrides(user_id))
+    
+    # Check if message is about adding an expense
+    expense_info = parse_expense_message(user_message, intent)
+    if expense_info:
+        # Add expense to user's data
+        expense_store.add_expense(user_id, expense_info['amount'], expense_info['category'],
+                                  expense_info['description'], datetime.now().strftime('%Y-%m-%d'))
+        
+        # Send response about added expense
+        category_name = expense_info['category'].capitalize()
+        response_text = f"I've added your expense of ${expense_info['amount']:.2f} for {expense_info['description']} in the {category_name} category. You can view your spending breakdown in the dashboard."
+        
+        # Store response in chat history
+        chat_histories.append(user_id, "user", user_message)
+        chat_histories.append(user_id, "model", response_text)
+        
+        return response_text
+    
+    # Parse budget setting commands
+    if intent.name == "set_budget":
+        response_text = f"I've set your budget for {intent.category} to ${intent.amount:.2f}."
+        
+        # Store response in chat history
+        chat_histories.append(user_id, "user", user_message)
+        chat_histories.append(user_id, "model", response_text)
+        
+        return response_text
+    
+    return None
+
 @app.route('/chat', methods=['POST'])
 def chat():
     user_message = request.json.get('message', '')
-    user_id = session.get('user_id', 'default_user')
+    user_id = session['user_id']
     
     if not user_message:
         return jsonify({"response": "No message provided"})
     
     try:
-        # Check if message is about adding an expense
-        expense_info = parse_expense_message(user_message)
-        if expense_info:
-            # Add expense to the in-memory storage
-            if user_id not in expense_data:
-                expense_data[user_id] = []
-            
-            # Add expense to user's data
-            expense_data[user_id].append({
-                'amount': expense_info['amount'],
-                'category': expense_info['category'],
-                'description': expense_info['description'],
-                'date': datetime.now().strftime('%Y-%m-%d')
-            })
-            
-            # Send response about added expense
-            category_name = expense_info['category'].capitalize()
-            response_text = f"I've added your expense of ${expense_info['amount']:.2f} for {expense_info['description']} in the {category_name} category. You can view your spending breakdown in the dashboard."
-            
-            # Store response in chat history
-            if user_id not in chat_histories:
-                chat_histories[user_id] = []
-            
-            chat_histories[user_id].append({"role": "user", "parts": [user_message]})
-            chat_histories[user_id].append({"role": "model", "parts": [response_text]})
-            
+        response_text = rule_based_reply(user_id, user_message)
+        if response_text is not None:
             return jsonify({"response": response_text})
         
-        # Parse budget setting commands
-        if ("set budget" in user_message.lower() or "set a budget" in user_message.lower()) and "for" in user_message.lower() and "to" in user_message.lower():
-            message = user_message.lower()
-            # Extract category and amount
-            split_for = message.split("for")[1]
-            category_part = split_for.split("to")[0].strip()
-            amount_part = split_for.split("to")[1].strip()
-            
-            # Remove dollar sign if present
-            if "$" in amount_part:
-                amount_part = amount_part.replace("$", "")
-            
-            try:
-                amount = float(amount_part.replace(',', ''))
-                
-                # Store budget in memory (in a real app, save to database)
-                # Add user to budget dictionary if not exists
-                # In a real app, this would be a database update
-                
-                response_text = f"I've set your budget for {category_part} to ${amount:.2f}."
-                
-                # Store response in chat history
-                if user_id not in chat_histories:
-                    chat_histories[user_id] = []
-                
-                chat_histories[user_id].append({"role": "user", "parts": [user_message]})
-                chat_histories[user_id].append({"role": "model", "parts": [response_text]})
-                
-                return jsonify({"response": response_text})
-            except ValueError:
-                pass
-        
         # Regular chat processing for non-expense messages
-        if user_id not in chat_histories:
-            chat_histories[user_id] = []
-        
         # Add the user message to chat history
-        chat_histories[user_id].append({"role": "user", "parts": [user_message]})
+        chat_histories.append(user_id, "user", user_message)
+        history = chat_histories.history(user_id)
         
         # If the Gemini API is configured
+        model = get_model()
         if model:
-            # If this is the first message, include the system prompt
-            if len(chat_histories[user_id]) == 1:
-                response = model.generate_content([SYSTEM_PROMPT, user_message])
-            else:
-                # Create conversation context from chat history
-                convo = model.start_chat(history=chat_histories[user_id][:-1])
-                response = convo.send_message(user_message)
-            
-            # Add the AI response to chat history
-            bot_response = response.text
+            try:
+                # If this is the first message, include the system prompt
+                # (first turns carry no context, so identical questions share a cached answer)
+                if len(history) == 1:
+                    def generate():
+                        chat_histories.record_prompt([{"parts": [SYSTEM_PROMPT, user_message]}])
+                        return model.generate_content([SYSTEM_PROMPT, user_message]).text
+                    bot_response = response_cache.get_or_generate(
+                        response_cache.key("chat", SYSTEM_PROMPT, user_message), generate)
+                else:
+                    # Create conversation context from the (trimmed) chat history
+                    chat_histories.record_prompt(history)
+                    convo = model.start_chat(history=history[:-1])
+                    bot_response = convo.send_message(user_message).text
+            except llm_client.ModelUnavailable as e:
+                # Slow or failing upstream: answer from the local rule-based engine
+                log.warning("model.unavailable", sample=0.1, error=type(e).__name__, route="/chat")
+                bot_response = chatbot_response(user_message, user_id)
         else:
             # If Gemini API is not configured, use a fallback response
-            bot_response = "I'm currently running in limited mode. Please configure a Gemini API key to enable all features."
+            bot_response = LIMITED_MODE_RESPONSE
         
-        chat_histories[user_id].append({"role": "model", "parts": [bot_response]})
+        chat_histories.append(user_id, "model", bot_response)
         
         return jsonify({"response": bot_response})
     
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.exception("chat.error", route="/chat")
         return jsonify({"response": f"I'm sorry, I encountered an error: {str(e)}"})
+
+class StreamTimings:
+    """Time to first token of streamed chat replies"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self.streams += 1
+            self.total += seconds
+            self.worst = max(self.worst, seconds)
+            self.last = seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "streams": self.streams,
+                "ttft_ms_avg": round(self.total / self.streams * 1000, 1) if self.streams else 0,
+                "ttft_ms_max": round(self.worst * 1000, 1),
+                "ttft_ms_last": round(self.last * 1000, 1),
+            }
+
+stream_timings = StreamTimings()
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the whole stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/chat_stream', methods=['POST'])
+def chat_stream():
+    """Streaming /chat: "delta" events carry partial text, "done" the full reply"""
+    started = time.perf_counter()
+    user_message = request.json.get('message', '')
+    user_id = session['user_id']
+    
+    if not user_message:
+        return sse_response([sse_event("done", {"response": "No message provided"})])
+    
+    try:
+        # Rule-based commands answer immediately in a single event
+        response_text = rule_based_reply(user_id, user_message)
+    except Exception as e:
+        log.exception("chat.error", route="/chat_stream")
+        return sse_response([sse_event("error", {"response": f"I'm sorry, I encountered an error: {str(e)}"})])
+    if response_text is not None:
+        return sse_response([sse_event("done", {"response": response_text})])
+    
+    model = get_model()
+    if not model:
+        chat_histories.append(user_id, "user", user_message)
+        chat_histories.append(user_id, "model", LIMITED_MODE_RESPONSE)
+        return sse_response([sse_event("done", {"response": LIMITED_MODE_RESPONSE})])
+    
+    def generate():
+        # The history is only written once the whole reply has been streamed,
+        # so an abandoned or failed stream leaves no half-finished turn behind
+        history = chat_histories.history(user_id) + [{"role": "user", "parts": [user_message]}]
+        cache_key = None
+        parts = []
+        first_token = None
+        stream = None
+        try:
+            if len(history) == 1:
+                cache_key = response_cache.key("chat", SYSTEM_PROMPT, user_message)
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    chunks = [cached]
+                    cache_key = None
+                else:
+                    chat_histories.record_prompt([{"parts": [SYSTEM_PROMPT, user_message]}])
+                    stream = model.generate_content([SYSTEM_PROMPT, user_message], stream=True)
+                    chunks = (chunk.text for chunk in stream)
+            else:
+                chat_histories.record_prompt(history)
+                convo = model.start_chat(history=history[:-1])
+                stream = convo.send_message(user_message, stream=True)
+                chunks = (chunk.text for chunk in stream)
+            
+            for text in chunks:
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    stream_timings.record(first_token)
+                parts.append(text)
+                yield sse_event("delta", {"text": text})
+        except llm_client.ModelUnavailable as e:
+            log.warning("model.unavailable", sample=0.1, error=type(e).__name__, route="/chat_stream")
+            if parts:
+                # Stalled mid-reply: the text already sent cannot be replaced
+                yield sse_event("error", {"response": f"I'm sorry, I encountered an error: {str(e)}"})
+                return
+            # Before the first chunk, so the local reply stands alone
+            parts = [chatbot_response(user_message, user_id)]
+            cache_key = None
+        except Exception as e:
+            log.exception("chat.error", route="/chat_stream")
+            yield sse_event("error", {"response": f"I'm sorry, I encountered an error: {str(e)}"})
+            return
+        finally:
+            # Frees the model's slot if the client went away mid-reply
+            if hasattr(stream, "close"):
+                stream.close()
+        
+        bot_response = "".join(parts)
+        if cache_key:
+            response_cache.set(cache_key, bot_response)
+        chat_histories.append(user_id, "user", user_message)
+        chat_histories.append(user_id, "model", bot_response)
+        yield sse_event("done", {
+            "response": bot_response,
+            "ttft_ms": round(first_token * 1000, 1) if first_token is not None else None,
+        })
+    
+    return sse_response(stream_with_context(generate()))
+    
+@app.route('/chat_metrics')
+def chat_metrics():
+    """Chat history sizes, estimated prompt tokens and streaming time to first token"""
+    stats = {**chat_histories.stats(), **stream_timings.stats()}
+    if isinstance(model, llm_client.ResilientModel):
+        stats["model"] = model.stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, SQLite and Gemini metrics in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/llm_cache_metrics')
+def llm_cache_metrics():
+    """Hit rate of the Gemini response cache"""
+    return jsonify(response_cache.stats())
     
 '''
 @app.route('/dashboard')
 def dashboard():
-    user_id = session.get('user_id', 'default_user')
+    user_id = session['user_id']
     
     # Default empty data if user hasn't added expenses
     if user_id not in expense_data or not expense_data[user_id]:
@@ -385,42 +563,97 @@ def dashboard():
         expenses=expense_data[user_id]
     )'''
 
+# Expenses per page on the dashboard and in /api/dashboard
+DASHBOARD_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(after):
+    """Opaque ?after= value for a store's next_after"""
+    if after is None:
+        return None
+    raw = json.dumps(after, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything it did not make"""
+    if not cursor:
+        return None
+    after = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    if not isinstance(after, list) or not all(isinstance(v, (str, int, float)) for v in after):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return after
+
+def versioned_response(user_id, build, *parts):
+    """build()'s response with a strong ETag over the user's data version and
+    parts, or 304 Not Modified if the client's If-None-Match already has it"""
+    # Read the version before the data: a write in between makes the body
+    # newer than its tag, which only costs the client one extra download
+    version = expense_store.data_version(user_id)
+    etag = hashlib.sha1("\0".join(map(str, (user_id, version, request.path, *parts))).encode()).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    """Dashboard data as JSON: the summary (first page only) and a page of expenses
+
+    ?after= is the "next" value of the previous page and ?limit= the page
+    size. The strong ETag covers the user's data version and the page asked
+    for, so a client revalidating with If-None-Match gets 304 Not Modified
+    until an expense is added, deleted or recategorized.
+    """
+    user_id = session['user_id']
+    cursor = request.args.get('after', '')
+    try:
+        after = decode_cursor(cursor)
+        limit = min(int(request.args.get('limit', DASHBOARD_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({"message": "Invalid after or limit"}), 400
+
+    def build():
+        try:
+            expenses, next_after = expense_store.list_expenses_page(user_id, after=after, limit=limit)
+        except (TypeError, IndexError, ValueError):
+            return jsonify({"message": "Invalid after or limit"}), 400
+        payload = {"expenses": expenses, "next": encode_cursor(next_after)}
+        if after is None:
+            payload["summary"] = expense_store.summary(user_id).as_dict()
+        return jsonify(payload)
+
+    return versioned_response(user_id, build, cursor, limit)
+
+@app.route('/api/analytics')
+def api_analytics():
+    """Monthly totals, rolling averages, the latest month per category and
+    anomalies (see analytics.py), revalidated like /api/dashboard"""
+    user_id = session['user_id']
+    return versioned_response(user_id, lambda: jsonify(analytics.user_analysis(expense_store, user_id).as_dict()))
+
 @app.route('/dashboard')
 def dashboard():
-    user_id = session.get('user_id', 'default_user')
-    
-    # Add debug information
-    print(f"Dashboard accessed by user: {user_id}")
-    print(f"Available expense data: {list(expense_data.keys())}")
+    user_id = session['user_id']
     
     # Default empty data if user hasn't added expenses
-    if user_id not in expense_data or not expense_data[user_id]:
-        print("No expense data found for user")
+    # (the summary is kept up to date on every write, so this is O(categories))
+    summary = expense_store.summary(user_id)
+    log.debug("dashboard.view", expenses=summary.count)
+    if not summary.count:
         return render_template('dashboard.html', has_data=False)
     
     try:
-        # Process expense data for the dashboard
-        df = pd.DataFrame(expense_data[user_id])
-        print(f"DataFrame created with columns: {df.columns}")
-        print(f"DataFrame sample: {df.head()}")
-        
-        # Create category summary
-        category_summary = df.groupby('category')['amount'].sum().reset_index()
-        
         # Prepare data for Chart.js
-        categories = category_summary['category'].tolist()
-        amounts = category_summary['amount'].tolist()
-        
-        # Get total expenses and top categories
-        total_expenses = df['amount'].sum()
-        top_categories = category_summary.sort_values('amount', ascending=False).head(3)
-        
-        # Calculate monthly average (if dates are available)
-        monthly_avg = total_expenses
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            months = max(1, (df['date'].max() - df['date'].min()).days / 30)
-            monthly_avg = total_expenses / months
+        categories, amounts = summary.chart_data()
+        expenses, next_after = expense_store.list_expenses_page(user_id, limit=DASHBOARD_PAGE_SIZE)
         
         # Prepare data for the template
         return render_template(
@@ -428,96 +661,195 @@ def dashboard():
             has_data=True,
             categories=categories,
             amounts=amounts,
-            total_expenses=total_expenses,
-            top_categories=top_categories.to_dict('records'),
-            monthly_avg=monthly_avg,
-            expenses=expense_data[user_id]
+            total_expenses=summary.total,
+            top_categories=summary.top_categories(3),
+            monthly_avg=summary.monthly_average(),
+            # Only the first page; the page fetches the rest from /api/dashboard
+            expenses=expenses,
+            next_cursor=encode_cursor(next_after)
         )
     except Exception as e:
-        print(f"Error in dashboard route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("dashboard.error")
         return render_template('dashboard.html', has_data=False, 
                               error=f"Error generating dashboard: {str(e)}")
     
     
 @app.route('/add_expense', methods=['POST'])
 def add_expense():
-    user_id = session.get('user_id', 'default_user')
-    
-    # Ensure user has an expense list
-    if user_id not in expense_data:
-        expense_data[user_id] = []
+    user_id = session['user_id']
     
     # Get expense details from form
     try:
         amount = float(request.form.get('amount', 0))
-        category = request.form.get('category', 'Uncategorized')
+        category = request.form.get('category', 'auto')
         description = request.form.get('description', '')
-        date = request.form.get('date', datetime.now().strftime('%Y-%m-%d'))
+        # Checked by the store: a local calendar date, today if left empty
+        date = request.form.get('date', '')
+        
+        # Pick the category from the description (and what this user taught us)
+        if category in ('', 'auto', 'Uncategorized'):
+            category = categorize(description, expense_store.category_overrides(user_id))
         
         # Add expense to user's data
-        expense_data[user_id].append({
-            'amount': amount,
-            'category': category,
-            'description': description,
-            'date': date
-        })
+        expense_store.add_expense(user_id, amount, category, description, date)
         
         return redirect('/dashboard')
     except ValueError:
-        return "Invalid amount value", 400
+        return "Invalid amount or date value", 400
+
+@app.route('/add_expenses', methods=['POST'])
+def add_expenses():
+    """Bulk import: {"expenses": [{"amount": 12.5, "description": "...", "category": "food"}, ...]}"""
+    payload = request.get_json(silent=True)
+    expenses = payload.get('expenses') if isinstance(payload, dict) else payload
+    if not isinstance(expenses, list):
+        return jsonify({"message": "Expected a JSON list of expenses"}), 400
+
+    user_id = session['user_id']
+    try:
+        # Fill in missing categories the same way chat and statement imports do
+        overrides = expense_store.category_overrides(user_id)
+        for expense in expenses:
+            if isinstance(expense, dict) and not expense.get('category'):
+                expense['category'] = categorize(expense.get('description', ''), overrides)
+        count = expense_store.add_expenses(user_id, expenses)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"message": f"Invalid expense data: {str(e)}"}), 400
+
+    return jsonify({"message": f"Added {count} expenses", "count": count})
 
-@app.route('/delete_expense/<int:index>', methods=['POST'])
-def delete_expense(index):
-    user_id = session.get('user_id', 'default_user')
+@app.route('/import_statement', methods=['POST'])
+def import_statement():
+    """Import a CSV/OFX bank export; ?stream=1 reports progress as NDJSON lines"""
+    user_id = session['user_id']
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"message": "No file uploaded"}), 400
+
+    if request.args.get('stream'):
+        def generate():
+            summary = None
+            try:
+                for summary in importer.iter_import(upload.stream, user_id, filename=upload.filename,
+                                                    store=expense_store):
+                    yield json.dumps(summary.as_dict()) + "\n"
+            except importer.StatementError as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+                return
+            yield json.dumps({"done": True, **(summary.as_dict() if summary else {})}) + "\n"
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        summary = importer.import_statement(upload.stream, user_id, filename=upload.filename,
+                                            store=expense_store)
+    except importer.StatementError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"message": f"Imported {summary.imported} expenses", **summary.as_dict()})
+
+@app.route('/delete_expense/<int:expense_id>', methods=['POST'])
+def delete_expense(expense_id):
+    user_id = session['user_id']
     
     # Delete expense if it exists
-    if user_id in expense_data and 0 <= index < len(expense_data[user_id]):
-        expense_data[user_id].pop(index)
+    expense_store.delete_expense(user_id, expense_id)
     
     return redirect('/dashboard')
 
+@app.route('/recategorize_expense/<int:expense_id>', methods=['POST'])
+def recategorize_expense(expense_id):
+    """Move an expense to another category; its merchant keeps that category from now on"""
+    user_id = session['user_id']
+    payload = request.get_json(silent=True) or request.form
+    category = (payload.get('category') or '').strip().lower()
+    if not category:
+        return jsonify({"message": "Missing category"}), 400
+    
+    try:
+        updated = expense_store.recategorize_expense(user_id, expense_id, category)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    
+    if request.is_json:
+        return jsonify({"updated": updated, "category": category}), (200 if updated else 404)
+    return redirect('/dashboard')
+
+# Most expense ids accepted by one batch request
+MAX_BATCH_IDS = 1000
+
+def batch_ids(payload):
+    """The "ids" of a batch request as a list of ints; raises ValueError if malformed"""
+    ids = payload.get('ids') if isinstance(payload, dict) else None
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f"Expected 1 to {MAX_BATCH_IDS} expense ids")
+    if not all(isinstance(expense_id, int) and not isinstance(expense_id, bool) for expense_id in ids):
+        raise ValueError("Expense ids must be integers")
+    return ids
+
+@app.route('/delete_expenses', methods=['POST'])
+def delete_expenses():
+    """Batch delete: {"ids": [3, 4, 9]}, applied in one transaction"""
+    user_id = session['user_id']
+    try:
+        ids = batch_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    deleted = expense_store.delete_expenses(user_id, ids)
+    return jsonify({"deleted": deleted, "missing": sorted(set(ids) - set(deleted))})
+
+@app.route('/recategorize_expenses', methods=['POST'])
+def recategorize_expenses():
+    """Batch recategorize: {"ids": [3, 4, 9], "category": "food"}, applied in one transaction"""
+    user_id = session['user_id']
+    payload = request.get_json(silent=True)
+    try:
+        ids = batch_ids(payload)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    category = str(payload.get('category') or '').strip().lower()
+    if not category:
+        return jsonify({"message": "Missing category"}), 400
+
+    try:
+        updated = expense_store.recategorize_expenses(user_id, ids, category)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"updated": updated, "missing": sorted(set(ids) - set(updated)), "category": category})
+
 @app.route('/analyze_expenses', methods=['POST'])
 def analyze_expenses():
-    user_id = session.get('user_id', 'default_user')
+    user_id = session['user_id']
     
-    if user_id not in expense_data or not expense_data[user_id]:
+    if not expense_store.has_expenses(user_id):
         return jsonify({"response": "No expense data available to analyze"})
     
     try:
-        # Format expenses for the AI to analyze
-        df = pd.DataFrame(expense_data[user_id])
-        category_summary = df.groupby('category')['amount'].sum().reset_index()
-        total_expenses = df['amount'].sum()
-        
-        # Create a summary of expenses for analysis
+        # Monthly trends, rolling averages and anomalies, computed once per
+        # change to the user's expenses and shared with the dashboard
         expense_summary = "Here's my expense data:\n"
-        expense_summary += f"Total expenses: ${total_expenses:.2f}\n"
-        expense_summary += "Breakdown by category:\n"
-        
-        for _, row in category_summary.iterrows():
-            percentage = (row['amount'] / total_expenses) * 100
-            expense_summary += f"- {row['category']}: ${row['amount']:.2f} ({percentage:.1f}%)\n"
-        
+        expense_summary += analytics.user_analysis(expense_store, user_id).prompt()
         expense_summary += "\nCan you analyze my spending and provide recommendations?"
         
         # Send this data to the AI for analysis
+        # The summary is deterministic, so unchanged expenses hit the cache
+        model = get_model()
         if model:
-            response = model.generate_content([
-                "You are a financial advisor analyzing expense data. Provide specific insights and recommendations.",
-                expense_summary
-            ])
-            ai_response = response.text
+            try:
+                ai_response = response_cache.get_or_generate(
+                    response_cache.key("analysis", ANALYSIS_PROMPT, expense_summary),
+                    lambda: model.generate_content([ANALYSIS_PROMPT, expense_summary]).text)
+            except llm_client.ModelUnavailable:
+                ai_response = "AI analysis is temporarily unavailable. Please try again in a minute."
         else:
             ai_response = "AI analysis is currently unavailable. Please configure a Gemini API key to enable this feature."
         
         return jsonify({"response": ai_response})
     
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.exception("analysis.error")
         return jsonify({"response": f"I'm sorry, I encountered an error analyzing your expenses: {str(e)}"})
 
 if __name__ == '__main__':
+    logs.configure()
     init_db()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import re
+
+# Keyword -> category mapping shared by the chat parser, the dashboard form
+# and statement imports
+CATEGORY_MAPPING = {
+    # Food
+    "groceries": "food", "grocery": "food", "restaurant": "food",
+    "dining": "food", "meal": "food", "lunch": "food", "dinner": "food",
+    "breakfast": "food", "coffee": "food", "food": "food", "snack": "food",
+
+    # Housing
+    "rent": "housing", "mortgage": "housing", "utility": "housing",
+    "utilities": "housing", "electric": "housing", "water": "housing",
+    "gas bill": "housing", "internet": "housing", "cable": "housing",
+
+    # Transportation
+    "gas": "transport", "fuel": "transport", "car": "transport",
+    "bus": "transport", "subway": "transport", "train": "transport",
+    "taxi": "transport", "uber": "transport", "lyft": "transport",
+
+    # Entertainment
+    "movie": "entertainment", "game": "entertainment", "concert": "entertainment",
+    "theater": "entertainment", "netflix": "entertainment", "ticket": "entertainment",
+
+    # Shopping
+    "clothes": "shopping", "shoes": "shopping", "book": "shopping",
+    "amazon": "shopping", "gift": "shopping", "clothing": "shopping"
+}
+
+DEFAULT_CATEGORY = "other"
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+
+def merchant_key(description):
+    """Normalized description used for learned mappings, e.g. 'UBER *TRIP 8812' -> 'uber trip'"""
+    return " ".join(_words(description))
+
+
+def _singular(word):
+    # "movies" -> "movie", "tickets" -> "ticket", "batteries" -> "battery"
+    if word.endswith("ies"):
+        yield word[:-3] + "y"
+    if word.endswith("s"):
+        yield word[:-1]
+    if word.endswith("es"):
+        yield word[:-2]
+
+
+class CategoryIndex:
+    """Whole-word keyword lookup; the longest matching phrase wins, then the earliest"""
+
+    def __init__(self, mapping=CATEGORY_MAPPING, default=DEFAULT_CATEGORY):
+        self.default = default
+        self._words = {}
+        self._phrases = {}
+        for keyword, category in mapping.items():
+            phrase = tuple(_words(keyword))
+            if len(phrase) == 1:
+                self._words[phrase[0]] = category
+            else:
+                self._phrases[phrase] = category
+        # Most words start no phrase, so they cost a single dict lookup
+        self._phrase_starts = {phrase[0] for phrase in self._phrases}
+        self._max_words = max((len(phrase) for phrase in self._phrases), default=1)
+
+    def _word(self, word):
+        category = self._words.get(word)
+        if category is None and word.endswith("s"):
+            for singular in _singular(word):
+                category = self._words.get(singular)
+                if category is not None:
+                    break
+        return category
+
+    def classify(self, description):
+        words = _words(description)
+        best, best_length = None, 0
+        for start, word in enumerate(words):
+            if word in self._phrase_starts:
+                # Only phrases longer than the current best can replace it
+                for length in range(min(self._max_words, len(words) - start), max(best_length, 1), -1):
+                    category = self._phrases.get(tuple(words[start:start + length]))
+                    if category is not None:
+                        best, best_length = category, length
+                        break
+            if not best_length:
+                best = self._word(word)
+                best_length = 1 if best is not None else 0
+        return best or self.default
+
+
+_index = CategoryIndex()
+
+
+def categorize(description, overrides=None):
+    """Return the category for a free-text expense description
+
+    overrides maps merchant_key(description) -> category for one user, as
+    learned from their recategorized expenses, and takes precedence. The
+    longest learned merchant the description starts with wins, so
+    "TRADER JOE'S #108 NY" still matches what was learned from "Trader Joe's".
+    """
+    if overrides:
+        words = _words(description)
+        for length in range(len(words), 0, -1):
+            category = overrides.get(" ".join(words[:length]))
+            if category:
+                return category
+    return _index.classify(description)
@@ -0,0 +1,304 @@
+"""Bounded per-user chat histories for the Gemini conversation.
+
+Each session keeps at most max_turns messages and roughly max_tokens of
+text. Older turns are folded into a short summary block that is replayed
+as the first exchange, so the model keeps the gist of the conversation
+without the prompt growing with its length. Idle sessions are evicted
+least-recently-used first.
+
+Histories use the Gemini format: [{"role": "user"|"model", "parts": [text]}].
+
+ChatHistoryManager keeps the sessions in process memory, so with several
+worker processes a conversation would depend on which worker serves each
+turn. SQLiteChatHistory keeps them in the chat_sessions table instead,
+shared by every process on the host through WAL. Pick one with
+CHAT_STATE=sqlite|memory (create_chat_histories).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import db_pool
+import migrations
+
+SUMMARY_HEADER = "Summary of our earlier conversation:"
+SUMMARY_ACK = "Thanks, I'll keep that context in mind."
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+
+def _message_tokens(message):
+    return sum(estimate_tokens(part) for part in message["parts"])
+
+
+def _first_sentence(text, limit=120):
+    text = " ".join(text.split())
+    for mark in (". ", "? ", "! ", "\n"):
+        cut = text.find(mark)
+        if 0 < cut < limit:
+            return text[:cut + 1]
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class _Session:
+    __slots__ = ("messages", "summary", "tokens", "last_used")
+
+    def __init__(self, now):
+        self.messages = []
+        self.summary = []
+        self.tokens = 0
+        self.last_used = now
+
+
+class ChatHistoryManager:
+    """Chat sessions held in this process"""
+
+    def __init__(self, max_sessions=1000, max_turns=20, max_tokens=2000,
+                 idle_seconds=3600, summary_lines=12, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.idle_seconds = idle_seconds
+        self.summary_lines = summary_lines
+        self._clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.evicted_sessions = 0
+        self.summarized_messages = 0
+        self.prompts = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.last_prompt_tokens = 0
+
+    def _session(self, user_id):
+        now = self._clock()
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = _Session(now)
+        session.last_used = now
+        self._sessions.move_to_end(user_id)
+        self._evict(now)
+        return session
+
+    @contextmanager
+    def _editing(self, user_id):
+        """The user's session, marked as used and locked while it is changed"""
+        with self._lock:
+            yield self._session(user_id)
+
+    def _evict(self, now):
+        # Oldest sessions sit at the front, so stop at the first live one
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used < self.idle_seconds:
+                break
+            del self._sessions[user_id]
+            self.evicted_sessions += 1
+
+    def _trim(self, session):
+        # Always keep the latest exchange, however long it is
+        while len(session.messages) > 2 and (len(session.messages) > self.max_turns
+                                             or session.tokens > self.max_tokens):
+            # Drop a whole exchange at a time so roles keep alternating
+            dropped = [session.messages.pop(0)]
+            while session.messages and session.messages[0]["role"] != "user":
+                dropped.append(session.messages.pop(0))
+            for message in dropped:
+                session.tokens -= _message_tokens(message)
+                if message["role"] == "user":
+                    session.summary.append("- User: " + _first_sentence(message["parts"][0]))
+                else:
+                    session.summary.append("- You: " + _first_sentence(message["parts"][0]))
+            self._count_summarized(len(dropped))
+        del session.summary[:-self.summary_lines]
+
+    def _count_summarized(self, count):
+        # _editing holds self._lock
+        self.summarized_messages += count
+
+    def ensure(self, user_id):
+        with self._editing(user_id):
+            pass
+
+    def append(self, user_id, role, text):
+        message = {"role": role, "parts": [text]}
+        with self._editing(user_id) as session:
+            session.messages.append(message)
+            session.tokens += _message_tokens(message)
+            # Never trim the message that was just added
+            if role == "model":
+                self._trim(session)
+
+    def history(self, user_id):
+        """The history to replay, starting with the summary exchange if there is one"""
+        with self._editing(user_id) as session:
+            return self._replay(session)
+
+    @staticmethod
+    def _replay(session):
+        history = []
+        if session.summary:
+            history.append({"role": "user", "parts": [SUMMARY_HEADER + "\n" + "\n".join(session.summary)]})
+            history.append({"role": "model", "parts": [SUMMARY_ACK]})
+        history.extend({"role": m["role"], "parts": list(m["parts"])} for m in session.messages)
+        return history
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def reset(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def record_prompt(self, history):
+        """Record the size of a prompt about to be sent; returns its estimated tokens"""
+        tokens = sum(_message_tokens(message) for message in history)
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens_total += tokens
+            self.prompt_tokens_max = max(self.prompt_tokens_max, tokens)
+            self.last_prompt_tokens = tokens
+        return tokens
+
+    def stats(self):
+        sessions = len(self)
+        with self._lock:
+            return {
+                "sessions": sessions,
+                "evicted_sessions": self.evicted_sessions,
+                "summarized_messages": self.summarized_messages,
+                "prompts": self.prompts,
+                "prompt_tokens_avg": self.prompt_tokens_total / self.prompts if self.prompts else 0,
+                "prompt_tokens_max": self.prompt_tokens_max,
+                "prompt_tokens_last": self.last_prompt_tokens,
+            }
+
+
+class SQLiteChatHistory(ChatHistoryManager):
+    """Chat sessions in the chat_sessions table, shared by worker processes
+
+    Every change is one write transaction that reads the session, applies
+    the same trimming as ChatHistoryManager and writes it back, so turns
+    served by different processes land in one conversation. Sessions idle
+    for idle_seconds are ignored on read; they and any beyond max_sessions
+    are deleted every PRUNE_EVERY writes. last_used is wall-clock time, as
+    it is compared across processes. The counters in stats() other than
+    sessions are per process. A database that was never initialized is
+    migrated on first use.
+    """
+    # Idle and surplus sessions are deleted every this many writes
+    PRUNE_EVERY = 200
+
+    def __init__(self, pool=None, clock=time.time, **limits):
+        super().__init__(clock=clock, **limits)
+        # None means the shared pool, looked up on use so db_pool.configure() applies
+        self._pool = pool
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        # The pool whose database is known to have the chat_sessions table
+        self._migrated = None
+        self._schema_lock = threading.Lock()
+
+    def _get_pool(self):
+        pool = self._pool or db_pool.get_pool()
+        # Workers started by a WSGI server never run app.py's __main__ block
+        if self._migrated is not pool:
+            with self._schema_lock:
+                if self._migrated is not pool:
+                    with pool.connection() as conn:
+                        migrations.migrate(conn)
+                    self._migrated = pool
+        return pool
+
+    def _load(self, conn, user_id, now):
+        row = conn.execute('''
+            SELECT messages, summary, tokens, last_used FROM chat_sessions WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+        if row is None or now - row[3] >= self.idle_seconds:
+            return None
+        session = _Session(row[3])
+        session.messages = json.loads(row[0])
+        session.summary = json.loads(row[1])
+        session.tokens = row[2]
+        return session
+
+    @contextmanager
+    def _editing(self, user_id):
+        # SQLite's write lock serializes the edits. Holding self._lock as well
+        # would stall this process's other chats while the transaction waits
+        # for another process's write lock, up to the busy timeout.
+        with self._get_pool().transaction() as conn:
+            now = self._clock()
+            session = self._load(conn, user_id, now) or _Session(now)
+            session.last_used = now
+            yield session
+            conn.execute('''
+                INSERT INTO chat_sessions (user_id, messages, summary, tokens, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    messages = excluded.messages, summary = excluded.summary,
+                    tokens = excluded.tokens, last_used = excluded.last_used
+            ''', (user_id, json.dumps(session.messages), json.dumps(session.summary), session.tokens, now))
+            with self._writes_lock:
+                self._writes += 1
+                prune = self._writes % self.PRUNE_EVERY == 0
+            if prune:
+                self._prune(conn, now)
+
+    def _count_summarized(self, count):
+        with self._lock:
+            self.summarized_messages += count
+
+    def _prune(self, conn, now):
+        idle = conn.execute("DELETE FROM chat_sessions WHERE last_used <= ?", (now - self.idle_seconds,))
+        surplus = conn.execute('''
+            DELETE FROM chat_sessions WHERE user_id IN (
+                SELECT user_id FROM chat_sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_sessions,))
+        with self._lock:
+            self.evicted_sessions += idle.rowcount + surplus.rowcount
+
+    def history(self, user_id):
+        """The history to replay, starting with the summary exchange if there is one"""
+        # Read-only: the appends around it keep the session marked as used
+        with self._get_pool().connection() as conn:
+            session = self._load(conn, user_id, self._clock())
+        return [] if session is None else self._replay(session)
+
+    def __len__(self):
+        with self._get_pool().connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chat_sessions WHERE last_used > ?",
+                                (self._clock() - self.idle_seconds,)).fetchone()[0]
+
+    def __contains__(self, user_id):
+        with self._get_pool().connection() as conn:
+            return self._load(conn, user_id, self._clock()) is not None
+
+    def reset(self, user_id):
+        with self._get_pool().transaction() as conn:
+            conn.execute("DELETE FROM chat_sessions WHERE user_id = ?", (user_id,))
+
+
+CHAT_STATES = {
+    "memory": ChatHistoryManager,
+    "sqlite": SQLiteChatHistory,
+}
+
+
+def create_chat_histories(kind=None, **limits):
+    kind = kind or os.getenv("CHAT_STATE", "sqlite")
+    try:
+        return CHAT_STATES[kind](**limits)
+    except KeyError:
+        raise ValueError(f"Unknown CHAT_STATE '{kind}', expected one of {', '.join(CHAT_STATES)}")
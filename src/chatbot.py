@@ -1,5 +1,6 @@
 import random
-from database import get_budget_insights, set_budget, add_expense, connect_db
+from intents import route
+from migrations import DEFAULT_USER_ID
 
 # Sample financial chatbot responses
 RESPONSES = {
@@ -13,71 +14,66 @@ RESPONSES = {
 
 # Parse budget setting command
 def parse_budget_command(message):
-    if "set budget" in message.lower() or "set a budget" in message.lower():
-        message = message.lower()
-        if "for" in message and "to" in message:
-            # Extract category and amount
-            split_for = message.split("for")[1]
-            category_part = split_for.split("to")[0].strip()
-            amount_part = split_for.split("to")[1].strip()
-            
-            # Remove dollar sign if present
-            if "$" in amount_part:
-                amount_part = amount_part.replace("$", "")
-            
-            try:
-                amount = float(amount_part.replace(',', ''))
-                return {"category": category_part, "amount": amount}
-            except ValueError:
-                pass
+    intent = route(message)
+    if intent.name == "set_budget":
+        return {"category": intent.category, "amount": intent.amount}
     return None
 
 # Enhanced chatbot logic with database integration
-def chatbot_response(user_input):
-    user_input = user_input.lower()
+# Every read and write is scoped to user_id, the user who sent the message
+def chatbot_response(user_input, user_id=DEFAULT_USER_ID):
+    # database opens SQLite and loads the migrations; only needed once a
+    # message is handled, not when the app imports this module
+    import database
+
+    # One pass over the message picks the intent and its details
+    intent = route(user_input)
+    
+    # Check for budget setting command
+    if intent.name == "set_budget":
+        database.set_budget(intent.category, intent.amount, user_id=user_id)
+        return f"I've set your budget for {intent.category} to ${intent.amount}."
     
     # Check for greetings
-    if any(word in user_input for word in ["hello", "hi", "hey"]):
+    if intent.name == "greeting":
         return random.choice(RESPONSES["greeting"])
     
     # Check for help request
-    if "help" in user_input or "what can you do" in user_input:
+    if intent.name == "help":
         return random.choice(RESPONSES["help"])
     
-    # Check for budget setting command
-    budget_command = parse_budget_command(user_input)
-    if budget_command:
-        set_budget(budget_command["category"], budget_command["amount"])
-        return f"I've set your budget for {budget_command['category']} to ${budget_command['amount']}."
-    
     # Check for budget queries
-    if "budget" in user_input and "for" in user_input:
-        category = user_input.split("budget for")[-1].strip().rstrip('?')
-        budget_info = get_budget_insights(category)
+    if intent.name == "budget_query":
+        category, period = intent.category, intent.period
+        budget_info = database.get_budget_insights(category, user_id=user_id, period=period)
         
         if "message" in budget_info:
             return budget_info["message"]
+        elif period:
+            return f"Budget for {category} this {period}: ${budget_info['limit_amount']}. " \
+                   f"You've spent ${budget_info['spent_amount']}, with ${budget_info['remaining_budget']} remaining. " \
+                   f"{budget_info['advice']}"
         else:
             return f"Budget for {category}: ${budget_info['limit_amount']}. " \
                    f"You've spent ${budget_info['spent_amount']}, with ${budget_info['remaining_budget']} remaining. " \
                    f"{budget_info['advice']}"
     
     # Check for expense tracking questions
-    if any(word in user_input for word in ["expense", "spending", "track"]):
+    if intent.name == "expense_tracking":
         return random.choice(RESPONSES["expense_tracking"])
     
     # Check for savings advice
-    if any(word in user_input for word in ["save", "saving", "savings"]):
+    if intent.name == "savings":
         return random.choice(RESPONSES["savings"])
     
     # Get spending insights
-    if "how much" in user_input and "spend" in user_input:
-        conn = connect_db()
+    if intent.name == "spending_total":
+        conn = database.connect_db()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT SUM(amount) as total FROM expenses
-        ''')
+            SELECT SUM(amount) as total FROM expenses WHERE user_id = ?
+        ''', (user_id,))
         result = cursor.fetchone()
         conn.close()
         
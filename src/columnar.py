@@ -0,0 +1,289 @@
+"""Compact column storage for the in-memory expense store.
+
+A list of expense dicts costs a few hundred bytes per expense: the dict, a
+float object and two or three str objects. ExpenseColumns keeps the same
+data as parallel typed arrays:
+
+    id            int64     expense id, 1, 2, 3... per container, array('q')
+    amount        float64   array('d')
+    day           int64     days since 1970-01-01, array('q')
+    category      int16     index into the container's category table
+    description   uint32    index into a StringPool shared by all users
+
+That is 30 bytes per expense plus one copy of each distinct category and
+description. Descriptions are reference counted, so the pool forgets one
+once no live expense uses it; a user's category table only grows, up to
+MAX_CATEGORIES names. Lookups by id are O(1) through a slot array holding each id's
+row (8 bytes per id ever issued; a dict would cost about 100). Deleting
+only clears the id's slot; the dead rows are compacted away once they
+outnumber the live ones, so deletes are O(1) amortized and the rows stay in
+insertion order.
+
+arrays() hands the columns to NumPy without copying them, and to_frame()
+does the same for pandas' amount column (pandas has no day-resolution
+datetimes, so it converts the dates). The arrays are allocated with spare
+capacity and swapped for bigger ones when full, never resized in place, so
+a view stays valid while more expenses are appended. It does see in-place
+edits (compaction shifts rows down), so copy a view that has to outlive the
+next write. NumPy and pandas are only imported by those two methods.
+
+Dates are kept to the day: "2024-03-01 09:30:00" comes back as "2024-03-01".
+"""
+import heapq
+from array import array
+from bisect import bisect_right
+from datetime import date as _date
+
+_EPOCH = _date(1970, 1, 1).toordinal()
+
+# (attribute, typecode) for each column
+_COLUMNS = (("_ids", "q"), ("_amounts", "d"), ("_days", "q"), ("_categories", "h"), ("_descriptions", "I"))
+
+# Distinct categories one container can name: the codes are int16
+MAX_CATEGORIES = 2 ** 15
+
+
+def to_day(date):
+    """Days since 1970-01-01 for a date, datetime or ISO string"""
+    if isinstance(date, _date):
+        return date.toordinal() - _EPOCH
+    return _date.fromisoformat(str(date)[:10]).toordinal() - _EPOCH
+
+
+def from_day(day):
+    return _date.fromordinal(day + _EPOCH).isoformat()
+
+
+class StringPool:
+    """Each distinct string stored once and referred to by its index
+
+    intern() takes a reference to the string and release() drops one; a
+    string nobody refers to any more is forgotten and its index reused.
+    """
+
+    def __init__(self):
+        self._strings = []
+        self._ids = {}
+        self._refs = array('I')
+        self._free = []
+
+    def intern(self, text):
+        string_id = self._ids.get(text)
+        if string_id is None:
+            if self._free:
+                string_id = self._free.pop()
+                self._strings[string_id] = text
+            else:
+                string_id = len(self._strings)
+                self._strings.append(text)
+                self._refs.append(0)
+            self._ids[text] = string_id
+        self._refs[string_id] += 1
+        return string_id
+
+    def release(self, string_id):
+        self._refs[string_id] -= 1
+        if not self._refs[string_id]:
+            del self._ids[self._strings[string_id]]
+            self._strings[string_id] = None
+            self._free.append(string_id)
+
+    def __getitem__(self, string_id):
+        return self._strings[string_id]
+
+    def __len__(self):
+        """Distinct strings in use"""
+        return len(self._ids)
+
+
+class ExpenseColumns:
+    """One user's expenses as typed columns, in insertion (and id) order
+
+    Not thread-safe; the store serializes access.
+    """
+
+    def __init__(self, pool=None, capacity=16):
+        self._pool = pool if pool is not None else StringPool()
+        self._category_names = []
+        self._category_ids = {}
+        # Row of expense id i at _slots[i - 1], -1 once deleted
+        self._slots = array('q')
+        self._live = 0
+        self._size = 0
+        self._capacity = capacity
+        for name, typecode in _COLUMNS:
+            setattr(self, name, array(typecode, bytes(array(typecode).itemsize * capacity)))
+
+    def __len__(self):
+        return self._live
+
+    def __contains__(self, expense_id):
+        return self._row_of(expense_id) is not None
+
+    def _row_of(self, expense_id):
+        if isinstance(expense_id, int) and 0 < expense_id <= len(self._slots):
+            row = self._slots[expense_id - 1]
+            if row >= 0:
+                return row
+        return None
+
+    def _grow(self):
+        # A fresh array instead of extend(): extending one that backs a
+        # NumPy view raises BufferError
+        capacity = self._capacity * 2
+        for name, typecode in _COLUMNS:
+            old = getattr(self, name)
+            new = array(typecode, bytes(old.itemsize * capacity))
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+        self._capacity = capacity
+
+    def _category_id(self, category):
+        category_id = self._category_ids.get(category)
+        if category_id is None:
+            if len(self._category_names) >= MAX_CATEGORIES:
+                raise ValueError(f"No more than {MAX_CATEGORIES} distinct categories")
+            category_id = self._category_ids[category] = len(self._category_names)
+            self._category_names.append(category)
+        return category_id
+
+    def append(self, amount, category, description, date):
+        """Add an expense and return its id; raises ValueError for a bad
+        date or a category beyond MAX_CATEGORIES"""
+        day = to_day(date)
+        category_id = self._category_id(category)
+        if self._size == self._capacity:
+            self._grow()
+        i = self._size
+        self._slots.append(i)
+        expense_id = len(self._slots)
+        self._ids[i] = expense_id
+        self._amounts[i] = amount
+        self._days[i] = day
+        self._categories[i] = category_id
+        self._descriptions[i] = self._pool.intern(description)
+        self._size += 1
+        self._live += 1
+        return expense_id
+
+    def get(self, expense_id):
+        """The expense dict for expense_id, or None"""
+        i = self._row_of(expense_id)
+        return None if i is None else self._row(i)
+
+    def _row(self, i):
+        return {
+            'id': self._ids[i],
+            'amount': self._amounts[i],
+            'category': self._category_names[self._categories[i]],
+            'description': self._pool[self._descriptions[i]],
+            'date': from_day(self._days[i]),
+        }
+
+    def rows(self, after=None, limit=None):
+        """Live expenses in id order, starting after the id after"""
+        # Ids ascend with the rows (dead ones included), so seek by bisection
+        start = 0 if after is None else bisect_right(self._ids, after, 0, self._size)
+        rows = []
+        for i in range(start, self._size):
+            if limit is not None and len(rows) == limit:
+                break
+            if self._slots[self._ids[i] - 1] == i:
+                rows.append(self._row(i))
+        return rows
+
+    def newest(self, before=None, limit=None):
+        """Live expenses by date, then id, newest first, starting below the
+        [date, id] before; raises ValueError for a bad date"""
+        keys = ((self._days[i], self._ids[i], i) for i in range(self._size)
+                if self._slots[self._ids[i] - 1] == i)
+        if before is not None:
+            below = (to_day(before[0]), before[1])
+            keys = (key for key in keys if key[:2] < below)
+        chosen = sorted(keys, reverse=True) if limit is None else heapq.nlargest(limit, keys)
+        return [self._row(i) for _, _, i in chosen]
+
+    def delete(self, expense_id):
+        """Remove expense_id and return its dict, or None if there is none"""
+        i = self._row_of(expense_id)
+        if i is None:
+            return None
+        expense = self._row(i)
+        self._pool.release(self._descriptions[i])
+        self._slots[expense_id - 1] = -1
+        self._live -= 1
+        if self._size - self._live > max(self._live, 16):
+            self._compact()
+        return expense
+
+    def _compact(self):
+        # Move the live rows down over the dead ones, in place (no resize)
+        live = 0
+        for i in range(self._size):
+            expense_id = self._ids[i]
+            if self._slots[expense_id - 1] != i:
+                continue
+            if live != i:
+                for name, _ in _COLUMNS:
+                    column = getattr(self, name)
+                    column[live] = column[i]
+                self._slots[expense_id - 1] = live
+            live += 1
+        self._size = live
+
+    def set_category(self, expense_id, category):
+        """Move expense_id to category; False if there is no such expense,
+        ValueError for a category beyond MAX_CATEGORIES"""
+        i = self._row_of(expense_id)
+        if i is None:
+            return False
+        self._categories[i] = self._category_id(category)
+        return True
+
+    @property
+    def nbytes(self):
+        """Bytes held by the used part of the columns and the slots, dead
+        rows included (not the shared pool)"""
+        row_size = sum(getattr(self, name).itemsize for name, _ in _COLUMNS)
+        return self._size * row_size + len(self._slots) * self._slots.itemsize
+
+    def arrays(self):
+        """Read-only NumPy views: id (int64), amount (float64), date
+        (datetime64[D]) and category codes (int16, see category_names)"""
+        import numpy as np
+
+        if self._size != self._live:
+            self._compact()
+        views = {
+            'id': np.frombuffer(self._ids, dtype=np.int64, count=self._size),
+            'amount': np.frombuffer(self._amounts, dtype=np.float64, count=self._size),
+            'date': np.frombuffer(self._days, dtype='datetime64[D]', count=self._size),
+            'category': np.frombuffer(self._categories, dtype=np.int16, count=self._size),
+        }
+        for view in views.values():
+            view.flags.writeable = False
+        return views
+
+    @property
+    def category_names(self):
+        return list(self._category_names)
+
+    def to_frame(self):
+        """A pandas DataFrame with id, amount, date, category and description columns
+
+        amount shares memory with the columns. category is a Categorical
+        with only the categories in use, sorted by name; description is
+        materialized from the pool.
+        """
+        import pandas as pd
+
+        views = self.arrays()
+        categories = pd.Categorical.from_codes(views['category'], self._category_names)
+        categories = categories.set_categories(sorted(set(categories.categories[categories.codes])))
+        return pd.DataFrame({
+            'id': views['id'],
+            'amount': views['amount'],
+            'date': views['date'],
+            'category': categories,
+            'description': [self._pool[d] for d in self._descriptions[:self._size]],
+        }, copy=False)
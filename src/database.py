@@ -1,234 +1,761 @@
-import sqlite3
+import os
+import threading
 from datetime import datetime
+from db_pool import connect, connection, get_pool, transaction
+from migrations import migrate, optimize, DEFAULT_USER_ID
+from cache import LRUCache
+from write_behind import WriteBehindQueue
+from categories import merchant_key
+from aggregates import ExpenseSummary
 
 # Function to connect to the database
+# Returns a pooled connection; close() hands it back to the pool
 def connect_db():
-    return sqlite3.connect('database.db')
+    return connect()
+
+# Optional write-behind mode (WRITE_BEHIND=1): expense writes are queued and
+# group-committed by a background thread; reads for a user wait for that
+# user's queued writes first, and raise WriteBehindError if one failed
+write_behind = None
+
+def enable_write_behind(max_queue=10000, batch_size=200, max_delay=0.05):
+    global write_behind
+    disable_write_behind()
+    write_behind = WriteBehindQueue(transaction, max_queue=max_queue,
+                                    batch_size=batch_size, max_delay=max_delay)
+    return write_behind
+
+def disable_write_behind():
+    global write_behind
+    if write_behind is not None:
+        write_behind.close()
+        write_behind = None
+
+def _after_fork_in_child():
+    # The writer thread did not survive the fork (gunicorn's preload_app),
+    # and what the parent had queued is the parent's to write
+    global write_behind
+    if write_behind is not None:
+        inherited, write_behind = write_behind, None
+        inherited._closed = True
+        enable_write_behind(inherited.max_queue, inherited.batch_size, inherited.max_delay)
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def _wait_for_writes(user_id=None):
+    if write_behind is not None:
+        if user_id is None:
+            write_behind.flush()
+        else:
+            write_behind.wait_for_user(user_id)
 
 # Function to initialize the database (creating necessary tables)
+# Schema changes live in migrations.py; this brings the file up to date
 def init_db():
-    conn = connect_db()
-    cursor = conn.cursor()
+    with connection() as conn:
+        migrate(conn)
+        # Statistics go stale as data grows; the pool refreshes them from time to time too
+        optimize(conn, all_tables=True)
 
-    # Table for storing expenses
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            amount REAL NOT NULL,
-            description TEXT NOT NULL,
-            category TEXT,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Table for tracking budgets
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS budgets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT UNIQUE NOT NULL,
-            limit_amount REAL NOT NULL,
-            spent_amount REAL DEFAULT 0
-        )
-    ''')
-
-    # Table for savings goals
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        # Create default budgets for main categories if they don't exist
+        default_budgets = [
+            ("food", 500),
+            ("housing", 1500),
+            ("transport", 300),
+            ("entertainment", 200),
+            ("shopping", 300),
+            ("other", 200)
+        ]
+
+        for category, amount in default_budgets:
+            cursor.execute('''
+                INSERT OR IGNORE INTO budgets (user_id, category, limit_amount)
+                VALUES (?, ?, ?)
+            ''', (DEFAULT_USER_ID, category, amount))
+
+# Periods tracked in budget_rollups and the slice of the timestamp that keys them
+ROLLUP_PERIODS = {"day": 10, "month": 7, "year": 4}
+
+# budgets.limit_amount is a monthly figure; scale it for other periods
+PERIOD_LIMIT_SCALE = {"day": 12 / 365, "month": 1, "year": 12}
+
+# Read-through cache for get_budget_insights, keyed by
+# (user_id, category, period, period_key). Writers invalidate the entries
+# of the categories they touch; the TTL (BUDGET_CACHE_TTL seconds) bounds how
+# long another worker process's write can go unseen.
+budget_cache = LRUCache(maxsize=4096, ttl=float(os.getenv("BUDGET_CACHE_TTL", "5")))
+
+# Expense dates are local calendar dates, as the form and chat write them,
+# so "now" is local time too: rollup keys and the current period agree
+# around midnight. SQLite's CURRENT_TIMESTAMP (UTC) only stamps bookkeeping
+# columns such as notifications.created_at.
+def _now_timestamp():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+# Function to check and normalize an expense date
+# Accepts a date, datetime or ISO string and returns 'YYYY-MM-DD' (or
+# 'YYYY-MM-DD HH:MM:SS' when it has a time); empty means now. Aware times
+# are converted to local time. Raises ValueError for anything else.
+def expense_date(date):
+    if not date:
+        return _now_timestamp()
+    if isinstance(date, datetime):
+        parsed = date
+    elif hasattr(date, 'isoformat'):
+        return date.isoformat()
+    else:
+        text = str(date).strip()
+        parsed = datetime.fromisoformat(text)
+        if len(text) == 10:
+            return parsed.strftime('%Y-%m-%d')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def _period_key(date, period):
+    return str(date)[:ROLLUP_PERIODS[period]]
+
+def _insights_cache_key(user_id, category, period):
+    key = _period_key(_now_timestamp(), period) if period else None
+    return (user_id, category, period, key)
+
+# Function to drop cached insights after a write to these categories
+def _invalidate_budgets(user_id, categories):
+    budget_cache.invalidate(*[
+        _insights_cache_key(user_id, category, period)
+        for category in categories
+        for period in (None, *ROLLUP_PERIODS)
+    ])
+
+# Function to apply a spending delta to the per-period rollups
+# deltas maps (category, date) -> (amount, count); negative values undo expenses
+def _update_rollups(cursor, user_id, deltas):
+    rows = {}
+    for (category, date), (amount, count) in deltas.items():
+        for period in ROLLUP_PERIODS:
+            key = (category, period, _period_key(date, period))
+            total, n = rows.get(key, (0, 0))
+            rows[key] = (total + amount, n + count)
+
+    cursor.executemany('''
+        INSERT INTO budget_rollups (user_id, category, period, period_key, total, count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, category, period, period_key)
+        DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+    ''', [(user_id, category, period, key, total, n)
+          for (category, period, key), (total, n) in rows.items()])
+
+    if any(n < 0 for _, n in rows.values()):
+        cursor.execute('''
+            DELETE FROM budget_rollups WHERE user_id = ? AND count <= 0
+        ''', (user_id,))
+
+# Function to record an over-budget alert
+# There is at most one unread alert per (user, category, month); repeats
+# bump its occurrence count and last-seen time instead of adding rows
+def _raise_budget_alert(cursor, user_id, category, limit_amount, date):
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS savings_goals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            goal_name TEXT NOT NULL,
-            target_amount REAL NOT NULL,
-            current_savings REAL DEFAULT 0
-        )
-    ''')
-
-    # Table for notifications/alerts
+        INSERT INTO notifications
+            (user_id, category, period_key, message, status, occurrences, created_at, last_seen_at)
+        VALUES (?, ?, ?, ?, 'unread', 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id, category, period_key) WHERE status = 'unread'
+        DO UPDATE SET occurrences = occurrences + 1,
+                      last_seen_at = excluded.last_seen_at,
+                      message = excluded.message
+    ''', (user_id, category, _period_key(date, "month"),
+          f"Alert: You've exceeded your {category} budget of ${limit_amount}!"))
+
+# Function to write one expense and its budget/rollup/alert rows on cursor
+# expense_id is a reserved id (see _reserve_expense_id), or None for the next one
+def _insert_expense(cursor, user_id, amount, description, category, date, expense_id=None):
+    # Insert the expense into the database
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notifications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            message TEXT NOT NULL,
-            status TEXT DEFAULT 'unread',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Create default budgets for main categories if they don't exist
-    default_budgets = [
-        ("food", 500),
-        ("housing", 1500),
-        ("transport", 300),
-        ("entertainment", 200),
-        ("shopping", 300),
-        ("other", 200)
-    ]
-    
-    for category, amount in default_budgets:
-        cursor.execute('''
-            INSERT OR IGNORE INTO budgets (category, limit_amount)
-            VALUES (?, ?)
-        ''', (category, amount))
+        INSERT INTO expenses (id, user_id, amount, description, category, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (expense_id, user_id, amount, description, category, date))
+    expense_id = cursor.lastrowid
 
-    conn.commit()
-    conn.close()
+    _update_rollups(cursor, user_id, {(category, date): (amount, 1)})
+    _charge_budget(cursor, user_id, category, amount, date)
+    _bump_data_version(cursor, user_id)
 
-# Function to add an expense to the database
-def add_expense(amount, description, category):
-    conn = connect_db()
-    cursor = conn.cursor()
+    return expense_id
 
-    # Insert the expense into the database
+# Function to record that a user's expenses changed (see get_data_version)
+def _bump_data_version(cursor, user_id):
     cursor.execute('''
-        INSERT INTO expenses (amount, description, category) 
-        VALUES (?, ?, ?)
-    ''', (amount, description, category))
+        INSERT INTO data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
 
+# Function to add amount to a category's budget, creating a default budget
+# if there is none, and raise an alert if that puts it over the limit
+def _charge_budget(cursor, user_id, category, amount, date):
     # Check if the category has a budget entry
     cursor.execute('''
-        SELECT * FROM budgets WHERE category = ?
-    ''', (category,))
-    
+        SELECT * FROM budgets WHERE user_id = ? AND category = ?
+    ''', (user_id, category))
+
     budget_exists = cursor.fetchone()
-    
+
     if budget_exists:
         # Update the spent amount in the budgets table for the respective category
         cursor.execute('''
             UPDATE budgets
             SET spent_amount = spent_amount + ?
-            WHERE category = ?
-        ''', (amount, category))
+            WHERE user_id = ? AND category = ?
+        ''', (amount, user_id, category))
     else:
         # Create a default budget for this category
         cursor.execute('''
-            INSERT INTO budgets (category, limit_amount, spent_amount)
-            VALUES (?, ?, ?)
-        ''', (category, 300, amount))  # Default budget of $300
+            INSERT INTO budgets (user_id, category, limit_amount, spent_amount)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, category, 300, amount))  # Default budget of $300
 
     # Check if budget is exceeded and create notification if needed
     cursor.execute('''
-        SELECT limit_amount, spent_amount FROM budgets WHERE category = ?
-    ''', (category,))
-    
+        SELECT limit_amount, spent_amount FROM budgets WHERE user_id = ? AND category = ?
+    ''', (user_id, category))
+
     result = cursor.fetchone()
     if result:
         limit_amount, spent_amount = result
         if spent_amount > limit_amount:
-            # Create a notification about exceeding budget
+            # Create (or bump) the notification about exceeding budget
+            _raise_budget_alert(cursor, user_id, category, limit_amount, date)
+
+# Expense ids handed out before the write in write-behind mode. Each process
+# reserves ID_BLOCK ids at a time by moving the table's AUTOINCREMENT counter
+# past them, so no other process's insert can take one.
+ID_BLOCK = 100
+_id_lock = threading.Lock()
+_id_owner = None
+_id_next = _id_end = 0
+
+def _reserve_expense_id():
+    global _id_owner, _id_next, _id_end
+    with _id_lock:
+        # A forked worker must not hand out its parent's block, nor a
+        # reconfigured pool the old database's
+        owner = (os.getpid(), get_pool())
+        if _id_owner != owner or _id_next >= _id_end:
+            with transaction() as conn:
+                seq = conn.execute('''
+                    SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'expenses'), 0),
+                               COALESCE((SELECT MAX(id) FROM expenses), 0))
+                ''').fetchone()[0]
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = 'expenses'")
+                conn.execute('''
+                    INSERT INTO sqlite_sequence (name, seq) VALUES ('expenses', ?)
+                ''', (seq + ID_BLOCK,))
+            _id_owner, _id_next, _id_end = owner, seq + 1, seq + ID_BLOCK + 1
+        _id_next += 1
+        return _id_next - 1
+
+# Function to add an expense to the database and return its id
+# In write-behind mode the id is reserved up front and the write queued; if
+# it then fails, the user's next read raises WriteBehindError
+def add_expense(amount, description, category, user_id=DEFAULT_USER_ID, date=None):
+    date = expense_date(date)
+    args = (user_id, amount, description, category, date)
+
+    if write_behind is not None:
+        expense_id = _reserve_expense_id()
+        _invalidate_budgets(user_id, [category])
+        write_behind.submit(user_id, _insert_expense, (*args, expense_id),
+                            after_commit=lambda: _invalidate_budgets(user_id, [category]))
+        return expense_id
+
+    with transaction() as conn:
+        expense_id = _insert_expense(conn.cursor(), *args)
+
+    _invalidate_budgets(user_id, [category])
+    return expense_id
+
+# Function to add many expenses in a single transaction
+# Accepts dicts with amount/description/category (and optional date) or
+# (amount, description, category) tuples. Budgets are updated once per
+# category and at most one over-budget alert is raised per category, for the
+# month of that category's latest expense in the batch.
+def add_expenses_bulk(expenses, user_id=DEFAULT_USER_ID):
+    now = _now_timestamp()
+    rows = []
+    spent_by_category = {}
+    latest_by_category = {}
+    rollup_deltas = {}
+    for expense in expenses:
+        if isinstance(expense, dict):
+            amount = float(expense['amount'])
+            description = expense.get('description', '')
+            category = expense.get('category') or 'other'
+            date = expense.get('date')
+        else:
+            amount, description, category = expense[:3]
+            amount = float(amount)
+            date = expense[3] if len(expense) > 3 else None
+        date = expense_date(date) if date else now
+        rows.append((user_id, amount, description, category, date))
+        spent_by_category[category] = spent_by_category.get(category, 0) + amount
+        latest_by_category[category] = max(latest_by_category.get(category, date), date)
+        total, count = rollup_deltas.get((category, date), (0, 0))
+        rollup_deltas[(category, date)] = (total + amount, count + 1)
+
+    if not rows:
+        return 0
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.executemany('''
+            INSERT INTO expenses (user_id, amount, description, category, date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+
+        _update_rollups(cursor, user_id, rollup_deltas)
+        _bump_data_version(cursor, user_id)
+
+        for category, amount in spent_by_category.items():
+            cursor.execute('''
+                UPDATE budgets
+                SET spent_amount = spent_amount + ?
+                WHERE user_id = ? AND category = ?
+            ''', (amount, user_id, category))
+            if cursor.rowcount == 0:
+                # Create a default budget for this category
+                cursor.execute('''
+                    INSERT INTO budgets (user_id, category, limit_amount, spent_amount)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, category, 300, amount))  # Default budget of $300
+
+            cursor.execute('''
+                SELECT limit_amount, spent_amount FROM budgets WHERE user_id = ? AND category = ?
+            ''', (user_id, category))
+            limit_amount, spent_amount = cursor.fetchone()
+            if spent_amount > limit_amount:
+                _raise_budget_alert(cursor, user_id, category, limit_amount, latest_by_category[category])
+
+    _invalidate_budgets(user_id, spent_by_category)
+    return len(rows)
+
+# Function to list a user's expenses, oldest first
+def get_expenses(user_id=DEFAULT_USER_ID):
+    _wait_for_writes(user_id)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, amount, category, description, date FROM expenses
+            WHERE user_id = ?
+            ORDER BY date, id
+        ''', (user_id,))
+        return [{"id": e[0], "amount": e[1], "category": e[2], "description": e[3], "date": e[4]}
+                for e in cursor.fetchall()]
+
+# Function to list one page of a user's expenses, newest first
+# after is the (date, id) of the last expense on the previous page. Seeking
+# below it on the (user_id, date) index makes every page cost the same,
+# however deep into the history it is.
+def get_expenses_page(user_id=DEFAULT_USER_ID, after=None, limit=50):
+    _wait_for_writes(user_id)
+    with connection() as conn:
+        cursor = conn.cursor()
+        if after is None:
+            cursor.execute('''
+                SELECT id, amount, category, description, date FROM expenses
+                WHERE user_id = ?
+                ORDER BY date DESC, id DESC LIMIT ?
+            ''', (user_id, limit))
+        else:
             cursor.execute('''
-                INSERT INTO notifications (message, status)
-                VALUES (?, 'unread')
-            ''', (f"Alert: You've exceeded your {category} budget of ${limit_amount}!",))
+                SELECT id, amount, category, description, date FROM expenses
+                WHERE user_id = ? AND (date, id) < (?, ?)
+                ORDER BY date DESC, id DESC LIMIT ?
+            ''', (user_id, after[0], after[1], limit))
+        return [{"id": e[0], "amount": e[1], "category": e[2], "description": e[3], "date": e[4]}
+                for e in cursor.fetchall()]
+
+# Function to get a counter that changes whenever a user's expenses do
+# (0 for a user who never wrote any); the dashboard API builds its ETag from it
+def get_data_version(user_id=DEFAULT_USER_ID):
+    _wait_for_writes(user_id)
+    with connection() as conn:
+        row = conn.execute('''
+            SELECT version FROM data_versions WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+# Function to check whether a user has recorded any expense
+def has_expenses(user_id=DEFAULT_USER_ID):
+    _wait_for_writes(user_id)
+    with connection() as conn:
+        row = conn.execute('''
+            SELECT 1 FROM expenses WHERE user_id = ? LIMIT 1
+        ''', (user_id,)).fetchone()
+    return row is not None
+
+# Most ids bound in one IN (...) list; SQLite's default limit is 999 variables
+MAX_IDS_PER_STATEMENT = 500
 
-    conn.commit()
-    conn.close()
+# Function to read the user's expenses among expense_ids on cursor
+# Returns {id: (amount, category, date, description)}; other users' ids are skipped
+def _select_expenses(cursor, user_id, expense_ids):
+    ids = list(dict.fromkeys(expense_ids))
+    rows = {}
+    for start in range(0, len(ids), MAX_IDS_PER_STATEMENT):
+        chunk = ids[start:start + MAX_IDS_PER_STATEMENT]
+        cursor.execute(f'''
+            SELECT id, amount, category, date, description FROM expenses
+            WHERE user_id = ? AND id IN ({', '.join('?' * len(chunk))})
+        ''', (user_id, *chunk))
+        for expense_id, *row in cursor.fetchall():
+            rows[expense_id] = tuple(row)
+    return rows
+
+# Function to take amounts back out of budgets, per category
+def _refund_budgets(cursor, user_id, refunds):
+    cursor.executemany('''
+        UPDATE budgets
+        SET spent_amount = spent_amount - ?
+        WHERE user_id = ? AND category = ?
+    ''', [(amount, user_id, category) for category, amount in refunds.items()])
+
+# Function to delete many expenses in one transaction
+# Budgets and rollups are adjusted by the deleted amounts rather than
+# recomputed. Returns the ids that were deleted, in the order given; ids that
+# do not exist (or belong to another user) are skipped.
+def delete_expenses(expense_ids, user_id=DEFAULT_USER_ID):
+    _wait_for_writes(user_id)
+    refunds = {}
+    with transaction() as conn:
+        cursor = conn.cursor()
+        rows = _select_expenses(cursor, user_id, expense_ids)
+        if not rows:
+            return []
+
+        cursor.executemany('''
+            DELETE FROM expenses WHERE id = ?
+        ''', [(expense_id,) for expense_id in rows])
+
+        rollup_deltas = {}
+        for amount, category, date, _ in rows.values():
+            refunds[category] = refunds.get(category, 0) + amount
+            total, count = rollup_deltas.get((category, date), (0, 0))
+            rollup_deltas[(category, date)] = (total - amount, count - 1)
+        _refund_budgets(cursor, user_id, refunds)
+        _update_rollups(cursor, user_id, rollup_deltas)
+        _bump_data_version(cursor, user_id)
+
+    _invalidate_budgets(user_id, refunds)
+    return [expense_id for expense_id in dict.fromkeys(expense_ids) if expense_id in rows]
+
+# Function to delete an expense and take it back out of budgets and rollups
+# Returns False if the expense does not exist (or belongs to another user)
+def delete_expense(expense_id, user_id=DEFAULT_USER_ID):
+    return bool(delete_expenses([expense_id], user_id))
+
+# Function to move many expenses to one category in one transaction
+# Budgets and rollups follow the amounts, and each merchant -> category
+# override is learned so future expenses from those merchants land there too.
+# Returns the ids that were found, in the order given.
+def recategorize_expenses(expense_ids, category, user_id=DEFAULT_USER_ID):
+    _wait_for_writes(user_id)
+    refunds = {}
+    with transaction() as conn:
+        cursor = conn.cursor()
+        rows = _select_expenses(cursor, user_id, expense_ids)
+        if not rows:
+            return []
+
+        moved = {expense_id: row for expense_id, row in rows.items() if row[1] != category}
+        if moved:
+            cursor.executemany('''
+                UPDATE expenses SET category = ? WHERE id = ?
+            ''', [(category, expense_id) for expense_id in moved])
+
+            rollup_deltas = {}
+            charged, last_date = 0, None
+            for amount, old_category, date, _ in moved.values():
+                refunds[old_category] = refunds.get(old_category, 0) + amount
+                for key, sign in (((old_category, date), -1), ((category, date), 1)):
+                    total, count = rollup_deltas.get(key, (0, 0))
+                    rollup_deltas[key] = (total + sign * amount, count + sign)
+                charged += amount
+                last_date = max(last_date or date, date)
+            _refund_budgets(cursor, user_id, refunds)
+            _charge_budget(cursor, user_id, category, charged, last_date)
+            _update_rollups(cursor, user_id, rollup_deltas)
+            _bump_data_version(cursor, user_id)
+
+        for description in {row[3] for row in rows.values()}:
+            _learn_category(cursor, user_id, description, category)
+
+    _invalidate_budgets(user_id, [*refunds, category])
+    override_cache.invalidate(user_id)
+    return [expense_id for expense_id in dict.fromkeys(expense_ids) if expense_id in rows]
+
+# Function to move an expense to another category (see recategorize_expenses)
+# Returns False if the expense does not exist (or belongs to another user)
+def recategorize_expense(expense_id, category, user_id=DEFAULT_USER_ID):
+    return bool(recategorize_expenses([expense_id], category, user_id))
+
+# Learned merchant -> category mappings, one dict per user
+override_cache = LRUCache(maxsize=1024, ttl=300)
+
+def _learn_category(cursor, user_id, description, category):
+    merchant = merchant_key(description)
+    if merchant:
+        cursor.execute('''
+            INSERT INTO category_overrides (user_id, merchant, category, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, merchant) DO UPDATE SET
+                category = excluded.category,
+                updated_at = excluded.updated_at
+        ''', (user_id, merchant, category, _now_timestamp()))
+
+# Function to remember that a user files description under category
+def set_category_override(description, category, user_id=DEFAULT_USER_ID):
+    with transaction() as conn:
+        _learn_category(conn.cursor(), user_id, description, category)
+    override_cache.invalidate(user_id)
+
+# Function to get a user's learned overrides as {merchant: category}
+# (pass to categories.categorize)
+def get_category_overrides(user_id=DEFAULT_USER_ID):
+    return override_cache.get_or_load(user_id, lambda: _load_category_overrides(user_id))
+
+def _load_category_overrides(user_id):
+    with connection() as conn:
+        return dict(conn.execute('''
+            SELECT merchant, category FROM category_overrides WHERE user_id = ?
+        ''', (user_id,)).fetchall())
+
+# Function to get the dashboard aggregates for a user
+# Category totals come from the yearly rollups and the date range from two
+# index lookups, so the cost does not depend on how many expenses there are
+def get_expense_summary(user_id=DEFAULT_USER_ID):
+    _wait_for_writes(user_id)
+    with connection() as conn:
+        rows = conn.execute('''
+            SELECT category, SUM(total), SUM(count) FROM budget_rollups
+            WHERE user_id = ? AND period = 'year'
+            GROUP BY category
+        ''', (user_id,)).fetchall()
+        first_date = conn.execute('''
+            SELECT date FROM expenses WHERE user_id = ? ORDER BY date LIMIT 1
+        ''', (user_id,)).fetchone()
+        last_date = conn.execute('''
+            SELECT date FROM expenses WHERE user_id = ? ORDER BY date DESC LIMIT 1
+        ''', (user_id,)).fetchone()
+    return ExpenseSummary(
+        totals={category: total for category, total, _ in rows},
+        counts={category: count for category, _, count in rows},
+        first_date=first_date[0] if first_date else None,
+        last_date=last_date[0] if last_date else None,
+    )
+
+# Function to get how much was spent in a category for one period
+# key defaults to the current day/month/year; this is a single primary-key read
+def get_period_spending(category, period="month", user_id=DEFAULT_USER_ID, key=None):
+    _wait_for_writes(user_id)
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {', '.join(ROLLUP_PERIODS)}")
+    key = key or _period_key(_now_timestamp(), period)
+    with connection() as conn:
+        row = conn.execute('''
+            SELECT total FROM budget_rollups
+            WHERE user_id = ? AND category = ? AND period = ? AND period_key = ?
+        ''', (user_id, category, period, key)).fetchone()
+    return row[0] if row else 0
 
 # Function to get the budget insights for a specific category
-def get_budget_insights(category):
-    conn = connect_db()
-    cursor = conn.cursor()
+# With a period ('day', 'month' or 'year') spending comes from the rollups
+# for the current period instead of the all-time running total
+def get_budget_insights(category, user_id=DEFAULT_USER_ID, period=None):
+    _wait_for_writes(user_id)
+    insights = budget_cache.get_or_load(
+        _insights_cache_key(user_id, category, period),
+        lambda: _load_budget_insights(category, user_id, period))
+    # Callers may modify the result; keep the cached copy intact
+    return dict(insights)
 
-    # Retrieve budget data for the category
-    cursor.execute('''
-        SELECT limit_amount, spent_amount FROM budgets WHERE category = ?
-    ''', (category,))
-    result = cursor.fetchone()
+def _load_budget_insights(category, user_id, period):
+    with connection() as conn:
+        cursor = conn.cursor()
 
-    if result:
-        limit_amount, spent_amount = result
-        remaining_budget = limit_amount - spent_amount
-        advice = ""
+        # Retrieve budget data for the category
+        cursor.execute('''
+            SELECT limit_amount, spent_amount FROM budgets WHERE user_id = ? AND category = ?
+        ''', (user_id, category))
+        result = cursor.fetchone()
 
-        # Provide smart advice based on budget and spending
-        if spent_amount > limit_amount:
-            advice = "You've exceeded your budget in this category. Consider reducing your spending."
-        elif remaining_budget < (limit_amount * 0.1):  # Less than 10% remaining
-            advice = "You're close to reaching your budget limit. Keep an eye on your spending."
-        elif remaining_budget < (limit_amount * 0.3):  # Less than 30% remaining
-            advice = "You're using your budget well, but be mindful of upcoming expenses."
+        if result:
+            limit_amount, spent_amount = result
+            if period:
+                limit_amount = round(limit_amount * PERIOD_LIMIT_SCALE[period], 2)
+                spent_amount = get_period_spending(category, period, user_id)
+            remaining_budget = limit_amount - spent_amount
+            advice = ""
+
+            # Provide smart advice based on budget and spending
+            if spent_amount > limit_amount:
+                advice = "You've exceeded your budget in this category. Consider reducing your spending."
+            elif remaining_budget < (limit_amount * 0.1):  # Less than 10% remaining
+                advice = "You're close to reaching your budget limit. Keep an eye on your spending."
+            elif remaining_budget < (limit_amount * 0.3):  # Less than 30% remaining
+                advice = "You're using your budget well, but be mindful of upcoming expenses."
+            else:
+                advice = "You're well within your budget. Great financial management!"
+
+            insights = {
+                "category": category,
+                "limit_amount": limit_amount,
+                "spent_amount": spent_amount,
+                "remaining_budget": remaining_budget,
+                "advice": advice
+            }
+            if period:
+                insights["period"] = period
+            return insights
         else:
-            advice = "You're well within your budget. Great financial management!"
-
-        return {
-            "category": category,
-            "limit_amount": limit_amount,
-            "spent_amount": spent_amount,
-            "remaining_budget": remaining_budget,
-            "advice": advice
-        }
-    else:
-        return {"message": f"Budget for '{category}' not found. Please set a budget first."}
+            return {"message": f"Budget for '{category}' not found. Please set a budget first."}
 
 # Function to set a budget for a specific category
-def set_budget(category, limit_amount):
-    conn = connect_db()
-    cursor = conn.cursor()
+def set_budget(category, limit_amount, user_id=DEFAULT_USER_ID):
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    # Check if the category already has a budget
-    cursor.execute('''
-        SELECT * FROM budgets WHERE category = ?
-    ''', (category,))
-    existing_budget = cursor.fetchone()
-
-    if existing_budget:
-        # If the budget already exists, update the limit_amount
-        cursor.execute('''
-            UPDATE budgets
-            SET limit_amount = ?
-            WHERE category = ?
-        ''', (limit_amount, category))
-    else:
-        # If the budget doesn't exist, create a new budget for the category
+        # Check if the category already has a budget
         cursor.execute('''
-            INSERT INTO budgets (category, limit_amount) 
-            VALUES (?, ?)
-        ''', (category, limit_amount))
+            SELECT * FROM budgets WHERE user_id = ? AND category = ?
+        ''', (user_id, category))
+        existing_budget = cursor.fetchone()
 
-    conn.commit()
-    conn.close()
+        if existing_budget:
+            # If the budget already exists, update the limit_amount
+            cursor.execute('''
+                UPDATE budgets
+                SET limit_amount = ?
+                WHERE user_id = ? AND category = ?
+            ''', (limit_amount, user_id, category))
+        else:
+            # If the budget doesn't exist, create a new budget for the category
+            cursor.execute('''
+                INSERT INTO budgets (user_id, category, limit_amount)
+                VALUES (?, ?, ?)
+            ''', (user_id, category, limit_amount))
+
+    _invalidate_budgets(user_id, [category])
 
 # Function to add a savings goal to the database
 def add_savings_goal(goal_name, target_amount):
-    conn = connect_db()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        INSERT INTO savings_goals (goal_name, target_amount)
-        VALUES (?, ?)
-    ''', (goal_name, target_amount))
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        cursor.execute('''
+            INSERT INTO savings_goals (goal_name, target_amount)
+            VALUES (?, ?)
+        ''', (goal_name, target_amount))
 
 # Function to update savings progress
 def update_savings_goal(goal_name, current_savings):
-    conn = connect_db()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute('''
-        UPDATE savings_goals 
-        SET current_savings = ?
-        WHERE goal_name = ?
-    ''', (current_savings, goal_name))
-
-    conn.commit()
-    conn.close()
+        cursor.execute('''
+            UPDATE savings_goals 
+            SET current_savings = ?
+            WHERE goal_name = ?
+        ''', (current_savings, goal_name))
 
 # Function to get notification
-def get_notifications(limit=5):
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, message, created_at FROM notifications
-        WHERE status = 'unread'
-        ORDER BY created_at DESC
-        LIMIT ?
-    ''', (limit,))
-    
-    notifications = cursor.fetchall()
-    result = [{"id": n[0], "message": n[1], "date": n[2]} for n in notifications]
-    
-    conn.close()
-    return result
+# Pass user_id to see only that user's alerts
+def get_notifications(limit=5, user_id=None):
+    _wait_for_writes(user_id)
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        if user_id is None:
+            cursor.execute('''
+                SELECT id, message, last_seen_at, occurrences FROM notifications
+                WHERE status = 'unread'
+                ORDER BY last_seen_at DESC
+                LIMIT ?
+            ''', (limit,))
+        else:
+            cursor.execute('''
+                SELECT id, message, last_seen_at, occurrences FROM notifications
+                WHERE user_id = ? AND status = 'unread'
+                ORDER BY last_seen_at DESC
+                LIMIT ?
+            ''', (user_id, limit))
+
+        notifications = cursor.fetchall()
+        return [{"id": n[0], "message": n[1], "date": n[2], "occurrences": n[3]} for n in notifications]
+
+# Function to mark notifications as read
+def mark_notifications_read(notification_ids, user_id=DEFAULT_USER_ID):
+    ids = list(notification_ids)
+    if not ids:
+        return 0
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE notifications SET status = 'read'
+            WHERE id = ? AND user_id = ? AND status = 'unread'
+        ''', [(notification_id, user_id) for notification_id in ids])
+        return cursor.rowcount
+
+# Function to archive (or purge) old notifications so the live table stays small
+# Read alerts older than read_days and anything older than max_age_days are
+# moved to notifications_archive, or deleted outright when archive=False.
+# Work is done in batches so writers are never blocked for long.
+def compact_notifications(read_days=30, max_age_days=180, archive=True, batch_size=1000):
+    moved = 0
+    while True:
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id FROM notifications
+                WHERE (status = 'read' AND last_seen_at < datetime('now', ?))
+                   OR last_seen_at < datetime('now', ?)
+                LIMIT ?
+            ''', (f"-{int(read_days)} days", f"-{int(max_age_days)} days", batch_size))
+            ids = [(row[0],) for row in cursor.fetchall()]
+            if not ids:
+                break
+
+            if archive:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO notifications_archive
+                        (id, user_id, category, period_key, message, status, occurrences, created_at, last_seen_at)
+                    SELECT id, user_id, category, period_key, message, status, occurrences, created_at, last_seen_at
+                    FROM notifications WHERE id = ?
+                ''', ids)
+            cursor.executemany('''
+                DELETE FROM notifications WHERE id = ?
+            ''', ids)
+            moved += len(ids)
+        if len(ids) < batch_size:
+            break
+    return moved
+
+if os.getenv("WRITE_BEHIND") == "1":
+    # Reads only wait for the writes this process queued: the next request
+    # could go to another worker that has not seen its user's write yet
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        raise RuntimeError("WRITE_BEHIND=1 needs a single worker process (WEB_CONCURRENCY=1)")
+    enable_write_behind(
+        max_queue=int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000")),
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200")),
+        max_delay=float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "50")) / 1000,
+    )
 
 if __name__ == '__main__':
+    import sys
+
     init_db()
     print("Database initialized successfully.")
+    if "compact" in sys.argv[1:]:
+        print(f"Archived {compact_notifications()} old notifications.")
@@ -0,0 +1,249 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+import migrations
+
+# Default database file, shared by database.py and app.py
+DATABASE_PATH = os.getenv("DATABASE_PATH", "database.db")
+
+# Pragmas applied to every pooled connection.
+# WAL lets readers run alongside a writer, NORMAL sync is safe under WAL
+# and avoids an fsync per commit, and busy_timeout makes writers wait for
+# the lock instead of failing straight away with "database is locked".
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),       # negative value = size in KiB (~16MB)
+    ("mmap_size", 134217728),     # 128MB memory-mapped I/O
+    ("busy_timeout", 5000),       # milliseconds
+    ("temp_store", "MEMORY"),
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free in time"""
+
+
+class PooledConnection:
+    """Connection handed out by connect(); close() returns it to the pool
+
+    Used as a context manager it commits (or rolls back) on exit, unless it
+    was borrowed inside a transaction that is already open on this thread:
+    that one is left for its owner to end.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._joined = conn.in_transaction
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is not None and not self._joined:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections.
+
+    A thread that already holds a connection gets the same one back when it
+    asks again, so nested helpers share a single transaction. A connection
+    goes back to the pool when its last borrow is released, from whichever
+    thread that happens on.
+
+    Every optimize_every seconds the connection being released runs
+    PRAGMA optimize, so planner statistics keep up as the data grows;
+    connections also run it when the pool is closed.
+    """
+
+    def __init__(self, path=DATABASE_PATH, max_size=8, timeout=10.0, factory=sqlite3.Connection,
+                 optimize_every=3600.0, clock=time.monotonic):
+        self.path = path
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.optimize_every = optimize_every
+        self._clock = clock
+        self._optimized_at = clock()
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # borrowed connection -> [owning thread, borrow depth]
+        self._borrowed = {}
+        self._closed = False
+
+    def _create(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, factory=self.factory)
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            with self._lock:
+                borrow = self._borrowed.get(held)
+                if borrow is not None and borrow[0] == threading.get_ident():
+                    borrow[1] += 1
+                    return held
+            # Released by another thread in the meantime
+            self._local.conn = None
+
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if len(self._all) < self.max_size:
+                    conn = self._create()
+                    self._all.append(conn)
+            if conn is None:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+
+        with self._lock:
+            self._borrowed[conn] = [threading.get_ident(), 1]
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            borrow = self._borrowed.get(conn)
+            if borrow is None:
+                return
+            borrow[1] -= 1
+            if borrow[1] > 0:
+                return
+            del self._borrowed[conn]
+        if getattr(self._local, "conn", None) is conn:
+            self._local.conn = None
+        # Never hand a half-finished transaction to the next borrower
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            self._close(conn)
+        else:
+            if self._clock() - self._optimized_at >= self.optimize_every:
+                self._optimized_at = self._clock()
+                self._optimize(conn)
+            self._idle.put(conn)
+
+    def connect(self):
+        return PooledConnection(self, self.acquire())
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in one write transaction, committing on success.
+
+        Nested calls on the same thread join the outer transaction.
+        """
+        conn = self.acquire()
+        outermost = not conn.in_transaction
+        try:
+            if outermost:
+                # Take the write lock up front so a read-then-write block
+                # cannot deadlock against another writer.
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if outermost:
+                conn.commit()
+        except BaseException:
+            if outermost and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def _optimize(self, conn):
+        # Best effort: a busy or read-only database skips this round
+        try:
+            migrations.optimize(conn)
+        except sqlite3.Error:
+            pass
+
+    def _close(self, conn):
+        self._optimize(conn)
+        conn.close()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            self._all = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH, factory=metrics.TimedConnection)
+    return _pool
+
+
+def configure(path=None, **kwargs):
+    """Point the shared pool at another database file (used by tests and benchmarks)"""
+    global _pool, DATABASE_PATH
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        if path is not None:
+            DATABASE_PATH = path
+        kwargs.setdefault("factory", metrics.TimedConnection)
+        _pool = ConnectionPool(DATABASE_PATH, **kwargs)
+    return _pool
+
+
+def connect():
+    return get_pool().connect()
+
+
+def connection():
+    return get_pool().connection()
+
+
+def transaction():
+    return get_pool().transaction()
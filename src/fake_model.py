@@ -0,0 +1,144 @@
+"""Deterministic stand-in for genai.GenerativeModel.
+
+Lets /chat and /analyze_expenses run without an API key or network, e.g. for
+load tests and CI. Select it with MODEL_BACKEND=fake and tune it with:
+
+    FAKE_MODEL_LATENCY      first-token latency, e.g. "constant:0.2",
+                            "uniform:0.1:0.8" or "lognormal:0.5:0.6"
+                            (median seconds, sigma); default lognormal:0.4:0.5
+    FAKE_MODEL_TOKENS_PER_SEC  generation speed after the first token (default 50)
+    FAKE_MODEL_ERROR_RATE   fraction of calls that fail like a 503 (default 0)
+    FAKE_MODEL_SEED         seed for latencies, errors and replies (default 0)
+
+The same seed, call order and prompt always produce the same reply, delay
+and failure.
+"""
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+
+REPLIES = [
+    "A simple way to start is the 50/30/20 rule: half of your income for needs, "
+    "30% for wants and 20% for savings or paying down debt.",
+    "Look at your three largest categories first. Small cuts there save more than "
+    "trimming many small expenses.",
+    "Build an emergency fund of three to six months of essential expenses before "
+    "investing more aggressively.",
+    "Automate a transfer to savings on payday so saving happens before spending.",
+    "Review subscriptions every quarter and cancel the ones you have not used.",
+]
+
+# Roughly how many tokens an English word costs
+TOKENS_PER_WORD = 1.3
+
+
+class FakeModelError(RuntimeError):
+    # The HTTP status, as on google.api_core errors, so it is retried like one
+    code = 503
+
+
+def parse_latency(spec):
+    """Turn "kind:arg[:arg]" into a function rng -> seconds"""
+    kind, _, rest = spec.partition(":")
+    args = [float(value) for value in rest.split(":") if value]
+    if kind == "constant" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "lognormal" and len(args) == 2:
+        median, sigma = args
+        return lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+    raise ValueError(f"Unknown latency spec '{spec}', expected constant:s, uniform:lo:hi or lognormal:median:sigma")
+
+
+def _text(contents):
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, dict):
+        return _text(contents.get("parts", []))
+    return "\n".join(_text(part) for part in contents)
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    """A reply whose chunks arrive delay seconds apart when iterated, like stream=True"""
+
+    def __init__(self, words, delay=0.0, sleep=time.sleep):
+        self._words = words
+        self._delay = delay
+        self._sleep = sleep
+
+    def __iter__(self):
+        for i, word in enumerate(self._words):
+            if i and self._delay:
+                self._sleep(self._delay)
+            yield FakeChunk(word if i == 0 else " " + word)
+
+    @property
+    def text(self):
+        return " ".join(self._words)
+
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content, stream=False, **kwargs):
+        response = self.model.generate_content(self.history + [{"role": "user", "parts": [content]}], stream=stream)
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [response.text]})
+        return response
+
+
+class FakeGenerativeModel:
+    def __init__(self, latency="lognormal:0.4:0.5", tokens_per_sec=50.0, error_rate=0.0, seed=0,
+                 sleep=time.sleep):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.seed = seed
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _rng(self, prompt):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        digest = hashlib.sha256(f"{self.seed}:{call}:{prompt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        prompt = _text(contents)
+        rng = self._rng(prompt)
+        words = REPLIES[int(hashlib.sha256(prompt.encode()).hexdigest(), 16) % len(REPLIES)].split()
+        word_delay = TOKENS_PER_WORD / self.tokens_per_sec if self.tokens_per_sec else 0.0
+
+        self._sleep(self.latency(rng))
+        if rng.random() < self.error_rate:
+            raise FakeModelError("503 Service Unavailable (fake model)")
+        if stream:
+            return FakeResponse(words, word_delay, self._sleep)
+        # A blocking call returns only once the whole reply is generated
+        self._sleep(word_delay * (len(words) - 1))
+        return FakeResponse(words)
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+
+def from_env():
+    return FakeGenerativeModel(
+        latency=os.getenv("FAKE_MODEL_LATENCY", "lognormal:0.4:0.5"),
+        tokens_per_sec=float(os.getenv("FAKE_MODEL_TOKENS_PER_SEC", "50")),
+        error_rate=float(os.getenv("FAKE_MODEL_ERROR_RATE", "0")),
+        seed=int(os.getenv("FAKE_MODEL_SEED", "0")),
+    )
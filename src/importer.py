@@ -0,0 +1,266 @@
+"""Streaming import of bank statements (CSV or OFX) into the expenses table.
+
+Everything here is a generator pipeline: the upload is read line by line,
+parsed into transactions, categorized and written in fixed-size chunks, so
+memory stays flat however long the statement is.
+
+    summary = import_statement(request.files['file'].stream, user_id,
+                               filename='march.csv', progress=print)
+"""
+import csv
+import re
+from datetime import datetime
+from itertools import islice
+
+import database
+from categories import categorize
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Header names seen in common bank exports, lowercased
+DATE_COLUMNS = ("date", "transaction date", "posted date", "posting date", "booking date")
+DESCRIPTION_COLUMNS = ("description", "payee", "name", "merchant", "memo", "details", "narrative")
+AMOUNT_COLUMNS = ("amount", "transaction amount", "value")
+DEBIT_COLUMNS = ("debit", "withdrawal", "money out", "paid out")
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%Y/%m/%d", "%d %b %Y")
+
+
+class StatementError(ValueError):
+    """Raised when an upload is not a statement we can read"""
+
+
+class ImportProgress:
+    """Running counters handed to the progress callback after each chunk"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.imported = 0
+        self.skipped = 0
+        self.chunks = 0
+        self.bytes_read = 0
+
+    def as_dict(self):
+        return {
+            "rows_read": self.rows_read,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "bytes_read": self.bytes_read,
+        }
+
+
+def _lines(stream, progress, encoding="utf-8"):
+    """Yield decoded text lines from a binary or text stream"""
+    for line in stream:
+        if isinstance(line, bytes):
+            progress.bytes_read += len(line)
+            line = line.decode(encoding, errors="replace")
+        else:
+            progress.bytes_read += len(line.encode(encoding, errors="replace"))
+        yield line
+
+
+def _parse_date(value):
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    value = value.strip().replace(",", "").replace("$", "")
+    if value.startswith("(") and value.endswith(")"):  # accounting negative
+        value = "-" + value[1:-1]
+    return float(value) if value else None
+
+
+def _find_column(fieldnames, candidates):
+    lowered = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def iter_csv_transactions(lines):
+    """Yield (date, description, amount) from CSV lines; spending is positive.
+
+    Statements either have a signed amount column (spending negative) or a
+    separate debit column. Credits and unreadable rows yield None so the
+    caller can count them as skipped.
+    """
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames:
+        return
+
+    date_col = _find_column(reader.fieldnames, DATE_COLUMNS)
+    description_col = _find_column(reader.fieldnames, DESCRIPTION_COLUMNS)
+    debit_col = _find_column(reader.fieldnames, DEBIT_COLUMNS)
+    amount_col = _find_column(reader.fieldnames, AMOUNT_COLUMNS)
+    if not description_col or not (debit_col or amount_col):
+        raise StatementError("CSV needs a description column and an amount or debit column")
+
+    for row in reader:
+        try:
+            if debit_col and (row.get(debit_col) or "").strip():
+                amount = abs(_parse_amount(row[debit_col]))
+            elif amount_col:
+                amount = _parse_amount(row.get(amount_col) or "")
+                # Signed exports list spending as negative numbers
+                amount = -amount if amount is not None and amount < 0 else None
+            else:
+                amount = None
+        except ValueError:
+            amount = None
+
+        if not amount:
+            yield None
+            continue
+
+        date = _parse_date(row.get(date_col) or "") if date_col else None
+        yield date, (row.get(description_col) or "").strip(), amount
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+# Most characters of one tag held back waiting for the next line; a longer
+# tag is parsed as it stands, so malformed input cannot grow the buffer
+MAX_PARTIAL_TAG = 4096
+
+
+def _ofx_tags(lines):
+    """Yield (closing, tag, text) for each OFX tag, holding back at most one partial tag"""
+    buffer = ""
+    for line in lines:
+        buffer += line.strip()
+        # The last tag's text may continue on the next line in XML files
+        cut = buffer.rfind("<")
+        if cut < 0:
+            # Text outside any tag (the SGML header): nothing to parse
+            buffer = ""
+            continue
+        if cut == 0:
+            if len(buffer) <= MAX_PARTIAL_TAG:
+                continue
+            cut = len(buffer)
+        complete, buffer = buffer[:cut], buffer[cut:]
+        for closing, tag, text in _OFX_TAG.findall(complete):
+            yield closing, tag.upper(), text.strip()
+    for closing, tag, text in _OFX_TAG.findall(buffer):
+        yield closing, tag.upper(), text.strip()
+
+
+def iter_ofx_transactions(lines):
+    """Yield (date, description, amount) from OFX 1.x (SGML) or 2.x (XML) lines"""
+    current = None
+    for closing, tag, text in _ofx_tags(lines):
+        if tag == "STMTTRN":
+            if closing and current is not None:
+                yield _ofx_transaction(current)
+                current = None
+            elif not closing:
+                current = {}
+        elif current is not None and not closing:
+            current[tag] = text
+
+
+def _ofx_transaction(fields):
+    try:
+        amount = float(fields.get("TRNAMT", ""))
+    except ValueError:
+        return None
+    if amount >= 0:
+        return None
+    posted = fields.get("DTPOSTED", "")[:8]
+    date = f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) == 8 else None
+    description = fields.get("NAME") or fields.get("MEMO") or "bank transaction"
+    return date, description, -amount
+
+
+def detect_format(filename=None, first_line=""):
+    if filename and filename.lower().endswith((".ofx", ".qfx")):
+        return "ofx"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    if first_line.lstrip().upper().startswith(("OFXHEADER", "<?XML", "<OFX")):
+        return "ofx"
+    return "csv"
+
+
+def iter_expenses(stream, fmt=None, filename=None, progress=None, overrides=None):
+    """Yield expense dicts ready for database.add_expenses_bulk, or None for skipped rows
+
+    overrides are the user's learned {merchant: category} mappings.
+    """
+    progress = progress or ImportProgress()
+    lines = _lines(stream, progress)
+
+    first_line = next(lines, "")
+    if fmt is None:
+        fmt = detect_format(filename, first_line)
+
+    def replay():
+        yield first_line
+        yield from lines
+
+    parse = iter_ofx_transactions if fmt == "ofx" else iter_csv_transactions
+    for transaction in parse(replay()):
+        progress.rows_read += 1
+        if transaction is None:
+            yield None
+            continue
+        date, description, amount = transaction
+        yield {
+            "amount": round(amount, 2),
+            "description": description.lower(),
+            "category": categorize(description, overrides),
+            "date": date,
+        }
+
+
+def iter_import(stream, user_id=database.DEFAULT_USER_ID, fmt=None, filename=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, store=None):
+    """Import a statement one chunk per transaction, yielding progress after each chunk.
+
+    Chunks go to store.add_expenses() when a storage backend is given,
+    otherwise straight to database.add_expenses_bulk(). A failed chunk rolls
+    back on its own; earlier chunks stay committed.
+    """
+    counters = ImportProgress()
+    if store is not None:
+        overrides = store.category_overrides(user_id)
+    else:
+        overrides = database.get_category_overrides(user_id)
+    expenses = iter_expenses(stream, fmt=fmt, filename=filename, progress=counters, overrides=overrides)
+
+    while True:
+        batch = list(islice(expenses, chunk_size))
+        if not batch:
+            break
+        rows = [expense for expense in batch if expense is not None]
+        counters.skipped += len(batch) - len(rows)
+        if rows:
+            if store is not None:
+                counters.imported += store.add_expenses(user_id, rows)
+            else:
+                counters.imported += database.add_expenses_bulk(rows, user_id=user_id)
+        counters.chunks += 1
+        yield counters
+
+
+def import_statement(stream, user_id=database.DEFAULT_USER_ID, fmt=None, filename=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, progress=None, store=None):
+    """Import a whole statement and return the final ImportProgress.
+
+    progress, if given, is called with the running counters after every chunk.
+    """
+    counters = ImportProgress()
+    for counters in iter_import(stream, user_id, fmt=fmt, filename=filename,
+                                chunk_size=chunk_size, store=store):
+        if progress:
+            progress(counters)
+    return counters
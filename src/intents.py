@@ -0,0 +1,185 @@
+"""Rule-based intent routing for chat messages.
+
+route() tokenizes a message once and looks every word and short phrase up in
+a table built when the router is created. From that single pass it returns
+the intent together with any amount, category, description and budget
+period. Lookups are dict hits, so the cost of a message depends on its
+length, not on how many keywords are registered.
+
+    intent = route("Spent $45 on groceries")
+    intent.name, intent.amount, intent.category    # "add_expense", 45.0, "food"
+
+Intents, highest priority first: add_expense, set_budget, greeting, help,
+budget_query, expense_tracking, savings, spending_total, unknown.
+"""
+import re
+
+from categories import categorize
+
+# Conversational intents and the words or phrases that signal them
+KEYWORDS = {
+    "greeting": ("hello", "hi", "hey"),
+    "help": ("help", "what can you do"),
+    "expense_tracking": ("expense", "expenses", "spending", "track", "tracking"),
+    "savings": ("save", "saving", "savings"),
+}
+
+# Phrases that narrow a budget question to one period
+PERIOD_PHRASES = {
+    "today": "day", "this day": "day",
+    "this month": "month", "per month": "month", "monthly": "month",
+    "this year": "year", "per year": "year", "yearly": "year",
+}
+
+# Words that give commands their structure
+STRUCTURE = {
+    "expense_verb": ("add", "spent", "paid"),
+    "set_budget": ("set budget", "set a budget", "set my budget"),
+    "budget_for": ("budget for",),
+    "how_much": ("how much",),
+    "spend": ("spend", "spent", "spending"),
+    "for": ("for",),
+    "on": ("on",),
+    "to": ("to",),
+}
+
+_TOKEN = re.compile(r"\$\s*\d[\d,]*(?:\.\d+)?|\d[\d,]*(?:\.\d+)?|[a-z]+(?:'[a-z]+)?")
+
+
+class Intent:
+    __slots__ = ("name", "text", "amount", "category", "description", "period", "keywords")
+
+    def __init__(self, name, text, amount=None, category=None, description=None, period=None,
+                 keywords=frozenset()):
+        self.name = name
+        self.text = text
+        self.amount = amount
+        self.category = category
+        self.description = description
+        self.period = period
+        self.keywords = keywords
+
+    def __repr__(self):
+        return (f"Intent({self.name!r}, amount={self.amount!r}, category={self.category!r}, "
+                f"description={self.description!r}, period={self.period!r})")
+
+
+class _Token:
+    __slots__ = ("word", "amount", "dollar", "start", "end")
+
+    def __init__(self, match):
+        text = match.group()
+        self.start = match.start()
+        self.end = match.end()
+        if text[0] == "$" or text[0].isdigit():
+            self.word = None
+            self.dollar = text[0] == "$"
+            self.amount = float(text.lstrip("$ ").replace(",", ""))
+        else:
+            self.word = text
+            self.dollar = False
+            self.amount = None
+
+
+class _Hit:
+    __slots__ = ("index", "start", "end", "value")
+
+    def __init__(self, index, start, end, value):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.value = value
+
+
+def _first_after(hits, index):
+    for hit in hits:
+        if hit.index > index:
+            return hit
+    return None
+
+
+class IntentRouter:
+    def __init__(self, keywords=KEYWORDS, periods=PERIOD_PHRASES, structure=STRUCTURE):
+        # Phrase (tuple of words) -> [(label, value)]
+        self._phrases = {}
+        for intent, phrases in keywords.items():
+            for phrase in phrases:
+                self._add(phrase, intent, None)
+        for phrase, period in periods.items():
+            self._add(phrase, "period", period)
+        for label, phrases in structure.items():
+            for phrase in phrases:
+                self._add(phrase, label, None)
+        self._max_words = max(len(phrase) for phrase in self._phrases)
+
+    def _add(self, phrase, label, value):
+        self._phrases.setdefault(tuple(phrase.lower().split()), []).append((label, value))
+
+    def _scan(self, text):
+        tokens = [_Token(match) for match in _TOKEN.finditer(text)]
+        hits = {}
+        for i in range(len(tokens)):
+            key = ()
+            for j in range(i, min(i + self._max_words, len(tokens))):
+                if tokens[j].word is None:
+                    break
+                key += (tokens[j].word,)
+                for label, value in self._phrases.get(key, ()):
+                    hits.setdefault(label, []).append(_Hit(j, tokens[i].start, tokens[j].end, value))
+        return tokens, hits
+
+    def route(self, message, overrides=None):
+        """overrides are the user's learned {merchant: category} mappings"""
+        text = message.lower().strip()
+        tokens, hits = self._scan(text)
+        keywords = frozenset(hits)
+        period_hit = hits["period"][0] if "period" in hits else None
+        period = period_hit.value if period_hit else None
+
+        # "Add $45 for groceries", "Spent $12 on lunch"
+        dollars = [token for token in tokens if token.dollar]
+        marker = (hits.get("for") or hits.get("on") or [None])[0]
+        if "expense_verb" in hits and dollars and marker:
+            description = text[marker.end:].strip() or "misc expense"
+            return Intent("add_expense", text, amount=dollars[0].amount,
+                          category=categorize(description, overrides), description=description,
+                          period=period, keywords=keywords)
+
+        # "Set budget for food to $400"
+        if "set_budget" in hits:
+            set_hit = hits["set_budget"][0]
+            for_hit = _first_after(hits.get("for", ()), set_hit.index)
+            to_hit = for_hit and _first_after(hits.get("to", ()), for_hit.index)
+            amount = to_hit and next((t for t in tokens[to_hit.index + 1:] if t.amount is not None), None)
+            if amount:
+                return Intent("set_budget", text, amount=amount.amount,
+                              category=text[for_hit.end:to_hit.start].strip(), period=period,
+                              keywords=keywords)
+
+        for name in ("greeting", "help"):
+            if name in hits:
+                return Intent(name, text, period=period, keywords=keywords)
+
+        # "What's my budget for food this month?"
+        if "budget_for" in hits:
+            category = text[hits["budget_for"][-1].end:]
+            if period_hit and period_hit.start >= hits["budget_for"][-1].end:
+                category = category.replace(text[period_hit.start:period_hit.end], "")
+            category = " ".join(category.split()).rstrip("?").strip()
+            return Intent("budget_query", text, category=category, period=period, keywords=keywords)
+
+        for name in ("expense_tracking", "savings"):
+            if name in hits:
+                return Intent(name, text, period=period, keywords=keywords)
+
+        if "how_much" in hits and "spend" in hits:
+            return Intent("spending_total", text, period=period, keywords=keywords)
+
+        return Intent("unknown", text, period=period, keywords=keywords)
+
+
+_default_router = IntentRouter()
+
+
+def route(message, overrides=None):
+    return _default_router.route(message, overrides)
@@ -0,0 +1,137 @@
+"""Response cache in front of the Gemini model.
+
+Responses are keyed by a hash of the normalized prompt, so the same question
+asked with different capitalisation or spacing is answered from cache. The
+first tier is an in-process LRU with a TTL; an optional SQLite tier
+(LLM_CACHE_DB) shares answers across workers and restarts. Its connections
+are opened on first use, so a cache created before a fork opens its own in
+each worker.
+
+    cache = ResponseCache(maxsize=1024, ttl=3600)
+    key = cache.key("chat", SYSTEM_PROMPT, user_message)
+    text = cache.get_or_generate(key, lambda: model.generate_content(...).text)
+"""
+import hashlib
+import re
+import threading
+import time
+
+from cache import LRUCache
+from db_pool import ConnectionPool
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_prompt(text):
+    text = _WHITESPACE.sub(" ", text.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+class ResponseCache:
+    # Expired rows are purged from the SQLite tier every this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, maxsize=1024, ttl=3600, persist_path=None, clock=time.time):
+        self.ttl = ttl
+        self._clock = clock
+        self._memory = LRUCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        self._persist_path = persist_path
+        self._pool = None
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _persistent(self):
+        """The SQLite tier's pool, opened on first use; None without one"""
+        if self._persist_path is None:
+            return None
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    pool = ConnectionPool(self._persist_path, max_size=4)
+                    with pool.transaction() as conn:
+                        conn.execute('''
+                            CREATE TABLE IF NOT EXISTS llm_responses (
+                                key TEXT PRIMARY KEY,
+                                response TEXT NOT NULL,
+                                created_at REAL NOT NULL
+                            )
+                        ''')
+                    self._pool = pool
+        return self._pool
+
+    @staticmethod
+    def key(namespace, *parts):
+        digest = hashlib.sha256(namespace.encode())
+        for part in parts:
+            digest.update(b"\0" + normalize_prompt(part).encode())
+        return f"{namespace}:{digest.hexdigest()}"
+
+    def get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+
+        pool = self._persistent()
+        if pool is not None:
+            with pool.connection() as conn:
+                row = conn.execute('''
+                    SELECT response FROM llm_responses WHERE key = ? AND created_at > ?
+                ''', (key, self._clock() - self.ttl)).fetchone()
+            if row:
+                self._memory.set(key, row[0])
+                with self._lock:
+                    self.persistent_hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, response):
+        self._memory.set(key, response)
+        pool = self._persistent()
+        if pool is None:
+            return
+        now = self._clock()
+        with pool.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_responses (key, response, created_at) VALUES (?, ?, ?)
+            ''', (key, response, now))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM llm_responses WHERE created_at <= ?', (now - self.ttl,))
+
+    def get_or_generate(self, key, generate):
+        """Return the cached response for key, or call generate() and cache its text"""
+        response = self.get(key)
+        if response is None:
+            response = generate()
+            if response:
+                self.set(key, response)
+        return response
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.persistent_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "size": len(self._memory),
+                "evictions": self._memory.evictions,
+            }
+
+    def close(self):
+        """Close the SQLite connections; the next lookup opens new ones"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,341 @@
+"""Guarded access to the Gemini model.
+
+ResilientModel wraps a GenerativeModel so a slow or failing upstream cannot
+tie up every Flask worker:
+
+- at most max_concurrent calls are in flight; callers that cannot get a slot
+  within queue_timeout are turned away with ModelBusy
+- each call has a deadline; the request thread stops waiting when it passes
+  (ModelTimeout) even though the HTTP call itself cannot be interrupted
+- attempts that fail with a transient error (a timeout, rate limit, server
+  error or dropped connection, see is_transient) are retried with jittered
+  exponential backoff while the deadline allows; any other error is raised
+  at once
+- after failure_threshold consecutive failed calls (a call counts once,
+  however many attempts it made) the circuit opens and calls fail fast with
+  CircuitOpen for reset_after seconds, then one trial call decides whether
+  to close it again
+
+All of these derive from ModelUnavailable, which callers catch to fall back
+to the rule-based engine in chatbot.py.
+
+A streamed reply (stream=True) is read under the same limits: it keeps its
+slot until it is exhausted or closed, each chunk has the call's timeout to
+arrive, and the breaker records how the stream ended (see GuardedStream).
+
+Every call's latency, outcome and prompt and reply sizes are recorded in
+metrics.py.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+
+
+class ModelUnavailable(Exception):
+    """The model cannot answer right now; use a local fallback"""
+
+
+class ModelBusy(ModelUnavailable):
+    pass
+
+
+class ModelTimeout(ModelUnavailable):
+    pass
+
+
+class CircuitOpen(ModelUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_after=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+
+    def allow(self):
+        """True if a call may go ahead; in half-open state only one trial call does"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def abandon_trial(self):
+        """A half-open trial call never reached the model; let the next caller try"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+
+# HTTP statuses and gRPC status names of errors worth another attempt
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_GRPC_CODES = {"DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "INTERNAL", "ABORTED"}
+
+
+def is_transient(error):
+    """True if the same call may well succeed when tried again
+
+    google.api_core errors carry the HTTP status as code, gRPC errors a
+    code() method; invalid arguments, permission errors and the like are not
+    retried.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            return False
+        return getattr(code, "name", None) in TRANSIENT_GRPC_CODES
+    return isinstance(code, int) and code in TRANSIENT_STATUSES
+
+
+def text_size(contents):
+    """Characters of text in a prompt: a string, Gemini messages or lists of either"""
+    if isinstance(contents, str):
+        return len(contents)
+    if isinstance(contents, dict):
+        return text_size(contents.get("parts", ()))
+    if isinstance(contents, (list, tuple)):
+        return sum(text_size(item) for item in contents)
+    return 0
+
+
+_END = object()
+
+
+class GuardedStream:
+    """A streamed reply read under the limits of the call that opened it
+
+    Each chunk is fetched on the model's worker pool and must arrive within
+    the client's timeout, or ModelTimeout is raised. The concurrency slot is
+    held until the stream is exhausted, fails or is closed (a chunk still
+    being fetched keeps it until it returns). A failure or stall counts
+    against the circuit breaker, reaching the end counts as a success, and
+    closing the stream early counts as neither.
+    """
+
+    def __init__(self, client, stream):
+        self._client = client
+        self._stream = stream
+        self._chunks = None
+        self._fetching = None
+        self._open = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._open:
+            raise StopIteration
+        client = self._client
+        self._fetching = client._executor.submit(self._fetch)
+        try:
+            chunk = self._fetching.result(timeout=client.timeout)
+        except FutureTimeout:
+            client._count("timeouts")
+            self._fail()
+            raise ModelTimeout(f"The model sent nothing for {client.timeout:g}s mid-reply")
+        except Exception:
+            client._count("failures")
+            self._fail()
+            raise
+        if chunk is _END:
+            client.breaker.record_success()
+            self._release()
+            raise StopIteration
+        return chunk
+
+    def _fetch(self):
+        if self._chunks is None:
+            self._chunks = iter(self._stream)
+        return next(self._chunks, _END)
+
+    def _fail(self):
+        self._client.breaker.record_failure()
+        self._release()
+
+    def close(self):
+        """Stop reading; the slot is freed and the breaker left as it was"""
+        if self._open:
+            self._client.breaker.abandon_trial()
+            self._release()
+
+    def _release(self):
+        if self._open:
+            self._open = False
+            if self._fetching is None:
+                self._client._slots.release()
+            else:
+                self._fetching.add_done_callback(lambda _: self._client._slots.release())
+
+    def __del__(self):
+        self.close()
+
+
+class ResilientChat:
+    """ChatSession whose send_message goes through the owning ResilientModel"""
+
+    def __init__(self, client, session, history_chars=0):
+        self._client = client
+        self._session = session
+        # The whole history is sent again with every message
+        self._history_chars = history_chars
+
+    def send_message(self, content, **kwargs):
+        metrics.gemini_prompt_chars.observe(self._history_chars + text_size(content), "send_message")
+        return self._client.call(self._session.send_message, content, **kwargs)
+
+
+class ResilientModel:
+    def __init__(self, model, max_concurrent=4, timeout=20.0, queue_timeout=1.0, retries=2,
+                 backoff=0.5, failure_threshold=5, reset_after=30.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.model = model
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_after, clock)
+        self._clock = clock
+        self._sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        # Calls that outlive their deadline keep their slot (and thread) until they
+        # return, so a hung upstream is capped at max_concurrent threads
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="gemini")
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def generate_content(self, contents, **kwargs):
+        metrics.gemini_prompt_chars.observe(text_size(contents), "generate_content")
+        return self.call(self.model.generate_content, contents, **kwargs)
+
+    def start_chat(self, history=None):
+        return ResilientChat(self, self.model.start_chat(history=history), text_size(history or []))
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the model's worker pool under the limits"""
+        method = getattr(fn, "__name__", "call")
+        started = time.perf_counter()
+        try:
+            result = self._call(fn, args, kwargs)
+        except Exception as e:
+            metrics.gemini_latency.observe(time.perf_counter() - started, method, "error")
+            metrics.gemini_errors.inc(method, type(e).__name__)
+            raise
+        metrics.gemini_latency.observe(time.perf_counter() - started, method, "ok")
+        if not kwargs.get("stream"):
+            try:
+                metrics.gemini_response_chars.observe(len(result.text), method)
+            except Exception:
+                # No text, e.g. a reply withheld by the safety filters
+                pass
+        return result
+
+    def _call(self, fn, args, kwargs):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpen("The model is temporarily unavailable")
+
+        deadline = self._clock() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(fn, args, kwargs, deadline)
+            except ModelBusy:
+                # Shedding load is not an upstream failure
+                self._count("rejected")
+                self.breaker.abandon_trial()
+                raise
+            except Exception as e:
+                self._count("failures")
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if (attempt >= self.retries or isinstance(e, ModelTimeout) or not is_transient(e)
+                        or self._clock() + delay >= deadline):
+                    # One failure per call, however many attempts it took
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self._count("retried")
+                self._sleep(delay)
+                continue
+            if not isinstance(result, GuardedStream):
+                self.breaker.record_success()
+            self._count("calls")
+            return result
+
+    def _attempt(self, fn, args, kwargs, deadline):
+        if not self._slots.acquire(timeout=max(0.0, min(self.queue_timeout, deadline - self._clock()))):
+            raise ModelBusy("Too many requests to the model are in flight")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        if not kwargs.get("stream"):
+            future.add_done_callback(lambda _: self._slots.release())
+            return self._result(future, deadline)
+        try:
+            # The stream takes over the slot once it is open
+            return GuardedStream(self, self._result(future, deadline))
+        except BaseException:
+            future.add_done_callback(lambda _: self._slots.release())
+            raise
+
+    def _result(self, future, deadline):
+        try:
+            return future.result(timeout=max(0.0, deadline - self._clock()))
+        except FutureTimeout:
+            self._count("timeouts")
+            raise ModelTimeout(f"The model did not answer within {self.timeout:g}s")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.breaker.state,
+                "trips": self.breaker.trips,
+                "calls": self.calls,
+                "retried": self.retried,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "failures": self.failures,
+            }
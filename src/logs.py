@@ -0,0 +1,179 @@
+"""Structured, sampled logging that never blocks a request on I/O.
+
+    log = logs.get_logger(__name__)
+    log.debug("chat.intent", intent="add_expense", chars=18)
+    log.warning("model.unavailable", sample=0.1, error=str(e))
+    log.exception("dashboard.error")
+
+Each call is an event name plus fields, written as one JSON object per line:
+
+    {"ts": "2024-05-01T12:00:00.123+00:00", "level": "debug", "logger": "app",
+     "event": "chat.intent", "intent": "add_expense", "chars": 18}
+
+Events below LOG_LEVEL (default INFO) cost one level check. An event with a
+sample rate is kept that fraction of the time and says so in sample_rate;
+LOG_SAMPLE="chat.intent=0.01,dashboard.view=0" overrides the rate per event.
+
+configure() puts a QueueHandler on the root logger, so Flask's and
+werkzeug's records take the same path. The calling thread only builds the
+record and puts it on a bounded queue; a listener thread formats and writes
+it. When the queue is full the record is dropped and counted rather than
+making the request wait. The listener is restarted in a forked worker.
+
+Fields are for ids, names, counts and timings: never log message text,
+descriptions or amounts.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# event name -> sample rate, from LOG_SAMPLE; overrides the rate at the call site
+_sample_rates = {}
+_handler = None
+_listener = None
+
+
+def parse_sample_rates(spec):
+    """{"event": rate} from "event=rate,event=rate" """
+    rates = {}
+    for item in spec.split(","):
+        event, _, rate = item.partition("=")
+        if event.strip():
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted, dropping them when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread; the record stays in-process
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLogger:
+    """A logging.Logger that takes an event name and fields"""
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def log(self, level, event, sample=1.0, exc_info=None, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event, sample)
+        if rate < 1:
+            if random.random() >= rate:
+                return
+            fields["sample_rate"] = rate
+        self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event, **fields):
+        """An error with the traceback of the exception being handled"""
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+def configure(level=None, stream=None, sample_rates=None, queue_size=10000, asynchronous=True):
+    """Send all logging through one JSON handler on the root logger
+
+    level and sample_rates default to LOG_LEVEL and LOG_SAMPLE. With
+    asynchronous=False records are written by the calling thread (for
+    comparison in benchmarks/bench_logging.py).
+    """
+    global _handler, _listener
+    stop()
+    _sample_rates.clear()
+    _sample_rates.update(parse_sample_rates(os.getenv("LOG_SAMPLE", "")) if sample_rates is None else sample_rates)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+    if asynchronous:
+        _handler = _QueueHandler(queue.Queue(queue_size))
+        _listener = logging.handlers.QueueListener(_handler.queue, output)
+        _listener.start()
+    else:
+        _handler = output
+    root = logging.getLogger()
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(_handler)
+    return _handler
+
+
+def flush():
+    """Wait until the listener has written everything queued so far"""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def stop():
+    """Write what is queued and take the handler off the root logger"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+def dropped():
+    """Records dropped because the queue was full"""
+    return getattr(_handler, "dropped", 0)
+
+
+def _after_fork_in_child():
+    # The listener thread did not survive the fork, and the records still
+    # queued are the parent's to write
+    global _listener
+    if _listener is not None:
+        _handler.queue = queue.Queue(_handler.queue.maxsize)
+        _listener = logging.handlers.QueueListener(_handler.queue, *_listener.handlers)
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(stop)
@@ -0,0 +1,403 @@
+"""Counters and latency histograms, exposed in the Prometheus text format.
+
+    http_requests_total / http_request_duration_seconds
+        every Flask route, by its rule (e.g. /delete_expense/<int:expense_id>)
+    sqlite_statement_duration_seconds / sqlite_statement_errors_total
+        every statement run on the shared pool's connections, by verb and table
+    gemini_request_duration_seconds / gemini_errors_total
+    gemini_prompt_chars / gemini_response_chars
+        every call through llm_client.ResilientModel
+
+REGISTRY.render() produces the exposition text that /metrics serves. Each
+process records into its own registry. With METRICS_DIR set (gunicorn.conf.py
+sets it), every process also saves its figures to <pid>-<random>.json there
+every FLUSH_SECONDS and at exit, and a scrape sums the files of all of them,
+so any worker answers for the whole server, up to FLUSH_SECONDS behind.
+When a worker exits, REGISTRY.retire(pid) folds its file into retired.json,
+so counters never go backwards when gunicorn replaces it and the directory
+does not grow; the random part keeps a worker that reuses the pid from
+writing over a file not yet retired. REGISTRY.clear_directory() empties the
+directory when the server starts.
+
+Recording is a dict lookup, a bisect and a few additions under a lock per
+metric, about a microsecond (see benchmarks/bench_metrics.py), so it stays
+on in production. SQLite timings cover execute() and commit(); for a SELECT
+that includes finding the first row but not fetching the rest.
+"""
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import lru_cache
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds: seconds for requests and model calls, for statements,
+# and characters for prompts and responses
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+
+# How often each process saves its figures to METRICS_DIR
+FLUSH_SECONDS = 5.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A total per combination of label values"""
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def series(self):
+        """{label values: total}"""
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def add(total, series):
+        """Add one process's series() into total"""
+        for labelvalues, value in series.items():
+            total[labelvalues] = total.get(labelvalues, 0) + value
+
+    def samples(self, series=None):
+        values = sorted((self.series() if series is None else series).items())
+        for labelvalues, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Histogram:
+    """Observations counted into fixed buckets per combination of label values"""
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (the last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, *labelvalues):
+        """(count, sum) of the observations with these label values"""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def reset(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self):
+        """{label values: [count per bucket, sum, count]}"""
+        with self._lock:
+            return {labelvalues: [list(counts), total, count]
+                    for labelvalues, (counts, total, count) in self._series.items()}
+
+    @staticmethod
+    def add(total, series):
+        """Add one process's series() into total"""
+        for labelvalues, (counts, value_sum, count) in series.items():
+            merged = total.get(labelvalues)
+            if merged is None:
+                total[labelvalues] = [list(counts), value_sum, count]
+                continue
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += value_sum
+            merged[2] += count
+
+    def samples(self, series=None):
+        series = sorted((self.series() if series is None else series).items())
+        for labelvalues, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}"
+            labels = _labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_number(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    """The metrics of one process; with a directory, of every process using it"""
+
+    RETIRED = "retired.json"
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._metrics = []
+        # (pid, file name): a forked process picks a name of its own
+        self._file = None
+        self._retire_lock = threading.Lock()
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def _filename(self):
+        pid = os.getpid()
+        if self._file is None or self._file[0] != pid:
+            self._file = (pid, f"{pid}-{uuid.uuid4().hex[:8]}.json")
+        return self._file[1]
+
+    def _snapshot(self, merged):
+        # {name: series} as JSON: label tuples become lists
+        return {name: [[list(labelvalues), value] for labelvalues, value in series.items()]
+                for name, series in merged.items()}
+
+    def _add(self, merged, snapshot):
+        # Add a _snapshot() read back from a file into {name: series}
+        kinds = {metric.name: metric for metric in self._metrics}
+        for name, series in snapshot.items():
+            if name in kinds:
+                kinds[name].add(merged.setdefault(name, {}),
+                                {tuple(labelvalues): value for labelvalues, value in series})
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory, name)
+        # Written aside and renamed, so a scrape never reads half a file
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        """Write this process's figures to its file in the directory"""
+        self._write(self._filename(), self._snapshot({metric.name: metric.series() for metric in self._metrics}))
+
+    def retire(self, pid):
+        """Fold the files of the exited process pid into retired.json"""
+        with self._retire_lock:
+            names = [entry.name for entry in os.scandir(self.directory)
+                     if entry.name.startswith(f"{pid}-") and entry.name.endswith(".json")]
+            if not names:
+                return
+            retired = self._read(self.RETIRED) or {"folded": [], "metrics": {}}
+            merged = {}
+            self._add(merged, retired["metrics"])
+            for name in names:
+                self._add(merged, self._read(name) or {})
+            # A scrape between the two steps skips the folded files, so
+            # nothing is counted twice
+            self._write(self.RETIRED, {"folded": names, "metrics": self._snapshot(merged)})
+            for name in names:
+                os.remove(os.path.join(self.directory, name))
+
+    def _merged(self):
+        # name -> series summed over every process's file, this one's saved first
+        self.save()
+        merged = {}
+        retired = self._read(self.RETIRED) or {"folded": [], "metrics": {}}
+        self._add(merged, retired["metrics"])
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json") and entry.name != self.RETIRED and entry.name not in retired["folded"]:
+                self._add(merged, self._read(entry.name) or {})
+        return merged
+
+    def render(self):
+        merged = self._merged() if self.directory else None
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples(None if merged is None else merged.get(metric.name, {})))
+        return "\n".join(lines) + "\n"
+
+    def clear_directory(self):
+        """Delete the saved figures, e.g. of a previous server run"""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".json", ".tmp")):
+                os.remove(entry.path)
+
+
+REGISTRY = Registry(os.getenv("METRICS_DIR") or None)
+
+http_requests = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route, method and status code", ("route", "method", "status"))
+http_latency = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to build the response, by route and method", ("route", "method"))
+
+statement_latency = REGISTRY.histogram(
+    "sqlite_statement_duration_seconds", "SQLite execute() and commit() time by statement and table",
+    ("statement", "table"), STATEMENT_BUCKETS)
+statement_errors = REGISTRY.counter(
+    "sqlite_statement_errors_total", "SQLite statements that raised, by statement and table",
+    ("statement", "table"))
+
+gemini_latency = REGISTRY.histogram(
+    "gemini_request_duration_seconds", "Gemini calls including retries, by method and outcome",
+    ("method", "outcome"))
+gemini_errors = REGISTRY.counter(
+    "gemini_errors_total", "Gemini calls that failed, by method and error", ("method", "error"))
+gemini_prompt_chars = REGISTRY.histogram(
+    "gemini_prompt_chars", "Characters sent to Gemini per call, history included", ("method",), SIZE_BUCKETS)
+gemini_response_chars = REGISTRY.histogram(
+    "gemini_response_chars", "Characters in Gemini replies (not streamed ones)", ("method",), SIZE_BUCKETS)
+
+
+def instrument(app):
+    """Count and time every request the Flask app serves"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # The rule, not the path, so ids in URLs do not make new series
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            http_latency.observe(time.perf_counter() - started, route, request.method)
+            http_requests.inc(route, request.method, str(response.status_code))
+        return response
+
+
+# The table a statement works on; ON is for CREATE INDEX ... ON table
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+NOT\s+EXISTS)?|ON)\s+(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_labels(sql):
+    """(verb, table) for a statement, e.g. ("select", "expenses")"""
+    words = sql.split(None, 1)
+    match = _TABLE.search(sql)
+    return (words[0].lower() if words else "", match.group(1) if match else "")
+
+
+def _timed(run, sql, *args):
+    labels = statement_labels(sql)
+    started = time.perf_counter()
+    try:
+        return run(sql, *args)
+    except sqlite3.Error:
+        statement_errors.inc(*labels)
+        raise
+    finally:
+        statement_latency.observe(time.perf_counter() - started, *labels)
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return _timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _timed(super().executemany, sql, seq_of_parameters)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory that times every statement"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            statement_latency.observe(time.perf_counter() - started, "commit", "")
+
+
+def _save_periodically():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            REGISTRY.save()
+        except OSError:
+            pass
+
+
+def _start_saving():
+    if REGISTRY.directory:
+        threading.Thread(target=_save_periodically, name="metrics-save", daemon=True).start()
+
+
+def _save_at_exit():
+    if REGISTRY.directory:
+        try:
+            REGISTRY.save()
+        except OSError:
+            pass
+
+
+def _after_fork_in_child():
+    # The saving thread did not survive the fork, and the figures inherited
+    # from the parent are already in the parent's file
+    if REGISTRY.directory:
+        for metric in REGISTRY._metrics:
+            metric.reset()
+        _start_saving()
+
+
+_start_saving()
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_save_at_exit)
@@ -0,0 +1,322 @@
+"""Versioned schema migrations tracked with PRAGMA user_version.
+
+database.py and app.py used to create slightly different tables in the same
+database.db (app.py's expenses/budgets carry a user_id, database.py's do
+not). The migrations below bring either layout, or an empty file, to one
+schema and add the indexes the query paths rely on.
+
+Each migration runs in its own transaction together with the user_version
+bump, so a crash leaves the database at the last completed version.
+"""
+
+# Owner of rows written before expenses and budgets were user-scoped.
+# Matches the fallback user in app.py (session.get('user_id', 'default_user')).
+DEFAULT_USER_ID = 'default_user'
+
+
+def _columns(cursor, table):
+    return [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+
+
+def _baseline_tables(cursor):
+    """Create the tables for a fresh database (no-op for existing ones)"""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+            amount REAL NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS budgets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+            category TEXT NOT NULL,
+            limit_amount REAL NOT NULL,
+            spent_amount REAL DEFAULT 0,
+            UNIQUE(user_id, category)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS savings_goals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            goal_name TEXT NOT NULL,
+            target_amount REAL NOT NULL,
+            current_savings REAL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message TEXT NOT NULL,
+            status TEXT DEFAULT 'unread',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _reconcile_user_scope(cursor):
+    """Give database.py-style expenses/budgets tables a user_id"""
+    if 'user_id' not in _columns(cursor, 'expenses'):
+        cursor.execute(f'''
+            ALTER TABLE expenses
+            ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'
+        ''')
+
+    # budgets needs a new UNIQUE(user_id, category) constraint, which
+    # SQLite can only do by rebuilding the table
+    if 'user_id' not in _columns(cursor, 'budgets'):
+        cursor.execute(f'''
+            CREATE TABLE budgets_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+                category TEXT NOT NULL,
+                limit_amount REAL NOT NULL,
+                spent_amount REAL DEFAULT 0,
+                UNIQUE(user_id, category)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO budgets_new (id, category, limit_amount, spent_amount)
+            SELECT id, category, limit_amount, spent_amount FROM budgets
+        ''')
+        cursor.execute('DROP TABLE budgets')
+        cursor.execute('ALTER TABLE budgets_new RENAME TO budgets')
+
+
+def _query_indexes(cursor):
+    """Indexes for the category/date scans and notification/goal lookups"""
+    # amount is included so per-category totals are answered from the index
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date
+        ON expenses (user_id, category, date, amount)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+        ON expenses (user_id, date)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_status_created
+        ON notifications (status, created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_savings_goals_name
+        ON savings_goals (goal_name)
+    ''')
+
+
+def _budget_rollups(cursor):
+    """Per-period spending totals, kept in step with expenses by database.py"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS budget_rollups (
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            period TEXT NOT NULL,
+            period_key TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category, period, period_key)
+        ) WITHOUT ROWID
+    ''')
+
+    # Backfill from the expenses already recorded
+    for period, key_expr in (("day", "substr(date, 1, 10)"),
+                             ("month", "substr(date, 1, 7)"),
+                             ("year", "substr(date, 1, 4)")):
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO budget_rollups (user_id, category, period, period_key, total, count)
+            SELECT user_id, category, '{period}', {key_expr}, SUM(amount), COUNT(*)
+            FROM expenses
+            WHERE category IS NOT NULL AND date IS NOT NULL
+            GROUP BY user_id, category, {key_expr}
+        ''')
+
+
+def _coalesced_notifications(cursor):
+    """One live alert per (user, category, period) plus an archive for retention"""
+    columns = _columns(cursor, 'notifications')
+    for name, definition in (
+            ("user_id", f"TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'"),
+            ("category", "TEXT"),
+            ("period_key", "TEXT"),
+            ("occurrences", "INTEGER NOT NULL DEFAULT 1"),
+            ("last_seen_at", "TIMESTAMP")):
+        if name not in columns:
+            cursor.execute(f"ALTER TABLE notifications ADD COLUMN {name} {definition}")
+
+    # Recover the category from existing budget alerts so they can be merged
+    cursor.execute('''
+        UPDATE notifications
+        SET category = substr(message, 29, instr(message, ' budget of') - 29),
+            period_key = substr(created_at, 1, 7)
+        WHERE category IS NULL AND message LIKE 'Alert: You''ve exceeded your % budget of %'
+    ''')
+    cursor.execute('''
+        UPDATE notifications SET last_seen_at = created_at WHERE last_seen_at IS NULL
+    ''')
+
+    # Fold duplicate unread alerts into the newest row of each group
+    cursor.execute('''
+        UPDATE notifications
+        SET occurrences = (
+                SELECT SUM(d.occurrences) FROM notifications d
+                WHERE d.status = 'unread' AND d.user_id = notifications.user_id
+                  AND d.category = notifications.category AND d.period_key = notifications.period_key),
+            created_at = (
+                SELECT MIN(d.created_at) FROM notifications d
+                WHERE d.status = 'unread' AND d.user_id = notifications.user_id
+                  AND d.category = notifications.category AND d.period_key = notifications.period_key)
+        WHERE status = 'unread' AND category IS NOT NULL AND id IN (
+            SELECT MAX(id) FROM notifications
+            WHERE status = 'unread' AND category IS NOT NULL
+            GROUP BY user_id, category, period_key)
+    ''')
+    cursor.execute('''
+        DELETE FROM notifications
+        WHERE status = 'unread' AND category IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM notifications
+            WHERE status = 'unread' AND category IS NOT NULL
+            GROUP BY user_id, category, period_key)
+    ''')
+
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_live_alert
+        ON notifications (user_id, category, period_key) WHERE status = 'unread'
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_notifications_status_created')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_status_seen
+        ON notifications (user_id, status, last_seen_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_status_seen
+        ON notifications (status, last_seen_at)
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications_archive (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            category TEXT,
+            period_key TEXT,
+            message TEXT NOT NULL,
+            status TEXT,
+            occurrences INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP,
+            last_seen_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _category_overrides(cursor):
+    """Per-user merchant -> category mappings learned when expenses are recategorized"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_overrides (
+            user_id TEXT NOT NULL,
+            merchant TEXT NOT NULL,
+            category TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, merchant)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _rollup_summary_index(cursor):
+    """Read one period's rollups per user without scanning the daily rows"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_budget_rollups_user_period
+        ON budget_rollups (user_id, period, category, total, count)
+    ''')
+
+
+def _data_versions(cursor):
+    """A per-user counter bumped by every expense write, for dashboard ETags"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+
+def _chat_sessions(cursor):
+    """Chat histories shared by worker processes (chat_history.SQLiteChatHistory)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            user_id TEXT PRIMARY KEY,
+            messages TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            tokens INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_used
+        ON chat_sessions (last_used)
+    ''')
+
+# (version, description, function) - append only, never renumber
+MIGRATIONS = [
+    (1, "baseline tables", _baseline_tables),
+    (2, "user-scoped expenses and budgets", _reconcile_user_scope),
+    (3, "query indexes", _query_indexes),
+    (4, "budget rollups by day, month and year", _budget_rollups),
+    (5, "coalesced notifications and archive", _coalesced_notifications),
+    (6, "learned category overrides", _category_overrides),
+    (7, "rollup summary index", _rollup_summary_index),
+    (8, "per-user data versions", _data_versions),
+    (9, "shared chat sessions", _chat_sessions),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations on conn and return the list of versions applied.
+
+    conn must not be inside a transaction; each migration gets its own.
+    """
+    applied = []
+    for version, _description, upgrade in MIGRATIONS:
+        if version > target:
+            break
+        # Re-check under the write lock so concurrent workers don't race
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            upgrade(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    if applied:
+        # Refresh planner statistics so the new indexes get picked up
+        conn.execute('ANALYZE')
+    return applied
+
+
+def optimize(conn, all_tables=False):
+    """Refresh planner statistics for tables that have changed a lot since
+    they were last analyzed (cheap when nothing has)
+
+    all_tables checks every table rather than those this connection has
+    queried, which suits a connection that has only just been opened
+    (SQLite 3.46+; older versions ignore the flag).
+    """
+    conn.execute('PRAGMA optimize=0x10002' if all_tables else 'PRAGMA optimize')
@@ -0,0 +1,286 @@
+"""Expense storage backends used by the Flask routes.
+
+SQLiteExpenseStore keeps expenses in database.db, scoped by user_id, so
+they survive restarts and every worker process sees the same data.
+InMemoryExpenseStore keeps the old per-process dict behaviour for tests
+and quick demos, holding each user's expenses as compact typed columns
+(columnar.py). Pick one with EXPENSE_STORE=sqlite|memory.
+
+Expenses are plain dicts: {"id", "amount", "category", "description", "date"}.
+The id is stable for the life of the expense, so edits and deletes address
+it instead of a position that shifts under concurrent writes. SQLite ids are
+unique across users; in-memory ones only within a user's expenses.
+"""
+import os
+import threading
+import uuid
+
+import database
+from aggregates import ExpenseSummary
+from categories import merchant_key
+from columnar import ExpenseColumns, StringPool
+
+
+class ExpenseStore:
+    """Interface shared by the storage backends"""
+
+    def add_expense(self, user_id, amount, category, description, date):
+        """Store one expense and return its id"""
+        raise NotImplementedError
+
+    def add_expenses(self, user_id, expenses):
+        """Add many expense dicts at once; returns how many were stored"""
+        count = 0
+        for expense in expenses:
+            self.add_expense(user_id, float(expense['amount']), expense.get('category') or 'other',
+                             expense.get('description', ''), expense.get('date'))
+            count += 1
+        return count
+
+    def list_expenses(self, user_id):
+        """All of a user's expenses, oldest first"""
+        raise NotImplementedError
+
+    def list_expenses_page(self, user_id, after=None, limit=50):
+        """(expenses, next_after) for one page of the user's expenses,
+        newest first: by date, then id, both descending
+
+        after is the next_after of the previous page (None for the first); it
+        is a list of JSON-safe values so callers can hand it to a client.
+        next_after is None on the last page.
+        """
+        raise NotImplementedError
+
+    def data_version(self, user_id):
+        """A value that changes whenever the user's expenses change"""
+        raise NotImplementedError
+
+    def delete_expenses(self, user_id, expense_ids):
+        """Delete the user's expenses among expense_ids, all or nothing;
+        returns the ids that were deleted"""
+        raise NotImplementedError
+
+    def delete_expense(self, user_id, expense_id):
+        return bool(self.delete_expenses(user_id, [expense_id]))
+
+    def has_expenses(self, user_id):
+        return bool(self.list_expenses(user_id))
+
+    def recategorize_expenses(self, user_id, expense_ids, category):
+        """Move the user's expenses among expense_ids to category, all or
+        nothing, and learn their merchants; returns the ids that were found"""
+        raise NotImplementedError
+
+    def recategorize_expense(self, user_id, expense_id, category):
+        return bool(self.recategorize_expenses(user_id, [expense_id], category))
+
+    def category_overrides(self, user_id):
+        """The user's learned {merchant: category} mappings, for categories.categorize"""
+        raise NotImplementedError
+
+    def summary(self, user_id):
+        """An aggregates.ExpenseSummary of the user's expenses, without loading them"""
+        raise NotImplementedError
+
+    def expense_frame(self, user_id):
+        """The user's expenses as a pandas DataFrame with typed columns:
+        amount (float), date (datetime), category (categorical), description"""
+        import pandas as pd
+
+        df = pd.DataFrame(self.list_expenses(user_id), columns=['id', 'amount', 'date', 'category', 'description'])
+        df['amount'] = df['amount'].astype(float)
+        df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+        df['category'] = df['category'].astype('category')
+        return df
+
+
+class InMemoryExpenseStore(ExpenseStore):
+    """Per-process store; data is lost on restart"""
+
+    def __init__(self):
+        # user_id -> ExpenseColumns, all sharing one pool of descriptions
+        self._expenses = {}
+        self._descriptions = StringPool()
+        self._overrides = {}
+        self._summaries = {}
+        self._versions = {}
+        # Versions restart at 0 with the process; the epoch keeps them distinct
+        self._epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    def add_expense(self, user_id, amount, category, description, date):
+        date = database.expense_date(date)
+        with self._lock:
+            expense_id = self._columns(user_id).append(amount, category, description, date)
+            self._summary(user_id).add(amount, category, date)
+            self._changed(user_id)
+        return expense_id
+
+    def _columns(self, user_id):
+        columns = self._expenses.get(user_id)
+        if columns is None:
+            columns = self._expenses[user_id] = ExpenseColumns(self._descriptions)
+        return columns
+
+    def _changed(self, user_id):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def _summary(self, user_id):
+        summary = self._summaries.get(user_id)
+        if summary is None:
+            summary = self._summaries[user_id] = ExpenseSummary.tracking()
+        return summary
+
+    def list_expenses(self, user_id):
+        with self._lock:
+            columns = self._expenses.get(user_id)
+            return columns.rows() if columns else []
+
+    def list_expenses_page(self, user_id, after=None, limit=50):
+        # after is [date, id] of the last expense shown
+        with self._lock:
+            columns = self._expenses.get(user_id)
+            page = columns.newest(before=after, limit=limit + 1) if columns else []
+        if len(page) <= limit:
+            return page, None
+        del page[limit:]
+        return page, [page[-1]['date'], page[-1]['id']]
+
+    def data_version(self, user_id):
+        with self._lock:
+            return f"{self._epoch}.{self._versions.get(user_id, 0)}"
+
+    def delete_expenses(self, user_id, expense_ids):
+        deleted = []
+        with self._lock:
+            columns = self._expenses.get(user_id)
+            if not columns:
+                return deleted
+            summary = self._summary(user_id)
+            for expense_id in dict.fromkeys(expense_ids):
+                expense = columns.delete(expense_id)
+                if expense:
+                    summary.remove(expense['amount'], expense['category'], expense['date'])
+                    deleted.append(expense_id)
+            if deleted:
+                self._changed(user_id)
+        return deleted
+
+    def has_expenses(self, user_id):
+        return bool(self._expenses.get(user_id))
+
+    def recategorize_expenses(self, user_id, expense_ids, category):
+        found = []
+        with self._lock:
+            columns = self._expenses.get(user_id)
+            if not columns:
+                return found
+            summary = self._summary(user_id)
+            changed = False
+            for expense_id in dict.fromkeys(expense_ids):
+                expense = columns.get(expense_id)
+                if expense is None:
+                    continue
+                found.append(expense_id)
+                if expense['category'] != category:
+                    # First: it raises, before anything changed, if category cannot be added
+                    columns.set_category(expense_id, category)
+                    summary.move(expense['amount'], expense['category'], category)
+                    changed = True
+                merchant = merchant_key(expense['description'])
+                if merchant:
+                    self._overrides.setdefault(user_id, {})[merchant] = category
+            if changed:
+                self._changed(user_id)
+        return found
+
+    def category_overrides(self, user_id):
+        with self._lock:
+            return dict(self._overrides.get(user_id, {}))
+
+    def summary(self, user_id):
+        with self._lock:
+            return self._summary(user_id).copy()
+
+    def expense_frame(self, user_id):
+        with self._lock:
+            columns = self._expenses.get(user_id)
+            if columns:
+                # Copy the shared amount column: later writes shift it in place
+                return columns.to_frame().copy()
+        return super().expense_frame(user_id)
+
+
+class SQLiteExpenseStore(ExpenseStore):
+    """Store backed by the expenses table through database.py"""
+
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_schema(self):
+        # Workers started by a WSGI server never run app.py's __main__ block
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    database.init_db()
+                    self._ready = True
+
+    def add_expense(self, user_id, amount, category, description, date):
+        self._ensure_schema()
+        return database.add_expense(amount, description, category, user_id=user_id, date=date)
+
+    def add_expenses(self, user_id, expenses):
+        self._ensure_schema()
+        return database.add_expenses_bulk(expenses, user_id=user_id)
+
+    def list_expenses(self, user_id):
+        self._ensure_schema()
+        return database.get_expenses(user_id)
+
+    def list_expenses_page(self, user_id, after=None, limit=50):
+        # after is [date, id] of the last expense shown
+        self._ensure_schema()
+        page = database.get_expenses_page(user_id, after=after, limit=limit + 1)
+        if len(page) <= limit:
+            return page, None
+        del page[limit:]
+        return page, [page[-1]['date'], page[-1]['id']]
+
+    def data_version(self, user_id):
+        self._ensure_schema()
+        return database.get_data_version(user_id)
+
+    def delete_expenses(self, user_id, expense_ids):
+        self._ensure_schema()
+        return database.delete_expenses(expense_ids, user_id)
+
+    def has_expenses(self, user_id):
+        self._ensure_schema()
+        return database.has_expenses(user_id)
+
+    def recategorize_expenses(self, user_id, expense_ids, category):
+        self._ensure_schema()
+        return database.recategorize_expenses(expense_ids, category, user_id)
+
+    def category_overrides(self, user_id):
+        self._ensure_schema()
+        return database.get_category_overrides(user_id)
+
+    def summary(self, user_id):
+        self._ensure_schema()
+        return database.get_expense_summary(user_id)
+
+
+STORES = {
+    "sqlite": SQLiteExpenseStore,
+    "memory": InMemoryExpenseStore,
+}
+
+
+def create_store(kind=None):
+    kind = kind or os.getenv("EXPENSE_STORE", "sqlite")
+    try:
+        return STORES[kind]()
+    except KeyError:
+        raise ValueError(f"Unknown EXPENSE_STORE '{kind}', expected one of {', '.join(STORES)}")
@@ -0,0 +1,213 @@
+"""Write-behind queue: take database writes off the request thread.
+
+Callers submit small write operations; a single background thread drains
+them and applies many at once inside one transaction (group commit), so a
+burst of requests shares one commit instead of paying one each.
+
+    queue = WriteBehindQueue(db_pool.transaction, max_delay=0.05)
+    queue.submit(user_id, insert_fn, args)   # returns immediately
+    queue.wait_for_user(user_id)             # read-your-writes before a read
+    queue.close()                            # flush and stop (also at exit)
+
+max_delay is the durability window: an accepted write reaches the database
+at most that many seconds later, unless the process dies first. A write that
+fails is logged and counted against its user; the next wait_for_user() for
+that user (or flush()) raises WriteBehindError, so a read never silently
+misses a write the caller was told had been accepted.
+
+Read-your-writes only holds within the process that queued the write:
+another process reading the same user sees it once it is committed, up to
+max_delay later. database.py therefore refuses WRITE_BEHIND=1 with more
+than one worker process (WEB_CONCURRENCY).
+"""
+import atexit
+import queue
+import threading
+import time
+
+import logs
+
+log = logs.get_logger("write_behind")
+_FLUSH = object()
+_STOP = object()
+
+
+class WriteBehindError(RuntimeError):
+    """Queued writes failed after submit() had accepted them"""
+
+    def __init__(self, failures):
+        # user_id -> (number of failed writes, the last error)
+        self.failures = failures
+        count = sum(n for n, _ in failures.values())
+        last = list(failures.values())[-1][1]
+        super().__init__(f"{count} queued write(s) failed, last with {type(last).__name__}: {last}")
+
+
+class WriteBehindQueue:
+    def __init__(self, transaction, max_queue=10000, batch_size=200, max_delay=0.05):
+        self._transaction = transaction
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        # user_id -> (failed writes not yet reported, last error)
+        self._failed = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.batches = 0
+        self.applied = 0
+        self.errors = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, operation, args=(), after_commit=None):
+        """Queue operation(cursor, *args); blocks only when the queue is full"""
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        with self._cond:
+            self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        self._queue.put((user_id, operation, args, after_commit))
+
+    def pending(self, user_id=None):
+        with self._cond:
+            if user_id is None:
+                return sum(self._pending.values())
+            return self._pending.get(user_id, 0)
+
+    def wait_for_user(self, user_id, timeout=None):
+        """Block until every write submitted for user_id has been committed;
+        raises WriteBehindError if any of them failed"""
+        done = True
+        if self._pending.get(user_id):
+            self._queue.put(_FLUSH)
+            with self._cond:
+                done = self._cond.wait_for(lambda: not self._pending.get(user_id), timeout)
+        self._raise_failures(user_id)
+        return done
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far has been committed;
+        raises WriteBehindError if any of it failed"""
+        done = True
+        if self._pending:
+            self._queue.put(_FLUSH)
+            with self._cond:
+                done = self._cond.wait_for(lambda: not self._pending, timeout)
+        self._raise_failures()
+        return done
+
+    def _raise_failures(self, user_id=None):
+        # Each failure is reported once, to the first caller that waits for it
+        with self._cond:
+            if user_id is None:
+                failures, self._failed = self._failed, {}
+            elif user_id in self._failed:
+                failures = {user_id: self._failed.pop(user_id)}
+            else:
+                return
+        if failures:
+            raise WriteBehindError(failures)
+
+    def close(self, timeout=10):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "pending": self.pending(),
+            "batches": self.batches,
+            "applied": self.applied,
+            "errors": self.errors,
+        }
+
+    def _collect(self, first):
+        """Gather a batch starting with first; returns (batch, stop)"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            if item is _FLUSH:
+                break
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            if item is _FLUSH:
+                continue
+            batch, stop = self._collect(item)
+            self._apply(batch)
+
+        # Drain anything submitted before close()
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FLUSH and item is not _STOP:
+                leftovers.append(item)
+        for start in range(0, len(leftovers), self.batch_size):
+            self._apply(leftovers[start:start + self.batch_size])
+
+    def _apply(self, batch):
+        try:
+            try:
+                self._commit(batch)
+                committed = batch
+            except Exception:
+                # One bad write must not take the rest of the batch with it
+                committed = []
+                for item in batch:
+                    try:
+                        self._commit([item])
+                        committed.append(item)
+                    except Exception as e:
+                        self.errors += 1
+                        self.last_error = e
+                        with self._cond:
+                            count, _ = self._failed.get(item[0], (0, None))
+                            self._failed[item[0]] = (count + 1, e)
+                        log.exception("write_behind.dropped", user_id=item[0])
+            for user_id, _, _, after_commit in committed:
+                if after_commit:
+                    try:
+                        after_commit()
+                    except Exception:
+                        log.exception("write_behind.after_commit_failed", user_id=user_id)
+        finally:
+            with self._cond:
+                for user_id, _, _, _ in batch:
+                    remaining = self._pending.get(user_id, 0) - 1
+                    if remaining > 0:
+                        self._pending[user_id] = remaining
+                    else:
+                        self._pending.pop(user_id, None)
+                self._cond.notify_all()
+
+    def _commit(self, batch):
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            for _, operation, args, _ in batch:
+                operation(cursor, *args)
+        self.batches += 1
+        self.applied += len(batch)
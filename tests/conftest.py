@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live in src/ and import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+# A fixed key, so app does not make a random one (subprocesses inherit it too)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Point the shared connection pool at a fresh, initialized database"""
+    import db_pool
+    import database
+    import analytics
+
+    db_pool.configure(str(tmp_path / "test.db"))
+    database.budget_cache.clear()
+    database.override_cache.clear()
+    analytics.analysis_cache.clear()
+    database.init_db()
+    yield database
+    db_pool.get_pool().close()
@@ -0,0 +1,63 @@
+import sys
+
+import pytest
+
+import storage
+from aggregates import ExpenseSummary
+
+
+def test_tracking_summary_follows_adds_deletes_and_moves():
+    summary = ExpenseSummary.tracking()
+    summary.add(10, "food", "2024-01-01")
+    summary.add(30, "rent", "2024-03-01 09:00:00")
+    summary.add(5, "food", "2024-02-01")
+
+    assert (summary.total, summary.count) == (45, 3)
+    assert (summary.first_date, summary.last_date) == ("2024-01-01", "2024-03-01")
+    assert summary.top_categories(1) == [{"category": "rent", "amount": 30}]
+
+    summary.remove(30, "rent", "2024-03-01 09:00:00")
+    assert "rent" not in summary.totals
+    assert summary.last_date == "2024-02-01"
+
+    summary.move(5, "food", "fun")
+    assert summary.chart_data() == (["food", "fun"], [10, 5])
+
+
+def test_monthly_average():
+    summary = ExpenseSummary({"food": 300}, {"food": 3}, "2024-01-01", "2024-03-31")
+    assert summary.monthly_average() == pytest.approx(300 / (90 / 30))
+    assert ExpenseSummary({"food": 50}, {"food": 1}, "2024-01-01", "2024-01-02").monthly_average() == 50
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_store_summaries_match_the_expenses(db, kind):
+    store = storage.create_store(kind)
+    rent, _, transport, _ = [store.add_expense("alice", amount, category, "item", day) for amount, category, day in
+                             [(800, "housing", "2024-01-01"), (12, "food", "2024-01-05"),
+                              (40, "transport", "2024-02-10"), (8, "food", "2024-03-02")]]
+    assert store.delete_expense("alice", rent)
+    assert store.recategorize_expense("alice", transport, "food")
+
+    summary = store.summary("alice")
+    expenses = store.list_expenses("alice")
+    assert summary.count == len(expenses) == 3
+    assert summary.totals == pytest.approx({"food": 60})
+    assert (summary.first_date, summary.last_date) == ("2024-01-05", "2024-03-02")
+    assert store.summary("bob").count == 0
+
+
+def test_dashboard_renders_without_pandas(db, monkeypatch):
+    import app
+
+    # None in sys.modules makes any import of pandas raise ImportError
+    monkeypatch.setitem(sys.modules, "pandas", None)
+    monkeypatch.setattr(app, "expense_store", storage.create_store("memory"))
+    app.expense_store.add_expense("dave", 25, "food", "groceries", "2024-04-01")
+    app.expense_store.add_expense("dave", 75, "shopping", "shoes", "2024-04-03")
+
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "dave"
+    page = client.get("/dashboard").get_data(as_text=True)
+    assert "$100.0" in page and "Shopping" in page
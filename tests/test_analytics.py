@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+import analytics
+import storage
+
+
+def frame(rows):
+    df = pd.DataFrame(rows, columns=["amount", "date", "category"])
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def test_monthly_table_fills_gaps_and_rolls():
+    analysis = analytics.analyze(frame([
+        (10, "2024-01-03", "food"), (20, "2024-01-20", "food"), (60, "2024-01-05", "rent"),
+        (40, "2024-03-02", "food"),
+    ]))
+
+    assert analysis.months == ["2024-01", "2024-02", "2024-03"]
+    assert analysis.monthly["food"].tolist() == [30, 0, 40]
+    assert analysis.rolling_3["food"].tolist() == pytest.approx([30, 15, 70 / 3])
+    assert analysis.deltas["rent"].tolist()[1:] == [-60, 0]
+    assert analysis.monthly_average() == pytest.approx(130 / 3)
+    assert analysis.latest() == [
+        {"category": "food", "amount": 40, "avg_3": 23.33, "avg_12": 23.33, "delta": 40},
+        {"category": "rent", "amount": 0, "avg_3": 20, "avg_12": 20, "delta": 0},
+    ]
+
+
+def test_spikes_are_flagged_against_the_previous_months():
+    rows = [(100 + (i % 3), f"2023-{i:02d}-10", "food") for i in range(1, 13)]
+    rows += [(50, f"2023-{i:02d}-12", "fun") for i in range(1, 13)]     # flat: never scored
+    rows += [(400, "2024-01-10", "food"), (50, "2024-01-12", "fun")]
+    analysis = analytics.analyze(frame(rows))
+
+    [anomaly] = analysis.anomalies()
+    assert (anomaly["month"], anomaly["category"], anomaly["amount"]) == ("2024-01", "food", 400)
+    assert anomaly["baseline"] == pytest.approx(101)
+    assert analysis.zscores["fun"].isna().all()
+    # Fewer than MIN_HISTORY months before it: no score yet
+    assert analysis.zscores["food"].iloc[:analytics.MIN_HISTORY].isna().all()
+    assert "2024-01 food: $400.00 vs usual $101.00" in analysis.prompt()
+
+
+def test_empty_history():
+    analysis = analytics.analyze(frame([]))
+    assert analysis.as_dict()["months"] == [] and analysis.anomalies() == []
+    assert analysis.monthly_average() == 0
+
+
+def test_analysis_is_cached_per_data_version(db):
+    store = storage.create_store("sqlite")
+    store.add_expense("alice", 10, "food", "lunch", "2024-01-01")
+    first = analytics.user_analysis(store, "alice")
+    assert analytics.user_analysis(store, "alice") is first
+
+    store.add_expense("alice", 5, "food", "coffee", "2024-02-01")
+    second = analytics.user_analysis(store, "alice")
+    assert second is not first and second.months == ["2024-01", "2024-02"]
+
+
+def test_dashboard_and_analysis_share_the_figures(db, monkeypatch):
+    import app
+
+    prompts = []
+
+    class FakeModel:
+        def generate_content(self, parts):
+            prompts.append(parts[1])
+            return type("Response", (), {"text": "ok"})()
+
+    monkeypatch.setattr(app, "model", FakeModel())
+    monkeypatch.setattr(app, "expense_store", storage.create_store("memory"))
+    for amount, day in [(30, "2024-01-04"), (20, "2024-02-09"), (90, "2024-03-15")]:
+        app.expense_store.add_expense("erin", amount, "food", "groceries", day)
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "erin"
+
+    response = client.get("/api/analytics")
+    trends = response.get_json()
+    assert trends["totals"] == [30, 20, 90] and trends["latest"][0]["delta"] == 70
+    assert client.get("/api/analytics", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    client.post("/analyze_expenses")
+    assert "Latest month (2024-03): $90.00 (+$70.00 vs previous month)" in prompts[0]
+    assert "- food: $90.00 / $46.67 / $46.67 / +$70.00" in prompts[0]
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+
+import db_pool
+
+
+def _rollups(user_id="default_user"):
+    with db_pool.connection() as conn:
+        return conn.execute('''
+            SELECT category, period, period_key, total, count FROM budget_rollups
+            WHERE user_id = ? ORDER BY category, period, period_key
+        ''', (user_id,)).fetchall()
+
+
+def test_add_expense_updates_every_period(db):
+    db.add_expense(12.5, "lunch", "food", date="2024-03-05 12:00:00")
+    db.add_expense(7.5, "coffee", "food", date="2024-03-20 08:00:00")
+
+    assert _rollups() == [
+        ("food", "day", "2024-03-05", 12.5, 1),
+        ("food", "day", "2024-03-20", 7.5, 1),
+        ("food", "month", "2024-03", 20.0, 2),
+        ("food", "year", "2024", 20.0, 2),
+    ]
+    assert db.get_period_spending("food", "month", key="2024-03") == 20.0
+    assert db.get_period_spending("food", "month", key="2024-04") == 0
+
+
+def test_bulk_and_single_paths_agree(db):
+    db.add_expenses_bulk([
+        {"amount": 10, "description": "a", "category": "food", "date": "2024-01-01"},
+        {"amount": 15, "description": "b", "category": "food", "date": "2024-01-02"},
+    ], user_id="bulk")
+    db.add_expense(10, "a", "food", user_id="single", date="2024-01-01")
+    db.add_expense(15, "b", "food", user_id="single", date="2024-01-02")
+
+    assert _rollups("bulk") == _rollups("single")
+
+
+def test_delete_expense_reverses_rollups(db):
+    keep = db.add_expense(5, "snack", "food", date="2024-06-01 10:00:00")
+    gone = db.add_expense(20, "dinner", "food", date="2024-06-02 19:00:00")
+
+    assert db.delete_expense(gone)
+    assert not db.delete_expense(gone)
+    assert _rollups() == [
+        ("food", "day", "2024-06-01", 5.0, 1),
+        ("food", "month", "2024-06", 5.0, 1),
+        ("food", "year", "2024", 5.0, 1),
+    ]
+    assert db.get_budget_insights("food")["spent_amount"] == 5
+    assert keep
+
+
+def test_insights_for_current_month(db):
+    db.add_expense(300, "old rent", "housing", date="2000-01-01 00:00:00")
+    db.add_expense(40, "electric", "housing")
+
+    month = db.get_budget_insights("housing", period="month")
+    assert month["period"] == "month"
+    assert month["spent_amount"] == 40
+    assert db.get_budget_insights("housing")["spent_amount"] == 340
+
+
+def test_migration_backfills_existing_expenses(tmp_path):
+    import sqlite3
+    import migrations
+
+    conn = sqlite3.connect(str(tmp_path / "backfill.db"))
+    migrations.migrate(conn, target=3)
+    conn.executemany("INSERT INTO expenses (user_id, amount, description, category, date) VALUES (?, ?, ?, ?, ?)",
+                     [("u", 1, "x", "food", "2024-02-01 09:00:00"), ("u", 2, "y", "food", "2024-02-03 09:00:00")])
+    conn.commit()
+    migrations.migrate(conn)
+
+    assert conn.execute('''
+        SELECT total, count FROM budget_rollups WHERE period = 'month' AND period_key = '2024-02'
+    ''').fetchone() == (3.0, 2)
+
+
+def test_dates_are_checked_and_local(db):
+    db.add_expense(8, "form", "food", date="2024-02-29")
+    db.add_expense(4, "chat", "food", date=datetime(2024, 3, 1, 9, 30))
+    db.add_expense(2, "today", "food", date="")
+    with pytest.raises(ValueError):
+        db.add_expense(1, "typo", "food", date="2024-02-30")
+    with pytest.raises(ValueError):
+        db.add_expenses_bulk([{"amount": 1, "description": "x", "category": "food", "date": "soon"}])
+
+    dates = [e["date"] for e in db.get_expenses()]
+    assert dates[:2] == ["2024-02-29", "2024-03-01 09:30:00"]
+    assert dates[2][:7] == datetime.now().strftime("%Y-%m")
+    assert db.get_budget_insights("food", period="month")["spent_amount"] == 2
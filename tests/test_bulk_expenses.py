@@ -0,0 +1,50 @@
+import pytest
+
+import db_pool
+
+
+def _scalar(sql, *args):
+    with db_pool.connection() as conn:
+        return conn.execute(sql, args).fetchone()[0]
+
+
+def test_bulk_insert_updates_budget_once_per_category(db):
+    count = db.add_expenses_bulk([
+        {"amount": 10, "description": "coffee", "category": "food"},
+        {"amount": 20.5, "description": "lunch", "category": "food"},
+        (30, "bus pass", "transport"),
+    ])
+
+    assert count == 3
+    assert _scalar("SELECT COUNT(*) FROM expenses") == 3
+    assert db.get_budget_insights("food")["spent_amount"] == 30.5
+    assert db.get_budget_insights("transport")["spent_amount"] == 30
+
+
+def test_bulk_insert_creates_default_budget(db):
+    db.add_expenses_bulk([{"amount": 5, "description": "pens", "category": "office"}])
+    insights = db.get_budget_insights("office")
+    assert insights["limit_amount"] == 300
+    assert insights["spent_amount"] == 5
+
+
+def test_bulk_insert_emits_one_alert_per_category(db):
+    db.add_expenses_bulk([{"amount": 150, "description": "concert", "category": "entertainment"}] * 4)
+    assert _scalar("SELECT COUNT(*) FROM notifications") == 1
+
+
+def test_bulk_alert_is_for_the_month_of_the_latest_expense(db):
+    db.add_expenses_bulk([
+        {"amount": 150, "description": "concert", "category": "entertainment", "date": "2023-02-10"},
+        {"amount": 150, "description": "festival", "category": "entertainment", "date": "2023-03-05"},
+    ])
+    assert _scalar("SELECT period_key FROM notifications") == "2023-03"
+
+
+def test_bulk_insert_is_all_or_nothing(db):
+    with pytest.raises(ValueError):
+        db.add_expenses_bulk([
+            {"amount": 10, "description": "ok", "category": "food"},
+            {"amount": "not a number", "description": "bad", "category": "food"},
+        ])
+    assert _scalar("SELECT COUNT(*) FROM expenses") == 0
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+
+import db_pool
+from cache import LRUCache
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_and_counters():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1      # "a" is now most recently used
+    cache.set("c", 3)               # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.set("k", "v")
+    clock.now = 9
+    assert cache.get("k") == "v"
+    clock.now = 11
+    assert cache.get("k") is None
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    cache = LRUCache()
+
+    def loader():
+        cache.invalidate("k")  # a writer commits while we are reading
+        return "stale"
+
+    assert cache.get_or_load("k", loader) == "stale"
+    assert cache.get("k") is None
+
+
+def test_budget_insights_served_from_cache(db):
+    db.get_budget_insights("food")
+    db.get_budget_insights("food")
+
+    assert db.budget_cache.stats()["hits"] >= 1
+
+
+def test_writes_invalidate_budget_insights(db):
+    assert db.get_budget_insights("food")["spent_amount"] == 0
+    assert db.get_budget_insights("food", period="month")["spent_amount"] == 0
+
+    db.add_expense(25, "lunch", "food")
+    assert db.get_budget_insights("food")["spent_amount"] == 25
+    assert db.get_budget_insights("food", period="month")["spent_amount"] == 25
+
+    db.add_expenses_bulk([{"amount": 5, "description": "tea", "category": "food"}])
+    assert db.get_budget_insights("food")["spent_amount"] == 30
+
+    db.set_budget("food", 40)
+    assert db.get_budget_insights("food")["limit_amount"] == 40
+
+    assert "message" in db.get_budget_insights("pets")
+    db.set_budget("pets", 60)
+    assert db.get_budget_insights("pets")["limit_amount"] == 60
+
+
+def test_cached_result_cannot_be_mutated_by_callers(db):
+    db.get_budget_insights("food")["spent_amount"] = 999
+    assert db.get_budget_insights("food")["spent_amount"] == 0
+
+
+def test_writes_from_another_process_are_seen_within_the_ttl(db, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(db, "budget_cache", LRUCache(ttl=5, clock=clock))
+    assert db.get_budget_insights("food", period="month")["spent_amount"] == 0
+    assert db.get_budget_insights("food")["limit_amount"] == 500
+
+    # Another worker, with its own budget_cache, records an expense and a new limit
+    script = ("import sys, db_pool, database; db_pool.configure(sys.argv[1]); "
+              "database.add_expense(25, 'lunch', 'food'); database.set_budget('food', 40)")
+    subprocess.run([sys.executable, "-c", script, db_pool.get_pool().path], cwd=SRC, check=True)
+
+    # Served from this process's cache until the entries expire
+    assert db.get_budget_insights("food", period="month")["spent_amount"] == 0
+    clock.now = 6
+    insights = db.get_budget_insights("food", period="month")
+    assert insights["spent_amount"] == 25
+    assert db.get_budget_insights("food")["limit_amount"] == 40
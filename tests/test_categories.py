@@ -0,0 +1,78 @@
+import pytest
+
+import storage
+from categories import CategoryIndex, categorize, merchant_key
+
+
+@pytest.mark.parametrize("description, category", [
+    ("gas bill", "housing"),                 # longest phrase beats "gas"
+    ("shell gas station", "transport"),
+    ("credit card payment", "other"),        # "car" no longer matches inside "card"
+    ("carpet cleaning", "other"),
+    ("Concert tickets", "entertainment"),    # plural of "ticket"
+    ("movies with friends", "entertainment"),
+    ("UBER *TRIP 8812", "transport"),
+])
+def test_whole_word_longest_match(description, category):
+    assert categorize(description) == category
+
+
+def test_earliest_match_breaks_ties():
+    index = CategoryIndex({"coffee": "food", "train": "transport"})
+    assert index.classify("coffee on the train") == "food"
+    assert index.classify("train coffee") == "transport"
+
+
+def test_overrides_take_precedence():
+    assert merchant_key("STARBUCKS #1234, Main St.") == "starbucks main st"
+    assert categorize("Starbucks #1234, main st", {"starbucks main st": "coffee"}) == "coffee"
+    assert categorize("Starbucks", {"starbucks main st": "coffee"}) == "other"
+    # The longest learned merchant the description starts with wins
+    overrides = {"trader joe's": "food", "trader": "shopping"}
+    assert categorize("TRADER JOE'S #108 NEW YORK", overrides) == "food"
+    assert categorize("Trader Vic's", overrides) == "shopping"
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_recategorizing_learns_the_merchant(db, kind):
+    store = storage.create_store(kind)
+    expense_id = store.add_expense("alice", 30, "other", "Trader Joe's #552", "2024-03-01")
+
+    assert store.recategorize_expense("alice", expense_id, "food")
+    assert not store.recategorize_expense("alice", expense_id + 1, "food")
+    assert not store.recategorize_expense("bob", expense_id, "food")
+    assert store.list_expenses("alice")[0]["category"] == "food"
+    assert categorize("TRADER JOE'S #108", store.category_overrides("alice")) == "food"
+    assert store.category_overrides("bob") == {}
+
+
+def test_recategorize_moves_budget_and_rollups(db):
+    expense_id = db.add_expense(40, "zelle to landlord", "other", user_id="alice", date="2024-03-05 10:00:00")
+    assert db.recategorize_expense(expense_id, "housing", user_id="alice")
+
+    assert db.get_budget_insights("other", user_id="alice")["spent_amount"] == 0
+    assert db.get_budget_insights("housing", user_id="alice")["spent_amount"] == 40
+    assert db.get_period_spending("housing", "month", user_id="alice", key="2024-03") == 40
+    assert db.get_period_spending("other", "month", user_id="alice", key="2024-03") == 0
+    assert not db.recategorize_expense(expense_id, "food", user_id="bob")
+
+
+def test_routes_use_learned_categories(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "expense_store", storage.create_store("sqlite"))
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "carol"
+
+    client.post("/add_expense", data={"amount": "9", "category": "auto", "description": "Blue Bottle",
+                                      "date": "2024-05-01"})
+    assert db.get_expenses("carol")[0]["category"] == "other"
+
+    expense_id = db.get_expenses("carol")[0]["id"]
+    response = client.post(f"/recategorize_expense/{expense_id}", json={"category": "Food"})
+    assert response.get_json() == {"updated": True, "category": "food"}
+
+    client.post("/chat", json={"message": "Spent $6 on blue bottle"})
+    client.post("/add_expenses", json=[{"amount": 4, "description": "BLUE BOTTLE"}])
+    assert [e["category"] for e in db.get_expenses("carol")] == ["food", "food", "food"]
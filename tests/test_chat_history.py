@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import db_pool
+from chat_history import ChatHistoryManager, SQLiteChatHistory, SUMMARY_HEADER, create_chat_histories
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _exchange(manager, user_id, n):
+    manager.append(user_id, "user", f"Question number {n}. With some detail.")
+    manager.append(user_id, "model", f"Answer number {n}.")
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_history_is_capped_and_summarized(db, kind):
+    manager = create_chat_histories(kind, max_turns=4, max_tokens=10000)
+    for n in range(10):
+        _exchange(manager, "alice", n)
+
+    history = manager.history("alice")
+    assert history[0]["role"] == "user" and history[0]["parts"][0].startswith(SUMMARY_HEADER)
+    assert "Question number 5." in history[0]["parts"][0]
+    # summary exchange + the last two exchanges
+    assert [m["parts"][0] for m in history[2:]] == [
+        "Question number 8. With some detail.", "Answer number 8.",
+        "Question number 9. With some detail.", "Answer number 9."]
+    assert [m["role"] for m in history] == ["user", "model"] * 3
+
+
+def test_token_budget_trims_long_conversations():
+    manager = ChatHistoryManager(max_turns=100, max_tokens=50)
+    for n in range(20):
+        manager.append("bob", "user", "x" * 80)
+        manager.append("bob", "model", "y" * 80)
+
+    assert len(manager.history("bob")) <= 4
+    assert manager.stats()["summarized_messages"] == 38
+
+
+def test_summary_lines_are_bounded():
+    manager = ChatHistoryManager(max_turns=2, summary_lines=3)
+    for n in range(50):
+        _exchange(manager, "carol", n)
+    assert manager.history("carol")[0]["parts"][0].count("\n- ") == 3
+
+
+def test_lru_and_idle_eviction():
+    clock = FakeClock()
+    manager = ChatHistoryManager(max_sessions=2, idle_seconds=100, clock=clock)
+    manager.ensure("a")
+    manager.ensure("b")
+    manager.ensure("a")   # "b" is now least recently used
+    manager.ensure("c")
+    assert "b" not in manager and "a" in manager and "c" in manager
+
+    clock.now = 150
+    manager.ensure("d")
+    assert len(manager) == 1 and "d" in manager
+
+
+def test_prompt_size_metrics():
+    manager = ChatHistoryManager()
+    manager.record_prompt([{"parts": ["a" * 400]}])
+    manager.record_prompt([{"parts": ["a" * 40]}])
+
+    stats = manager.stats()
+    assert stats["prompts"] == 2
+    assert stats["prompt_tokens_max"] == 100
+    assert stats["prompt_tokens_last"] == 10
+    assert stats["prompt_tokens_avg"] == 55
+
+
+def test_sqlite_sessions_are_shared_across_processes(db):
+    manager = SQLiteChatHistory(max_turns=4)
+    _exchange(manager, "alice", 0)
+    # Another worker process, with its own connections, continues the conversation
+    script = ("import sys, db_pool, chat_history; db_pool.configure(sys.argv[1]); "
+              "m = chat_history.SQLiteChatHistory(max_turns=4); "
+              "[(m.append('alice', 'user', f'Question number {n}.'), m.append('alice', 'model', 'ok')) "
+              "for n in (1, 2)]")
+    subprocess.run([sys.executable, "-c", script, db_pool.get_pool().path], cwd=SRC, check=True)
+
+    history = manager.history("alice")
+    assert "Question number 0." in history[0]["parts"][0]
+    assert [m["parts"][0] for m in history[2:]] == ["Question number 1.", "ok", "Question number 2.", "ok"]
+    assert len(manager) == 1 and "alice" in manager and "bob" not in manager
+
+
+def test_sqlite_prunes_idle_and_surplus_sessions(db, monkeypatch):
+    monkeypatch.setattr(SQLiteChatHistory, "PRUNE_EVERY", 1)
+    clock = FakeClock()
+    manager = SQLiteChatHistory(max_sessions=2, idle_seconds=100, clock=clock)
+    for user_id in "abc":
+        clock.now += 1
+        manager.ensure(user_id)
+    assert len(manager) == 2 and "a" not in manager
+
+    clock.now = 150
+    assert "b" not in manager and manager.history("b") == []     # idle, before any prune
+    manager.ensure("d")
+    assert len(manager) == 1 and manager.stats()["evicted_sessions"] == 3
+    manager.reset("d")
+    assert len(manager) == 0
+
+
+def test_new_sessions_get_distinct_ids(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "chat_histories", ChatHistoryManager())
+    ids = set()
+    for _ in range(5):
+        client = app.app.test_client()
+        client.get("/")
+        with client.session_transaction() as sess:
+            ids.add(sess["user_id"])
+    assert len(ids) == 5 and set(app.chat_histories._sessions) == ids
+
+
+def test_sqlite_sessions_work_on_an_uninitialized_database(tmp_path, monkeypatch):
+    import app
+
+    db_pool.configure(str(tmp_path / "fresh.db"))
+    monkeypatch.setattr(app, "chat_histories", SQLiteChatHistory())
+    try:
+        client = app.app.test_client()
+        assert client.get("/").status_code == 200
+        with client.session_transaction() as sess:
+            assert sess["user_id"] in app.chat_histories
+    finally:
+        db_pool.get_pool().close()
+
+
+def test_waiting_for_the_write_lock_does_not_block_the_process(db):
+    manager = SQLiteChatHistory()
+    manager.ensure("alice")
+    # Another process is writing
+    other = sqlite3.connect(db_pool.get_pool().path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    writer = threading.Thread(target=manager.append, args=("alice", "user", "hello"))
+    writer.start()
+    try:
+        writer.join(0.2)
+        assert writer.is_alive()                      # waiting for the write lock
+        manager.record_prompt([{"role": "user", "parts": ["hi"]}])
+        assert manager.stats()["prompts"] == 1
+    finally:
+        other.rollback()
+        other.close()
+        writer.join(5)
+    assert manager.history("alice")[-1]["parts"] == ["hello"]
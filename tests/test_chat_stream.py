@@ -0,0 +1,125 @@
+import json
+import time
+
+import pytest
+
+import storage
+from chat_history import ChatHistoryManager
+from llm_cache import ResponseCache
+from llm_client import ResilientModel
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingModel:
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.calls = []
+
+    def _stream(self):
+        for i, text in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise RuntimeError("connection reset")
+            yield Chunk(text)
+
+    def generate_content(self, parts, stream=False):
+        self.calls.append(("generate", parts, stream))
+        return self._stream()
+
+    def start_chat(self, history):
+        model = self
+
+        class Convo:
+            def send_message(self, message, stream=False):
+                model.calls.append(("send", history, stream))
+                return model._stream()
+
+        return Convo()
+
+
+def read_events(response):
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if not block:
+            continue
+        name, data = block.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "expense_store", storage.create_store("memory"))
+    monkeypatch.setattr(app, "chat_histories", ChatHistoryManager())
+    monkeypatch.setattr(app, "response_cache", ResponseCache())
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "streamer"
+    return app, client
+
+
+def test_stream_sends_deltas_then_records_history(client, monkeypatch):
+    app, client = client
+    model = StreamingModel(["Track ", "every ", "expense."])
+    monkeypatch.setattr(app, "model", model)
+
+    response = client.post("/chat_stream", json={"message": "How do I start budgeting?"})
+    assert response.mimetype == "text/event-stream"
+    events = read_events(response)
+
+    assert [data["text"] for name, data in events if name == "delta"] == ["Track ", "every ", "expense."]
+    name, done = events[-1]
+    assert name == "done" and done["response"] == "Track every expense."
+    assert done["ttft_ms"] is not None
+    assert model.calls[0][2] is True
+    assert [m["parts"][0] for m in app.chat_histories.history("streamer")] == \
+        ["How do I start budgeting?", "Track every expense."]
+
+    # Follow-up turns stream through the chat session with the prior exchange
+    client.post("/chat_stream", json={"message": "And then?"})
+    assert model.calls[1][0] == "send" and len(model.calls[1][1]) == 2
+    assert client.get("/chat_metrics").get_json()["streams"] == 2
+
+
+def test_failed_stream_leaves_history_untouched(client, monkeypatch):
+    app, client = client
+    monkeypatch.setattr(app, "model", StreamingModel(["Partial ", "reply"], fail_after=1))
+
+    events = read_events(client.post("/chat_stream", json={"message": "Tell me about saving"}))
+    assert [name for name, _ in events] == ["delta", "error"]
+    assert app.chat_histories.history("streamer") == []
+
+
+def test_rule_based_commands_answer_in_one_event(client, monkeypatch):
+    app, client = client
+    model = StreamingModel(["unused"])
+    monkeypatch.setattr(app, "model", model)
+
+    [(name, data)] = read_events(client.post("/chat_stream", json={"message": "Add $12 for lunch"}))
+    assert name == "done" and "$12.00" in data["response"]
+    assert model.calls == []
+    assert len(app.expense_store.list_expenses("streamer")) == 1
+
+
+def test_stalled_stream_ends_with_an_error(client, monkeypatch):
+    app, client = client
+
+    class StallingModel(StreamingModel):
+        def _stream(self):
+            yield Chunk("Partial ")
+            time.sleep(1)
+            yield Chunk("too late")
+
+    model = ResilientModel(StallingModel([]), timeout=0.1, retries=0)
+    monkeypatch.setattr(app, "model", model)
+
+    events = read_events(client.post("/chat_stream", json={"message": "Tell me about saving"}))
+    assert [name for name, _ in events] == ["delta", "error"]
+    assert model.stats()["timeouts"] == 1 and model.breaker.failures == 1
+    assert app.chat_histories.history("streamer") == []
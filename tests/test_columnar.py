@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+import columnar
+import storage
+from columnar import ExpenseColumns, StringPool
+
+
+def test_rows_round_trip_through_the_columns():
+    columns = ExpenseColumns(capacity=2)
+    lunch = columns.append(12.5, "food", "lunch", "2024-03-01")
+    fuel = columns.append(40, "transport", "fuel", "2024-03-02 08:15:00")
+    columns.append(7, "food", "lunch", "2024-03-05")
+
+    assert len(columns) == 3
+    assert columns.get(fuel) == {"id": fuel, "amount": 40, "category": "transport", "description": "fuel",
+                                 "date": "2024-03-02"}
+    assert columns.delete(lunch)["date"] == "2024-03-01"
+    assert columns.delete(lunch) is None and columns.get(lunch) is None
+    assert columns.set_category(fuel, "other")
+    assert [(e["category"], e["amount"]) for e in columns.rows()] == [("other", 40), ("food", 7)]
+    assert [e["amount"] for e in columns.rows(after=fuel)] == [7]
+    with pytest.raises(ValueError):
+        columns.append(1, "food", "bad date", "March 3rd")
+
+
+def test_deleted_rows_are_compacted_away():
+    columns = ExpenseColumns()
+    ids = [columns.append(i, "food", "x", "2024-01-01") for i in range(100)]
+    for expense_id in ids[:90]:
+        columns.delete(expense_id)
+
+    assert len(columns) == 10
+    assert columns.nbytes <= (10 + 16) * 30 + 100 * 8      # at most 16 dead rows left
+    assert [e["id"] for e in columns.rows(after=ids[94], limit=3)] == ids[95:98]
+    assert columns.get(ids[99])["amount"] == 99
+    assert list(columns.arrays()["id"]) == ids[90:]
+
+
+def test_descriptions_are_pooled_across_users():
+    pool = StringPool()
+    alice, bob = ExpenseColumns(pool), ExpenseColumns(pool)
+    alice.append(3, "food", "coffee", "2024-01-01")
+    bob.append(4, "food", "coffee", "2024-01-02")
+    bob.append(5, "food", "tea", "2024-01-03")
+    assert len(pool) == 2
+
+
+def test_descriptions_nobody_uses_are_released():
+    pool = StringPool()
+    alice, bob = ExpenseColumns(pool), ExpenseColumns(pool)
+    coffee = alice.append(3, "food", "coffee", "2024-01-01")
+    bob.append(4, "food", "coffee", "2024-01-02")
+    tea = bob.append(5, "food", "tea", "2024-01-03")
+
+    alice.delete(coffee)
+    bob.delete(tea)
+    assert len(pool) == 1
+    # The freed index is reused for the next new description
+    juice = alice.append(6, "food", "juice", "2024-01-04")
+    assert len(pool) == 2 and len(pool._strings) == 2
+    assert alice.get(juice)["description"] == "juice"
+    assert [e["description"] for e in bob.rows()] == ["coffee"]
+
+
+def test_categories_are_bounded(monkeypatch):
+    monkeypatch.setattr(columnar, "MAX_CATEGORIES", 2)
+    columns = ExpenseColumns()
+    food = columns.append(1, "food", "a", "2024-01-01")
+    columns.append(2, "rent", "b", "2024-01-02")
+    with pytest.raises(ValueError):
+        columns.append(3, "travel", "c", "2024-01-03")
+    with pytest.raises(ValueError):
+        columns.set_category(food, "travel")
+    assert len(columns) == 2 and columns.get(food)["category"] == "food"
+    assert len(columns._pool) == 2
+
+
+def test_views_are_zero_copy_and_survive_growth():
+    columns = ExpenseColumns(capacity=2)
+    columns.append(1, "food", "a", "2024-01-01")
+    columns.append(2, "rent", "b", "2024-01-02")
+    views = columns.arrays()
+    # Full: the next append swaps in bigger arrays instead of resizing these
+    columns.append(3, "food", "c", "2024-01-03")
+
+    assert list(views["amount"]) == [1, 2]
+    assert not views["amount"].flags.writeable
+    assert views["date"].dtype == np.dtype("datetime64[D]")
+    assert np.shares_memory(columns.arrays()["amount"], columns.to_frame()["amount"].to_numpy())
+
+
+def test_frame_has_typed_columns():
+    columns = ExpenseColumns()
+    ids = [columns.append(amount, category, "x", day)
+           for amount, category, day in [(5, "rent", "2024-02-01"), (3, "food", "2024-01-01"), (4, "fun", "2024-01-15")]]
+    columns.set_category(ids[2], "food")                 # "fun" is no longer used
+
+    df = columns.to_frame()
+    assert str(df["date"].dtype).startswith("datetime64")
+    assert list(df["category"].cat.categories) == ["food", "rent"]
+    assert df.groupby("category", observed=True)["amount"].sum().to_dict() == {"food": 7, "rent": 5}
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_store_frames_agree(db, kind):
+    store = storage.create_store(kind)
+    store.add_expense("alice", 12.5, "food", "lunch", "2024-03-01")
+    store.add_expense("alice", 40, "transport", "fuel", "2024-03-02")
+
+    df = store.expense_frame("alice")
+    assert df["amount"].tolist() == [12.5, 40]
+    assert df["category"].dtype == "category"
+    assert df["date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-03-01", "2024-03-02"]
+    assert store.expense_frame("bob").empty
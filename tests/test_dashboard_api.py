@@ -0,0 +1,99 @@
+import pytest
+
+import storage
+
+DAYS = ["2024-03-04", "2024-01-09", "2024-02-01", "2024-01-09", "2024-05-30", "2024-02-14", "2024-04-01"]
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_pages_cover_list_expenses_newest_first(db, kind):
+    store = storage.create_store(kind)
+    for i, day in enumerate(DAYS):
+        store.add_expense("alice", i + 1, "food", f"item {i}", day)
+
+    seen, after = [], None
+    while True:
+        page, after = store.list_expenses_page("alice", after=after, limit=3)
+        seen.extend(page)
+        if after is None:
+            break
+
+    expected = sorted(store.list_expenses("alice"), key=lambda e: (e["date"], e["id"]), reverse=True)
+    assert [e["id"] for e in seen] == [e["id"] for e in expected]
+    assert [e["amount"] for e in seen] == [e["amount"] for e in expected]
+    assert store.list_expenses_page("bob") == ([], None)
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_data_version_follows_writes(db, kind):
+    store = storage.create_store(kind)
+    versions = [store.data_version("alice")]
+    lunch = store.add_expense("alice", 10, "food", "lunch", "2024-01-01")
+    versions.append(store.data_version("alice"))
+    store.recategorize_expense("alice", lunch, "food")        # no change
+    assert store.data_version("alice") == versions[-1]
+    store.recategorize_expense("alice", lunch, "shopping")
+    versions.append(store.data_version("alice"))
+    store.add_expenses("alice", [{"amount": 5, "category": "food"}])
+    versions.append(store.data_version("alice"))
+    store.delete_expense("alice", lunch)
+    versions.append(store.data_version("alice"))
+
+    assert len(set(versions)) == len(versions)
+    assert store.data_version("bob") == versions[0]
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "expense_store", storage.create_store("sqlite"))
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "carol"
+    for i, day in enumerate(DAYS):
+        app.expense_store.add_expense("carol", 10 * (i + 1), "food" if i % 2 else "transport", f"item {i}", day)
+    return client
+
+
+def test_api_pages_and_summary(client):
+    first = client.get("/api/dashboard?limit=4").get_json()
+    assert first["summary"]["count"] == len(DAYS)
+    assert first["summary"]["total"] == 280
+    assert [e["date"] for e in first["expenses"]] == sorted(DAYS, reverse=True)[:4]
+
+    rest = client.get(f"/api/dashboard?limit=4&after={first['next']}").get_json()
+    assert "summary" not in rest and rest["next"] is None
+    assert [e["date"] for e in rest["expenses"]] == sorted(DAYS, reverse=True)[4:]
+
+    assert client.get("/api/dashboard?after=not-a-cursor").status_code == 400
+    assert client.get("/api/dashboard?limit=0").status_code == 400
+
+
+def test_api_etag_revalidates_until_data_changes(client):
+    first = client.get("/api/dashboard")
+    etag = first.headers["ETag"]
+    assert not etag.startswith("W/")
+    assert "no-cache" in first.headers["Cache-Control"]
+
+    again = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag
+    # Another page (or page size) is another representation
+    assert client.get("/api/dashboard?limit=2", headers={"If-None-Match": etag}).status_code == 200
+
+    newest = first.get_json()["expenses"][0]["id"]
+    client.post(f"/recategorize_expense/{newest}", json={"category": "housing"})
+    changed = client.get("/api/dashboard", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.get_json()["expenses"][0]["category"] == "housing"
+
+
+def test_dashboard_renders_only_the_first_page(client, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "DASHBOARD_PAGE_SIZE", 2)
+    page = client.get("/dashboard").get_data(as_text=True)
+    assert page.count('action="/delete_expense/') == 2
+    assert 'id="load-more-expenses"' in page
+    # The latest expense is on the first page, however long the history
+    assert "item 4" in page and "item 1" not in page
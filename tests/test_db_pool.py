@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db_pool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db_pool.ConnectionPool(str(tmp_path / "pool.db"), max_size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+
+def test_pragmas_applied(pool):
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_same_thread_reuses_connection(pool):
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+    with pool.connection() as again:
+        assert again is outer
+
+
+def test_pool_is_bounded(pool):
+    held = []
+    ready = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        with pool.connection() as conn:
+            held.append(conn)
+            if len(held) == 2:
+                ready.set()
+            done.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for t in threads:
+        t.start()
+    ready.wait(1)
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.acquire()
+    done.set()
+    for t in threads:
+        t.join()
+
+
+def test_transaction_rolls_back_on_error(pool):
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    with pytest.raises(RuntimeError):
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("boom")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_pooled_connection_close_returns_to_pool(pool):
+    first = pool.connect()
+    raw = first._conn
+    first.close()
+    second = pool.connect()
+    assert second._conn is raw
+    second.close()
+
+
+def test_nested_connect_leaves_outer_transaction_open(pool):
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    with pytest.raises(RuntimeError):
+        with pool.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            with pool.connect() as inner:
+                inner.execute("INSERT INTO t VALUES (2)")
+            assert conn.in_transaction
+            raise RuntimeError("boom")
+    with pool.connect() as conn:
+        conn.execute("INSERT INTO t VALUES (3)")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT x FROM t").fetchall() == [(3,)]
+
+
+def test_close_from_another_thread_returns_connection(pool):
+    first = pool.connect()
+    raw = first._conn
+    closer = threading.Thread(target=first.close)
+    closer.start()
+    closer.join()
+    assert pool._idle.qsize() == 1
+    second = pool.connect()
+    assert second._conn is raw
+    second.close()
+
+
+def test_statistics_are_refreshed_periodically(tmp_path):
+    statements = []
+
+    class Recording(sqlite3.Connection):
+        def execute(self, sql, *args):
+            statements.append(sql)
+            return super().execute(sql, *args)
+
+    now = [0.0]
+    pool = db_pool.ConnectionPool(str(tmp_path / "pool.db"), factory=Recording,
+                                  optimize_every=60, clock=lambda: now[0])
+    with pool.connection():
+        pass
+    assert "PRAGMA optimize" not in statements
+    now[0] = 61
+    with pool.connection():
+        pass
+    with pool.connection():
+        pass
+    assert statements.count("PRAGMA optimize") == 1
+    pool.close()
+    assert statements.count("PRAGMA optimize") == 2
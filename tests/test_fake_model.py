@@ -0,0 +1,45 @@
+import pytest
+
+import fake_model
+from fake_model import FakeGenerativeModel, FakeModelError, parse_latency
+
+
+def test_replies_and_delays_are_deterministic():
+    def run():
+        sleeps = []
+        model = FakeGenerativeModel(latency="uniform:0.1:0.9", seed=7, sleep=sleeps.append)
+        texts = [model.generate_content(["system", "How do I budget?"]).text for _ in range(3)]
+        return texts, sleeps
+
+    assert run() == run()
+    texts, sleeps = run()
+    assert texts[0] in fake_model.REPLIES and len(set(texts)) == 1
+    assert all(0.1 <= delay <= 0.9 for delay in sleeps[::2])
+
+
+def test_streaming_paces_chunks_at_the_token_rate():
+    sleeps = []
+    model = FakeGenerativeModel(latency="constant:0.25", tokens_per_sec=13, sleep=sleeps.append)
+    response = model.start_chat([]).send_message("Tips?", stream=True)
+
+    chunks = [chunk.text for chunk in response]
+    assert "".join(chunks) == response.text
+    assert sleeps[0] == 0.25
+    assert sleeps[1:] == [pytest.approx(0.1)] * (len(chunks) - 1)
+
+
+def test_error_rate():
+    model = FakeGenerativeModel(latency="constant:0", error_rate=0.3, sleep=lambda s: None)
+    failures = 0
+    for i in range(1000):
+        try:
+            model.generate_content(f"question {i}")
+        except FakeModelError:
+            failures += 1
+    assert 230 < failures < 370
+
+
+def test_bad_latency_spec():
+    assert parse_latency("lognormal:0:1")(None) == 0.0
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1:2")
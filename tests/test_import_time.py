@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Imported on first use or by app.warm_up(); see benchmarks/bench_import.py
+DEFERRED = ("pandas", "numpy", "google.generativeai", "grpc")
+
+
+def imported_by(statement):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=SRC, capture_output=True, text=True, check=True)
+    return {line.rsplit("|", 1)[1].strip() for line in result.stderr.splitlines()
+            if line.startswith("import time:")}
+
+
+def test_importing_the_app_defers_heavy_dependencies():
+    modules = imported_by("import app")
+    assert "app" in modules
+    assert [package for package in DEFERRED if package in modules] == []
+
+
+def test_model_is_created_on_first_use(monkeypatch):
+    import app
+
+    monkeypatch.setenv("MODEL_BACKEND", "fake")
+    monkeypatch.setattr(app, "model", app.NOT_LOADED)
+    calls = []
+    load_model = app.load_model
+    monkeypatch.setattr(app, "load_model", lambda: calls.append(1) or load_model())
+
+    first = app.get_model()
+    assert first is not None and app.get_model() is first and calls == [1]
+
+
+def test_pre_fork_warm_up_leaves_the_model_to_the_workers(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "model", app.NOT_LOADED)
+    app.warm_up(create_model=False)
+    assert "pandas" in sys.modules
+    assert app.model is app.NOT_LOADED
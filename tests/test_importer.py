@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+import db_pool
+import importer
+
+CSV_STATEMENT = b"""Date,Description,Amount
+2024-03-01,Whole Foods Groceries,-54.20
+03/02/2024,UBER TRIP,-18.00
+2024-03-03,Salary,2500.00
+2024-03-04,Netflix,-15.99
+not a date,Mystery charge,oops
+"""
+
+OFX_STATEMENT = b"""OFXHEADER:100
+DATA:OFXSGML
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240305120000
+<TRNAMT>-42.10
+<NAME>SHELL GAS STATION
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240306
+<TRNAMT>100.00
+<NAME>REFUND
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+
+def _expenses(user_id):
+    with db_pool.connection() as conn:
+        return conn.execute('''
+            SELECT amount, description, category, date FROM expenses
+            WHERE user_id = ? ORDER BY id
+        ''', (user_id,)).fetchall()
+
+
+def test_csv_import_categorizes_and_skips_credits(db):
+    summary = importer.import_statement(io.BytesIO(CSV_STATEMENT), "alice", filename="march.csv")
+
+    assert (summary.rows_read, summary.imported, summary.skipped) == (5, 3, 2)
+    assert summary.bytes_read == len(CSV_STATEMENT)
+    assert _expenses("alice") == [
+        (54.2, "whole foods groceries", "food", "2024-03-01"),
+        (18.0, "uber trip", "transport", "2024-03-02"),
+        (15.99, "netflix", "entertainment", "2024-03-04"),
+    ]
+
+
+def test_ofx_import(db):
+    summary = importer.import_statement(io.BytesIO(OFX_STATEMENT), "bob")
+
+    assert (summary.imported, summary.skipped) == (1, 1)
+    assert _expenses("bob") == [(42.1, "shell gas station", "transport", "2024-03-05")]
+
+
+def test_progress_is_reported_per_chunk(db):
+    rows = b"".join(b"2024-01-%02d,coffee,-3.50\n" % (i % 28 + 1) for i in range(25))
+    seen = []
+    summary = importer.import_statement(io.BytesIO(b"date,description,amount\n" + rows), "carol",
+                                        chunk_size=10, progress=lambda p: seen.append(p.imported))
+
+    assert seen == [10, 20, 25]
+    assert summary.chunks == 3
+    assert db.get_budget_insights("food", user_id="carol")["spent_amount"] == pytest.approx(87.5)
+
+
+def test_unreadable_csv_is_rejected(db):
+    with pytest.raises(importer.StatementError):
+        importer.import_statement(io.BytesIO(b"foo,bar\n1,2\n"), "dave", filename="x.csv")
+
+
+def test_ofx_tag_text_is_bounded():
+    lines = ["<OFX>", "<MEMO>"] + ["no tag on this line " * 5] * 20000 + [
+        "<STMTTRN><DTPOSTED>20240305<TRNAMT>-5.00<NAME>CAFE</STMTTRN>"]
+
+    tags = list(importer._ofx_tags(iter(lines)))
+    assert max(len(text) for _, _, text in tags) <= importer.MAX_PARTIAL_TAG + len(lines[2])
+    assert list(importer.iter_ofx_transactions(iter(lines))) == [("2024-03-05", "CAFE", 5.0)]
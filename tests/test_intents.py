@@ -0,0 +1,41 @@
+import pytest
+
+from intents import IntentRouter, route
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("Add $45 for groceries", ("add_expense", 45.0, "food", "groceries")),
+    ("Spent $1,200.50 on rent", ("add_expense", 1200.5, "housing", "rent")),
+    ("paid $ 30 for uber", ("add_expense", 30.0, "transport", "uber")),
+    ("Set budget for entertainment to $200", ("set_budget", 200.0, "entertainment", None)),
+    ("set a budget for auto repairs to 150", ("set_budget", 150.0, "auto repairs", None)),
+])
+def test_commands_are_parsed_in_one_pass(message, expected):
+    intent = route(message)
+    assert (intent.name, intent.amount, intent.category, intent.description) == expected
+
+
+def test_budget_question_with_period():
+    intent = route("What's my budget for food this month?")
+    assert (intent.name, intent.category, intent.period) == ("budget_query", "food", "month")
+
+
+@pytest.mark.parametrize("message, name", [
+    ("Hi there", "greeting"),
+    ("What can you do?", "help"),
+    ("How do I track my expenses?", "expense_tracking"),
+    ("Tips for saving money", "savings"),
+    ("How much did I spend?", "spending_total"),
+    # Keywords only match whole words: "this" is not a greeting, "add" without $ is not an expense
+    ("Is this a good idea?", "unknown"),
+    ("Add more detail for me", "unknown"),
+])
+def test_conversational_intents(message, name):
+    assert route(message).name == name
+
+
+def test_custom_vocabulary():
+    router = IntentRouter(keywords={"greeting": ("good morning",), "savings": ("nest egg",)})
+    assert router.route("Good morning!").name == "greeting"
+    assert router.route("Grow my nest egg").name == "savings"
+    assert router.route("hello").name == "unknown"
@@ -0,0 +1,94 @@
+from llm_cache import ResponseCache, normalize_prompt
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_keys_ignore_case_spacing_and_trailing_punctuation():
+    assert normalize_prompt("  How do I   start budgeting?? ") == "how do i start budgeting"
+    assert ResponseCache.key("chat", "sys", "How do I start budgeting?") == \
+        ResponseCache.key("chat", "sys", "how do i  start budgeting")
+    assert ResponseCache.key("chat", "sys", "a") != ResponseCache.key("analysis", "sys", "a")
+
+
+def test_get_or_generate_calls_the_model_once():
+    cache = ResponseCache()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        return "Start with a 50/30/20 split."
+
+    key = cache.key("chat", "sys", "How do I start budgeting?")
+    assert cache.get_or_generate(key, generate) == "Start with a 50/30/20 split."
+    assert cache.get_or_generate(key, generate) == "Start with a 50/30/20 split."
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_empty_responses_are_not_cached():
+    cache = ResponseCache()
+    cache.get_or_generate("k", lambda: "")
+    assert cache.get("k") is None
+
+
+def test_persistent_tier_is_shared_and_expires(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "llm_cache.db")
+    first = ResponseCache(ttl=60, persist_path=path, clock=clock)
+    first.set("k", "cached answer")
+    first.close()
+
+    second = ResponseCache(ttl=60, persist_path=path, clock=clock)
+    assert second.get("k") == "cached answer"
+    assert second.stats()["persistent_hits"] == 1
+
+    clock.now += 61
+    assert second.get("k") is None
+    second.close()
+
+
+def test_persistent_tier_connects_on_first_use(tmp_path):
+    path = tmp_path / "llm_cache.db"
+    cache = ResponseCache(persist_path=str(path))
+    # Nothing opened yet, so a cache built before a fork holds no connection
+    assert not path.exists()
+    cache.set("k", "answer")
+    # Closed before forking (see app.warm_up), it opens new connections afterwards
+    cache.close()
+    cache._memory.clear()
+    assert cache.get("k") == "answer"
+    cache.close()
+
+
+def test_analysis_reuses_the_answer_until_expenses_change(db, monkeypatch):
+    import app
+    import storage
+
+    calls = []
+
+    class FakeModel:
+        def generate_content(self, parts):
+            calls.append(parts)
+            return type("Response", (), {"text": f"analysis {len(calls)}"})()
+
+    monkeypatch.setattr(app, "model", FakeModel())
+    monkeypatch.setattr(app, "response_cache", ResponseCache())
+    monkeypatch.setattr(app, "expense_store", storage.create_store("memory"))
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "analyst"
+
+    app.expense_store.add_expense("analyst", 20, "food", "lunch", "2024-05-01")
+    assert client.post("/analyze_expenses").get_json()["response"] == "analysis 1"
+    assert client.post("/analyze_expenses").get_json()["response"] == "analysis 1"
+
+    app.expense_store.add_expense("analyst", 5, "food", "coffee", "2024-05-02")
+    assert client.post("/analyze_expenses").get_json()["response"] == "analysis 2"
+    assert client.get("/llm_cache_metrics").get_json()["memory_hits"] == 1
@@ -0,0 +1,208 @@
+import threading
+import time
+
+import pytest
+
+from llm_client import CircuitOpen, ModelBusy, ModelTimeout, ResilientModel
+
+
+class ServerError(Exception):
+    """Like google.api_core's ServiceUnavailable"""
+    code = 503
+
+
+class InvalidArgument(Exception):
+    code = 400
+
+
+class FlakyModel:
+    """Local stand-in for GenerativeModel with injected latency and failures"""
+
+    def __init__(self, latency=0.0, failures=0, error=ServerError):
+        self.latency = latency
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        if self.latency == "hang":
+            self.release.wait(5)
+        elif self.latency:
+            time.sleep(self.latency)
+        if self.failures:
+            self.failures -= 1
+            raise self.error("upstream unavailable")
+        return type("Response", (), {"text": "ok"})()
+
+    def start_chat(self, history=None):
+        model = self
+
+        class Session:
+            def send_message(self, content, **kwargs):
+                return model.generate_content(content, **kwargs)
+
+        return Session()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_retries_with_backoff_then_succeeds():
+    sleeps = []
+    client = ResilientModel(FlakyModel(failures=2), retries=2, sleep=sleeps.append)
+
+    assert client.generate_content("hi").text == "ok"
+    assert client.start_chat([]).send_message("again").text == "ok"
+    assert len(sleeps) == 2 and all(0 <= delay <= 1.0 for delay in sleeps)
+    assert client.stats()["retried"] == 2 and client.stats()["state"] == "closed"
+
+
+def test_a_call_counts_once_against_the_breaker():
+    client = ResilientModel(FlakyModel(failures=6), retries=2, failure_threshold=3, sleep=lambda _: None)
+    for _ in range(2):
+        with pytest.raises(ServerError):
+            client.generate_content("x")
+    # Six failed attempts, but only two failed calls
+    assert client.stats()["state"] == "closed" and client.stats()["retried"] == 4
+
+
+def test_only_transient_errors_are_retried():
+    model = FlakyModel(failures=1, error=InvalidArgument)
+    client = ResilientModel(model, retries=2, sleep=lambda _: None)
+    with pytest.raises(InvalidArgument):
+        client.generate_content("x")
+    assert model.calls == 1 and client.stats()["retried"] == 0
+
+
+def test_deadline_frees_the_caller():
+    model = FlakyModel(latency="hang")
+    client = ResilientModel(model, timeout=0.05)
+
+    started = time.monotonic()
+    with pytest.raises(ModelTimeout):
+        client.generate_content("slow")
+    assert time.monotonic() - started < 1
+    assert model.calls == 1         # timeouts are not retried
+    model.release.set()
+
+
+def test_concurrency_limit_sheds_load():
+    model = FlakyModel(latency="hang")
+    client = ResilientModel(model, max_concurrent=1, timeout=5, queue_timeout=0.05)
+    worker = threading.Thread(target=client.generate_content, args=("first",))
+    worker.start()
+    while model.calls == 0:
+        time.sleep(0.001)
+
+    with pytest.raises(ModelBusy):
+        client.generate_content("second")
+    model.release.set()
+    worker.join()
+    assert client.generate_content("third").text == "ok"
+
+
+def test_circuit_opens_and_recovers_after_trial_call():
+    clock = FakeClock()
+    model = FlakyModel(failures=3)
+    client = ResilientModel(model, retries=0, failure_threshold=3, reset_after=30, clock=clock)
+
+    for _ in range(3):
+        with pytest.raises(ServerError):
+            client.generate_content("x")
+    with pytest.raises(CircuitOpen):
+        client.generate_content("x")
+    assert model.calls == 3
+
+    clock.now = 31
+    assert client.generate_content("x").text == "ok"
+    assert client.stats()["state"] == "closed" and client.stats()["trips"] == 1
+
+
+def test_chat_falls_back_to_local_engine_when_circuit_is_open(db, monkeypatch):
+    import app
+    import storage
+    from chat_history import ChatHistoryManager
+
+    client = ResilientModel(FlakyModel(failures=1), retries=0, failure_threshold=1)
+    monkeypatch.setattr(app, "model", client)
+    monkeypatch.setattr(app, "chat_histories", ChatHistoryManager())
+    monkeypatch.setattr(app, "expense_store", storage.create_store("memory"))
+
+    http = app.app.test_client()
+    # The first failure trips the breaker; the next question is answered locally
+    assert "error" in http.post("/chat", json={"message": "Tips on saving?"}).get_json()["response"]
+    reply = http.post("/chat", json={"message": "What can you do?"}).get_json()["response"]
+    assert reply.startswith("Here are things I can do")
+    assert http.get("/chat_metrics").get_json()["model"]["state"] == "open"
+
+
+def test_local_fallback_only_sees_the_callers_data(db, monkeypatch):
+    import app
+    from chat_history import ChatHistoryManager
+
+    client = ResilientModel(FlakyModel(failures=1), retries=0, failure_threshold=1)
+    client.breaker.record_failure()
+    monkeypatch.setattr(app, "model", client)
+    monkeypatch.setattr(app, "chat_histories", ChatHistoryManager())
+    db.add_expense(500, "laptop", "shopping", user_id="alice")
+    db.add_expense(7, "sandwich", "food", user_id="bob")
+
+    http = app.app.test_client()
+    with http.session_transaction() as sess:
+        sess["user_id"] = "bob"
+    total = http.post("/chat", json={"message": "How much did I spend?"}).get_json()["response"]
+    assert "$7.00" in total and "507" not in total
+    budget = http.post("/chat", json={"message": "What's my budget for shopping?"}).get_json()["response"]
+    assert "not found" in budget         # default_user has one; bob does not
+
+
+class StallingModel:
+    """Streams one chunk, then waits for release before the rest"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        def chunks():
+            yield "first"
+            self.release.wait(5)
+            yield "late"
+        return chunks()
+
+
+def test_stalled_stream_times_out_and_holds_its_slot():
+    raw = StallingModel()
+    client = ResilientModel(raw, max_concurrent=1, timeout=0.2, queue_timeout=0.05,
+                            retries=0, failure_threshold=1)
+
+    stream = client.generate_content("hi", stream=True)
+    assert next(stream) == "first"
+    started = time.monotonic()
+    with pytest.raises(ModelTimeout):
+        next(stream)
+    assert time.monotonic() - started < 1
+    assert client.stats()["state"] == "open" and client.stats()["timeouts"] == 1
+
+    # The stalled chunk still occupies the only slot until it returns
+    client.breaker.record_success()
+    with pytest.raises(ModelBusy):
+        client.generate_content("again", stream=True)
+    raw.release.set()
+    time.sleep(0.05)
+    assert list(client.generate_content("again", stream=True)) == ["first", "late"]
+    assert client.stats()["state"] == "closed"
+
+
+def test_closing_a_stream_frees_its_slot():
+    client = ResilientModel(StallingModel(), max_concurrent=1, retries=0)
+    stream = client.generate_content("hi", stream=True)
+    assert next(stream) == "first"
+    stream.close()
+    assert next(client.generate_content("again", stream=True)) == "first"
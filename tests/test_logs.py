@@ -0,0 +1,86 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+import logs
+
+
+@pytest.fixture
+def output():
+    stream = io.StringIO()
+    logs.configure(level="DEBUG", stream=stream, sample_rates={})
+
+    def lines():
+        logs.flush()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield lines
+    logs.stop()
+
+
+def test_events_are_json_lines_with_fields(output):
+    log = logs.get_logger("test")
+    log.info("expense.added", category="food", count=2)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("import.failed")
+
+    added, failed = output()
+    assert added["event"] == "expense.added" and added["level"] == "info" and added["logger"] == "test"
+    assert (added["category"], added["count"]) == ("food", 2)
+    assert failed["level"] == "error" and "ValueError: boom" in failed["exc"]
+
+
+def test_levels_and_sampling(output, monkeypatch):
+    log = logs.get_logger("test")
+    logging.getLogger("test").setLevel(logging.INFO)
+    log.debug("too.detailed")
+    logging.getLogger("test").setLevel(logging.NOTSET)
+
+    monkeypatch.setitem(logs._sample_rates, "chat.intent", 0)
+    for _ in range(50):
+        log.debug("chat.intent")
+        log.debug("dashboard.view", sample=0.5)
+
+    events = [line["event"] for line in output()]
+    assert "too.detailed" not in events and "chat.intent" not in events
+    sampled = [line for line in output() if line["event"] == "dashboard.view"]
+    assert 5 < len(sampled) < 45 and sampled[0]["sample_rate"] == 0.5
+
+
+def test_full_queue_drops_instead_of_blocking(output):
+    logs.configure(stream=io.StringIO(), queue_size=1)
+    logs._listener.stop()               # nothing drains the queue now
+    logs._listener = None
+    log = logs.get_logger("test")
+    for _ in range(5):
+        log.warning("flood")
+    assert logs.dropped() == 4
+
+
+def test_chat_diagnostics_leave_out_the_message(db, output, monkeypatch):
+    import app
+    from chat_history import ChatHistoryManager
+
+    monkeypatch.setattr(app, "model", None)
+    monkeypatch.setattr(app, "chat_histories", ChatHistoryManager())
+    client = app.app.test_client()
+    client.post("/chat", json={"message": "Spent $45 on secret groceries"})
+    client.post("/chat", json={"message": "What is my private plan?"})
+
+    lines = output()
+    assert [line["intent"] for line in lines if line["event"] == "chat.intent"] == ["add_expense", "unknown"]
+    assert "secret" not in json.dumps(lines) and "private" not in json.dumps(lines)
+
+
+def test_importing_the_app_leaves_logging_alone():
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    result = subprocess.run([sys.executable, "-c", "import logging, app; print(len(logging.getLogger().handlers))"],
+                            cwd=src, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "0"
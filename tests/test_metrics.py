@@ -0,0 +1,136 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import llm_client
+import metrics
+
+
+def test_exposition_format():
+    registry = metrics.Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    requests.inc('/say "hi"\n')
+    requests.inc("/a", amount=2)
+    for seconds in (0.05, 0.5, 5):
+        latency.observe(seconds, "/a")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 2',
+        'requests_total{route="/say \\"hi\\"\\n"} 1',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.55',
+        'latency_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_workers_figures_are_summed_at_scrape_time(tmp_path):
+    # Another worker: saves its figures to METRICS_DIR when it exits
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    subprocess.run([sys.executable, "-c", "import metrics; metrics.http_requests.inc('/a', 'GET', '200', amount=3);"
+                    "metrics.http_latency.observe(0.5, '/a', 'GET')"],
+                   cwd=src, env=dict(os.environ, METRICS_DIR=str(tmp_path)), check=True)
+
+    registry = metrics.Registry(str(tmp_path))
+    requests = registry.counter("http_requests_total", "Requests", ("route", "method", "status"))
+    latency = registry.histogram("http_request_duration_seconds", "Latency", ("route", "method"))
+    requests.inc("/a", "GET", "200")
+    requests.inc("/b", "GET", "200")
+    latency.observe(2, "/a", "GET")
+
+    lines = registry.render().splitlines()
+    assert 'http_requests_total{route="/a",method="GET",status="200"} 4' in lines
+    assert 'http_requests_total{route="/b",method="GET",status="200"} 1' in lines
+    assert 'http_request_duration_seconds_count{route="/a",method="GET"} 2' in lines
+    assert 'http_request_duration_seconds_sum{route="/a",method="GET"} 2.5' in lines
+    assert len(os.listdir(tmp_path)) == 2
+
+    registry.clear_directory()
+    assert os.listdir(tmp_path) == []
+
+
+def test_exited_workers_are_folded_into_one_file(tmp_path):
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    registry = metrics.Registry(str(tmp_path))
+    requests = registry.counter("http_requests_total", "Requests", ("route", "method", "status"))
+    for amount in (3, 4):
+        worker = subprocess.Popen([sys.executable, "-c", "import metrics; "
+                                   f"metrics.http_requests.inc('/a', 'GET', '200', amount={amount})"],
+                                  cwd=src, env=dict(os.environ, METRICS_DIR=str(tmp_path)))
+        assert worker.wait() == 0
+        registry.retire(worker.pid)
+
+    requests.inc("/a", "GET", "200")
+    assert 'http_requests_total{route="/a",method="GET",status="200"} 8' in registry.render().splitlines()
+    assert sorted(os.listdir(tmp_path)) == sorted(["retired.json", registry._filename()])
+
+
+def test_routes_are_counted_by_rule(db):
+    import app
+
+    client = app.app.test_client()
+    before = metrics.http_requests.value("/delete_expense/<int:expense_id>", "POST", "302")
+    count, _ = metrics.http_latency.snapshot("/delete_expense/<int:expense_id>", "POST")
+    client.post("/delete_expense/41")
+    client.post("/delete_expense/42")
+
+    assert metrics.http_requests.value("/delete_expense/<int:expense_id>", "POST", "302") == before + 2
+    assert metrics.http_latency.snapshot("/delete_expense/<int:expense_id>", "POST")[0] == count + 2
+
+    response = client.get("/metrics")
+    assert response.content_type == metrics.CONTENT_TYPE
+    assert 'http_requests_total{route="/delete_expense/<int:expense_id>",method="POST",status="302"}' \
+        in response.get_data(as_text=True)
+
+
+def test_sqlite_statements_are_timed(db):
+    count, _ = metrics.statement_latency.snapshot("insert", "expenses")
+    errors = metrics.statement_errors.value("select", "no_such_table")
+    db.add_expense(12.5, "lunch", "food")
+    assert metrics.statement_latency.snapshot("insert", "expenses")[0] == count + 1
+
+    with db.connection() as conn, pytest.raises(Exception):
+        conn.execute("SELECT * FROM no_such_table")
+    assert metrics.statement_errors.value("select", "no_such_table") == errors + 1
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class Model:
+    def __init__(self):
+        self.fail = False
+
+    def generate_content(self, contents, **kwargs):
+        if self.fail:
+            raise RuntimeError("upstream error")
+        return Reply("x" * 300)
+
+
+def test_gemini_calls_are_timed_and_sized():
+    raw = Model()
+    model = llm_client.ResilientModel(raw, retries=0, sleep=lambda _: None)
+    ok, _ = metrics.gemini_latency.snapshot("generate_content", "ok")
+    prompts, prompt_chars = metrics.gemini_prompt_chars.snapshot("generate_content")
+    replies, reply_chars = metrics.gemini_response_chars.snapshot("generate_content")
+    errors = metrics.gemini_errors.value("generate_content", "RuntimeError")
+
+    model.generate_content(["system prompt", {"role": "user", "parts": ["hello"]}])
+    raw.fail = True
+    with pytest.raises(RuntimeError):
+        model.generate_content("hello again")
+
+    assert metrics.gemini_latency.snapshot("generate_content", "ok")[0] == ok + 1
+    assert metrics.gemini_errors.value("generate_content", "RuntimeError") == errors + 1
+    assert metrics.gemini_prompt_chars.snapshot("generate_content") == (prompts + 2, prompt_chars + 18 + 11)
+    assert metrics.gemini_response_chars.snapshot("generate_content") == (replies + 1, reply_chars + 300)
@@ -0,0 +1,79 @@
+import sqlite3
+
+import migrations
+
+
+def _legacy_database_py_schema(conn):
+    conn.executescript('''
+        CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, amount REAL NOT NULL,
+            description TEXT NOT NULL, category TEXT, date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE budgets (id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT UNIQUE NOT NULL,
+            limit_amount REAL NOT NULL, spent_amount REAL DEFAULT 0);
+        INSERT INTO expenses (amount, description, category) VALUES (12.5, 'lunch', 'food');
+        INSERT INTO budgets (category, limit_amount, spent_amount) VALUES ('food', 500, 12.5);
+    ''')
+
+
+def _legacy_app_py_schema(conn):
+    conn.executescript('''
+        CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
+            amount REAL NOT NULL, description TEXT NOT NULL, category TEXT,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE budgets (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
+            category TEXT NOT NULL, limit_amount REAL NOT NULL, spent_amount REAL DEFAULT 0,
+            UNIQUE(user_id, category));
+    ''')
+
+
+def _indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "fresh.db"))
+    assert migrations.migrate(conn) == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert {"idx_expenses_user_category_date", "idx_notifications_user_status_seen",
+            "idx_savings_goals_name"} <= _indexes(conn)
+    # ANALYZE populated planner statistics
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0] == 1
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "again.db"))
+    migrations.migrate(conn)
+    assert migrations.migrate(conn) == []
+
+
+def test_legacy_database_py_schema_is_user_scoped(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    _legacy_database_py_schema(conn)
+    migrations.migrate(conn)
+
+    assert conn.execute("SELECT user_id, amount FROM expenses").fetchall() == [("default_user", 12.5)]
+    assert conn.execute("SELECT user_id, category, spent_amount FROM budgets").fetchall() == \
+        [("default_user", "food", 12.5)]
+    # The same category may now be budgeted separately per user
+    conn.execute("INSERT INTO budgets (user_id, category, limit_amount) VALUES ('alice', 'food', 100)")
+
+
+def test_legacy_app_py_schema_gets_indexes(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "app.db"))
+    _legacy_app_py_schema(conn)
+    migrations.migrate(conn)
+
+    assert "idx_expenses_user_category_date" in _indexes(conn)
+    plan = conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT SUM(amount) FROM expenses WHERE user_id = ? AND category = ?
+    ''', ("u", "food")).fetchall()
+    assert "COVERING INDEX idx_expenses_user_category_date" in plan[0][3]
+
+
+def test_budgets_are_scoped_per_user(db):
+    db.set_budget("food", 100, user_id="alice")
+    db.add_expense(80, "groceries", "food", user_id="alice")
+    db.add_expense(5, "snack", "food")
+
+    assert db.get_budget_insights("food", user_id="alice")["spent_amount"] == 80
+    assert db.get_budget_insights("food")["spent_amount"] == 5
@@ -0,0 +1,81 @@
+import sqlite3
+
+import db_pool
+import migrations
+
+
+def _count(sql, *args):
+    with db_pool.connection() as conn:
+        return conn.execute(sql, args).fetchone()[0]
+
+
+def test_repeat_alerts_coalesce(db):
+    for _ in range(5):
+        db.add_expense(150, "concert", "entertainment", user_id="alice")
+
+    alerts = db.get_notifications(user_id="alice")
+    assert len(alerts) == 1
+    assert alerts[0]["occurrences"] == 3  # the first $300 fit the default budget
+    assert _count("SELECT COUNT(*) FROM notifications") == 1
+
+
+def test_alerts_are_per_user_category_and_month(db):
+    db.add_expense(600, "big shop", "food", user_id="alice", date="2024-01-10 10:00:00")
+    db.add_expense(10, "snack", "food", user_id="alice", date="2024-02-10 10:00:00")
+    db.add_expense(400, "tickets", "entertainment", user_id="alice")
+    db.add_expense(600, "big shop", "food", user_id="bob")
+
+    assert len(db.get_notifications(limit=10, user_id="alice")) == 3
+    assert len(db.get_notifications(limit=10, user_id="bob")) == 1
+
+
+def test_read_alert_makes_room_for_a_new_one(db):
+    db.add_expense(600, "big shop", "food")
+    [alert] = db.get_notifications()
+    assert db.mark_notifications_read([alert["id"]]) == 1
+
+    db.add_expense(5, "gum", "food")
+    [fresh] = db.get_notifications()
+    assert fresh["id"] != alert["id"]
+    assert fresh["occurrences"] == 1
+
+
+def test_compaction_archives_old_read_alerts(db):
+    db.add_expense(600, "big shop", "food")
+    [alert] = db.get_notifications()
+    db.mark_notifications_read([alert["id"]])
+    with db_pool.transaction() as conn:
+        conn.execute("UPDATE notifications SET last_seen_at = datetime('now', '-40 days')")
+
+    assert db.compact_notifications(read_days=30) == 1
+    assert _count("SELECT COUNT(*) FROM notifications") == 0
+    assert _count("SELECT COUNT(*) FROM notifications_archive") == 1
+
+
+def test_compaction_keeps_recent_unread_alerts(db):
+    db.add_expense(600, "big shop", "food")
+    with db_pool.transaction() as conn:
+        conn.execute("UPDATE notifications SET last_seen_at = datetime('now', '-2 days')")
+
+    assert db.compact_notifications(read_days=1) == 0
+    assert db.compact_notifications(read_days=1, max_age_days=3, archive=False) == 0
+    assert db.compact_notifications(read_days=1, max_age_days=1, archive=False) == 1
+
+
+def test_migration_merges_existing_duplicates(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "dupes.db"))
+    migrations.migrate(conn, target=4)
+    conn.executemany("INSERT INTO notifications (message, created_at) VALUES (?, ?)", [
+        ("Alert: You've exceeded your food budget of $500.0!", "2024-03-01 10:00:00"),
+        ("Alert: You've exceeded your food budget of $500.0!", "2024-03-02 10:00:00"),
+        ("Alert: You've exceeded your food budget of $500.0!", "2024-03-03 10:00:00"),
+        ("Alert: You've exceeded your shopping budget of $300.0!", "2024-03-03 10:00:00"),
+    ])
+    conn.commit()
+    migrations.migrate(conn)
+
+    rows = conn.execute('''
+        SELECT category, period_key, occurrences, created_at FROM notifications ORDER BY category
+    ''').fetchall()
+    assert rows == [("food", "2024-03", 3, "2024-03-01 10:00:00"),
+                    ("shopping", "2024-03", 1, "2024-03-03 10:00:00")]
@@ -0,0 +1,134 @@
+import pytest
+
+import storage
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, db):
+    return storage.create_store(request.param)
+
+
+def test_expenses_are_scoped_per_user(store):
+    store.add_expense("alice", 12.5, "food", "lunch", "2024-03-01")
+    store.add_expense("bob", 40, "transport", "fuel", "2024-03-02")
+
+    [expense] = store.list_expenses("alice")
+    assert (expense["amount"], expense["category"], expense["description"], expense["date"]) == \
+        (12.5, "food", "lunch", "2024-03-01")
+    assert store.has_expenses("bob")
+    assert not store.has_expenses("carol")
+
+
+def test_delete_by_id(store):
+    ids = [store.add_expense("alice", i, "food", f"item {i}", day)
+           for i, day in enumerate(["2024-03-03", "2024-03-01", "2024-03-02"])]
+
+    assert sorted(e["id"] for e in store.list_expenses("alice")) == sorted(ids)
+    assert store.delete_expense("alice", ids[1])
+    assert [e["description"] for e in store.list_expenses("alice")].count("item 1") == 0
+    assert not store.delete_expense("alice", ids[1])
+    assert not store.delete_expense("bob", ids[0])
+
+
+def test_batch_edits_skip_missing_ids(store):
+    ids = [store.add_expense("alice", 10, "other", f"shop {i}", "2024-03-01") for i in range(4)]
+    bobs = store.add_expense("bob", 5, "other", "shop", "2024-03-01")
+
+    assert store.recategorize_expenses("alice", [ids[2], 10**9, ids[0], ids[0]], "shopping") == [ids[2], ids[0]]
+    assert store.recategorize_expenses("bob", [ids[3] + 10**6], "food") == []
+    assert store.delete_expenses("alice", [ids[0], ids[3], 10**9]) == [ids[0], ids[3]]
+    assert [(e["id"], e["category"]) for e in store.list_expenses("alice")] == [(ids[1], "other"),
+                                                                               (ids[2], "shopping")]
+    assert store.summary("alice").totals == {"other": 10, "shopping": 10}
+    assert [(e["id"], e["category"]) for e in store.list_expenses("bob")] == [(bobs, "other")]
+
+
+def test_bulk_add(store):
+    assert store.add_expenses("alice", [
+        {"amount": 3, "description": "tea", "category": "food", "date": "2024-01-01"},
+        {"amount": 4, "description": "bus"},
+    ]) == 2
+    assert len(store.list_expenses("alice")) == 2
+
+
+def test_sqlite_store_survives_a_new_instance(db):
+    storage.SQLiteExpenseStore().add_expense("alice", 9, "food", "snack", "2024-01-01")
+    assert len(storage.SQLiteExpenseStore().list_expenses("alice")) == 1
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        storage.create_store("redis")
+
+
+def test_routes_read_and_write_through_the_store(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "expense_store", storage.create_store("sqlite"))
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "route_user"
+
+    client.post("/chat", json={"message": "Add $12 for lunch"})
+    client.post("/add_expense", data={"amount": "30", "category": "transport",
+                                      "description": "train", "date": "2024-05-01"})
+    assert [e["category"] for e in db.get_expenses("route_user")] == ["transport", "food"]
+
+    page = client.get("/dashboard").get_data(as_text=True)
+    assert "train" in page and "lunch" in page
+
+    client.post(f"/delete_expense/{db.get_expenses('route_user')[0]['id']}")
+    assert [e["description"] for e in db.get_expenses("route_user")] == ["lunch"]
+
+    bad = client.post("/add_expense", data={"amount": "5", "category": "food", "date": "31/12/2024"})
+    assert bad.status_code == 400
+    assert len(db.get_expenses("route_user")) == 1
+
+
+def test_batch_routes_adjust_budgets_and_rollups(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "expense_store", storage.create_store("sqlite"))
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = "batch_user"
+    ids = [app.expense_store.add_expense("batch_user", 20, "other", f"item {i}", "2024-06-0%d" % (i + 1))
+           for i in range(4)]
+
+    response = client.post("/recategorize_expenses", json={"ids": ids[:3], "category": "Food"})
+    assert response.get_json() == {"updated": ids[:3], "missing": [], "category": "food"}
+    response = client.post("/delete_expenses", json={"ids": [ids[0], ids[3], 424242]})
+    assert response.get_json() == {"deleted": [ids[0], ids[3]], "missing": [424242]}
+
+    assert db.get_budget_insights("food", user_id="batch_user")["spent_amount"] == 40
+    assert db.get_budget_insights("other", user_id="batch_user")["spent_amount"] == 0
+    assert db.get_period_spending("food", "month", user_id="batch_user", key="2024-06") == 40
+    assert client.post("/delete_expenses", json={"ids": ["1"]}).status_code == 400
+    assert client.post("/delete_expenses", json={"ids": []}).status_code == 400
+
+
+def test_first_request_gets_its_own_user(db, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "expense_store", storage.create_store("sqlite"))
+    client = app.app.test_client()
+    # Straight to a form post, without opening the chat page first
+    client.post("/add_expense", data={"amount": "9", "category": "food", "description": "snack"})
+    with client.session_transaction() as sess:
+        user_id = sess["user_id"]
+    assert user_id.startswith("user_") and len(db.get_expenses(user_id)) == 1
+    assert not db.has_expenses()
+
+
+def test_secret_key_is_required_for_several_workers(monkeypatch):
+    import app
+
+    monkeypatch.delenv("SECRET_KEY")
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    # The development server: one process, a random key
+    assert len(app.session_secret()) == 64
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(RuntimeError):
+        app.session_secret()
+    monkeypatch.setenv("SECRET_KEY", "configured")
+    assert app.session_secret() == "configured"
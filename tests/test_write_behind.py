@@ -0,0 +1,126 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import db_pool
+from write_behind import WriteBehindError, WriteBehindQueue
+
+
+@pytest.fixture
+def write_behind(db):
+    queue = db.enable_write_behind(max_delay=0.2)
+    yield queue
+    db.disable_write_behind()
+
+
+def _count(sql, *args):
+    with db_pool.connection() as conn:
+        return conn.execute(sql, args).fetchone()[0]
+
+
+def test_writes_are_group_committed(db, write_behind):
+    ids = [db.add_expense(1, f"coffee {i}", "food", user_id="alice") for i in range(150)]
+
+    assert write_behind.flush(timeout=5)
+    assert [e["id"] for e in db.get_expenses("alice")] == ids
+    assert write_behind.batches < 150
+
+
+def test_reserved_ids_stay_clear_of_direct_inserts(db, write_behind):
+    queued = db.add_expense(5, "queued", "food")
+    with db_pool.transaction() as conn:
+        direct = db._insert_expense(conn.cursor(), "other", 5, "direct", "food", "2024-01-01")
+    assert direct >= queued + db.ID_BLOCK
+
+    assert db.delete_expense(queued)
+
+
+def test_read_your_writes(db, write_behind):
+    db.add_expense(30, "lunch", "food", user_id="bob")
+    # The read waits for bob's queued write even though the window is 200ms
+    assert db.get_budget_insights("food", user_id="bob")["spent_amount"] == 30
+    assert write_behind.pending("bob") == 0
+
+
+def test_over_budget_alert_written_with_the_expense(db, write_behind):
+    db.add_expense(600, "big shop", "food")
+    assert len(db.get_notifications()) == 1
+
+
+def test_close_flushes_pending_writes(db):
+    queue = db.enable_write_behind(max_delay=5)
+    db.add_expense(10, "taxi", "transport", user_id="carol")
+    db.disable_write_behind()
+
+    assert queue.stats()["pending"] == 0
+    assert _count("SELECT COUNT(*) FROM expenses WHERE user_id = 'carol'") == 1
+
+
+def test_failed_write_does_not_sink_the_batch(tmp_path):
+    pool = db_pool.ConnectionPool(str(tmp_path / "wb.db"))
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER NOT NULL)")
+
+    def insert(cursor, value):
+        cursor.execute("INSERT INTO t VALUES (?)", (value,))
+
+    queue = WriteBehindQueue(pool.transaction, max_delay=0.5)
+    for value in (1, None, 3):
+        queue.submit("u", insert, (value,))
+    queue.submit("v", insert, (4,))
+    with pytest.raises(WriteBehindError) as failed:
+        queue.wait_for_user("u", timeout=5)
+    assert failed.value.failures["u"][0] == 1
+    assert queue.wait_for_user("u") and queue.flush(timeout=5)     # reported once
+    queue.close()
+
+    with pool.connection() as conn:
+        assert [r[0] for r in conn.execute("SELECT x FROM t ORDER BY x")] == [1, 3, 4]
+    assert queue.errors == 1
+    pool.close()
+
+
+def test_concurrent_submitters(db, write_behind):
+    def submit(user):
+        for _ in range(20):
+            db.add_expense(2, "bus", "transport", user_id=user)
+
+    threads = [threading.Thread(target=submit, args=(f"user{i}",)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert db.get_budget_insights("transport", user_id="user3")["spent_amount"] == 40
+    write_behind.flush(timeout=5)
+    assert _count("SELECT COUNT(*) FROM expenses") == 100
+
+
+def test_refused_with_several_workers():
+    # Another worker would not wait for the writes queued in this one
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+    env = dict(os.environ, WRITE_BEHIND="1", WEB_CONCURRENCY="2")
+    result = subprocess.run([sys.executable, "-c", "import database"], cwd=src, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0 and "WEB_CONCURRENCY=1" in result.stderr
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_worker_gets_its_own_writer(db, write_behind):
+    # As in a gunicorn worker forked from a master that enabled write-behind
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            signal.alarm(5)
+            expense_id = db.add_expense(7, "snack", "food", user_id="child")
+            code = 0 if [e["id"] for e in db.get_expenses("child")] == [expense_id] else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert [e["description"] for e in db.get_expenses("child")] == ["snack"]